@@ -0,0 +1,269 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""asyncio client of UR5 that pipelines the preparation of programs with their execution
+
+A program sent to UR5 replaces the one running, so programs still run one at a time, but everything before sending
+is done ahead: sub-strokes are turned into encoded scripts as soon as they are submitted and wait in a queue, and the
+next script is sent the moment the realtime stream shows that the tool reached the end of the current one. No thread
+sleeps or polls; completion is driven by the packets of the realtime interface, with the rules of motion_monitor: a
+job fails with TimeoutError past its deadline or when the stream stops, and with motion_monitor.MotionStalled when the
+tool stands still away from its target, like EasyUr5.
+
+    async def write(sub_strokes):
+        machine = AsyncEasyUr5()
+        await machine.connect()
+        try:
+            await machine.execute_all(sub_strokes)
+        finally:
+            await machine.close()
+"""
+import asyncio
+import collections
+import time
+import easy_ur5
+import motion_monitor
+import realtime_packet
+import ur5_realtime
+
+# data: encoded script
+# target: position the tool reaches when the script is finished
+# tolerances: motion_monitor.Tolerances of the end of the script
+# future: resolved with the RealtimeState in which the script is finished
+
+Job = collections.namedtuple('Job', ['data', 'target', 'tolerances', 'future'])
+# the moves to the first positions of a stroke end once the tool is there, as in EasyUr5.test_move_to
+MOVE_TOLERANCES = motion_monitor.Tolerances(easy_ur5.MOVE_POSITION_TOLERANCE, easy_ur5.ANGLE_TOLERANCE, None)
+
+
+def retrieve_failure(future):
+    """
+    mark the failure of a future nobody awaits as retrieved
+    :param future: asyncio.Future
+    :return: None
+    """
+    if not future.cancelled():
+        future.exception()
+
+
+def fail(future, error):
+    """
+    fail a future unless it is cancelled or settled already
+    :param future: asyncio.Future
+    :param error: the exception
+    :return: None
+    """
+    if not future.done():
+        future.set_exception(error)
+
+
+class AsyncEasyUr5:
+    """
+    asyncio UR5 API class
+    """
+    def __init__(self, host=easy_ur5.HOST, port=easy_ur5.PORT_30002, realtime_port=easy_ur5.PORT_30003,
+                 motion_timeout=easy_ur5.MOTION_TIMEOUT, stall_time=motion_monitor.STALL_TIME):
+        """
+        :param host: address of UR5
+        :param port: port the scripts are sent to
+        :param realtime_port: port of the realtime interface the state of UR5 is read from
+        :param motion_timeout: seconds a script may take at most, None for no limit
+        :param stall_time: seconds the tool may stand still away from a target, None to never report stalls
+        """
+        self.host = host
+        self.port = port
+        self.realtime_port = realtime_port
+        self.motion_timeout = motion_timeout
+        self.stall_time = stall_time
+        self.writer = None
+        self.state = None
+        self.failure = None
+        self.state_changed = None
+        self.queue = None
+        self.sender = None
+        self.tasks = []
+
+    async def connect(self):
+        """
+        open the connections to UR5 and start the reader and sender tasks
+        :return: None
+        """
+        _, self.writer = await asyncio.open_connection(self.host, self.port)
+        realtime_reader, realtime_writer = await asyncio.open_connection(self.host, self.realtime_port)
+        self.state_changed = asyncio.Condition()
+        self.queue = asyncio.Queue()
+        self.sender = asyncio.ensure_future(self.send_jobs())
+        self.tasks = [
+            asyncio.ensure_future(self.read_states(realtime_reader, realtime_writer)),
+            self.sender,
+        ]
+
+    async def close(self):
+        """
+        stop the tasks and close the connections, jobs still queued are cancelled
+        :return: None
+        """
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+        while self.queue is not None and not self.queue.empty():
+            self.queue.get_nowait().future.cancel()
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+            self.writer = None
+
+    async def read_states(self, reader, writer):
+        """
+        read the realtime stream and publish every packet
+        :param reader: asyncio.StreamReader of the realtime interface
+        :param writer: asyncio.StreamWriter of the realtime interface, closed when the task ends
+        :return: None
+        """
+        sequence = 0
+        try:
+            while True:
+                header = await reader.readexactly(realtime_packet.MESSAGE_SIZE.size)
+                size = realtime_packet.MESSAGE_SIZE.unpack(header)[0]
+                if not ur5_realtime.MIN_MESSAGE_SIZE <= size <= ur5_realtime.MAX_MESSAGE_SIZE:
+                    raise ValueError('invalid message size %d' % size)
+                packet = realtime_packet.decode(header + await reader.readexactly(size - len(header)))
+                state = ur5_realtime.RealtimeState(packet['tool_vector_actual'].tolist(), float(packet['time']),
+                                                   time.monotonic(), sequence, packet)
+                sequence += 1
+                async with self.state_changed:
+                    self.state = state
+                    self.state_changed.notify_all()
+        except (OSError, ValueError, asyncio.IncompleteReadError) as e:
+            async with self.state_changed:
+                self.failure = ConnectionError('realtime connection lost: %s' % e)
+                self.state_changed.notify_all()
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+    async def wait_for_state(self, after=None):
+        """
+        wait for a state newer than @after
+        :param after: ur5_realtime.RealtimeState already seen, None for any state
+        :return: the latest ur5_realtime.RealtimeState
+        """
+        async with self.state_changed:
+            await self.state_changed.wait_for(lambda: self.failure is not None or (
+                self.state is not None and (after is None or self.state.sequence > after.sequence)))
+            if self.failure is not None:
+                raise self.failure
+            return self.state
+
+    async def send_jobs(self):
+        """
+        send the queued jobs one after another, each as soon as the previous one is finished. if a connection is lost or
+        a job times out or stalls, the job and all queued jobs fail, and so do the jobs submitted afterwards
+        :return: None
+        """
+        while True:
+            job = await self.queue.get()
+            if job.future.cancelled():
+                continue
+            try:
+                state = await self.run_job(job)
+            except (OSError, motion_monitor.MotionStalled) as e:
+                self.failure = e
+                fail(job.future, e)
+                while not self.queue.empty():
+                    fail(self.queue.get_nowait().future, e)
+                return
+            if not job.future.done():
+                job.future.set_result(state)
+
+    async def run_job(self, job):
+        """
+        send a job and wait until the tool reaches its target, see motion_monitor.Motion.check
+        :param job: Job
+        :return: the RealtimeState in which the script is finished
+        """
+        previous = self.state
+        now = time.monotonic()
+        motion = motion_monitor.Motion(job.target, job.tolerances,
+                                       None if self.motion_timeout is None else now + self.motion_timeout,
+                                       -1 if previous is None else previous.sequence, now)
+        self.writer.write(job.data)
+        await self.writer.drain()
+        while True:
+            try:
+                state = await asyncio.wait_for(self.wait_for_state(previous), easy_ur5.STATE_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise TimeoutError('no state from UR5 within %s s' % easy_ur5.STATE_TIMEOUT)
+            speed = motion_monitor.tcp_speed(state, previous)
+            position, angle = motion_monitor.pose_errors(state.pose, motion.target)
+            outcome = motion.check(state, float(position), float(angle), speed,
+                                   motion_monitor.program_playing(state.packet), speed < motion_monitor.STILL_SPEED,
+                                   self.stall_time, motion_monitor.START_TIME)
+            previous = state
+            if outcome is not None:
+                result, error = outcome
+                if error is not None:
+                    raise error
+                return result
+
+    def prepare(self, sub_stroke, r=0.002):
+        """
+        turn a sub-stroke into jobs, the moves to the first two positions of a first sub-stroke and then its program
+        :param sub_stroke: stroke_split.SubStroke or [points, slow_down, first]
+        :param r: blend radius
+        :return: array of (data, target, motion_monitor.Tolerances)
+        """
+        points, slow_down, first = sub_stroke
+        approach, program, end = easy_ur5.sub_stroke_program(points, slow_down, first, r)
+        jobs = [(easy_ur5.movel_command(position, 0.0).encode('utf-8'), list(position), MOVE_TOLERANCES)
+                for position in approach]
+        data = (easy_ur5.ACTIVATE_SCRIPT + program + "%s()\n" % easy_ur5.PROGRAM_NAME).encode('utf-8')
+        jobs.append((data, list(end), easy_ur5.PATH_TOLERANCES))
+        return jobs
+
+    def submit(self, sub_stroke, r=0.002):
+        """
+        prepare a sub-stroke and queue it behind the sub-strokes submitted before, without waiting
+        :param sub_stroke: stroke_split.SubStroke or [points, slow_down, first]
+        :param r: blend radius
+        :return: asyncio.Future resolved with the RealtimeState in which the sub-stroke is finished, failed at once
+            with the failure of a lost connection
+        """
+        loop = asyncio.get_event_loop()
+        if self.failure is not None or self.sender is None or self.sender.done():
+            future = loop.create_future()
+            future.set_exception(self.failure or ConnectionError('not connected to UR5'))
+            return future
+        future = None
+        for data, target, tolerances in self.prepare(sub_stroke, r):
+            if future is not None:
+                # a failed move to the first positions fails the program after it too, which the caller awaits
+                future.add_done_callback(retrieve_failure)
+            future = loop.create_future()
+            self.queue.put_nowait(Job(data, target, tolerances, future))
+        return future
+
+    async def execute(self, sub_stroke, r=0.002):
+        """
+        write a sub-stroke
+        :param sub_stroke: stroke_split.SubStroke or [points, slow_down, first]
+        :param r: blend radius
+        :return: the RealtimeState in which the sub-stroke is finished
+        """
+        return await self.submit(sub_stroke, r)
+
+    async def execute_all(self, sub_strokes, r=0.002):
+        """
+        write sub-strokes, all of them are prepared and queued up front
+        :param sub_strokes: iterable of stroke_split.SubStroke or [points, slow_down, first]
+        :param r: blend radius
+        :return: array of the RealtimeState in which each sub-stroke is finished
+        """
+        futures = [self.submit(sub_stroke, r) for sub_stroke in sub_strokes]
+        return await asyncio.gather(*futures)
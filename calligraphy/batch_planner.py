@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Offline batch planner
+
+Plans many texts ahead of time and writes one plan file per text, to be written later by plan_executor without
+planning anything while UR5 waits. The characters not found in the trajectory cache are planned by a pool of worker
+processes, each with its own view of the binary character library; the cache and the plan files are written by the
+main process only.
+
+    python batch_planner.py "text one" "text two" --file poem.txt --scale 0.0004 --processes 4
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import sys
+import brushes
+import charlib.binary
+import charlib.library
+import plan_file
+import robot_writing_logics
+import stroke_split
+import trajectory_cache
+
+MY_PATH = os.path.abspath(os.path.dirname(__file__))
+PLAN_DIR = os.path.join(MY_PATH, r"..\data\plans")
+
+# state of a worker process, set once by init_worker
+
+WORKER = {}
+
+
+def init_worker(library_url, scale, angle, brush_name, split_rules):
+    """
+    open the character library in a worker process
+    :param library_url: the url of the binary character library
+    :param scale: a constant scalar, used for adjust the size of character you wanted to write
+    :param angle: rotating angle of the characters
+    :param brush_name: name of a registered brush
+    :param split_rules: stroke_split.SplitRules of where strokes are broken into sub-strokes
+    :return: none
+    """
+    WORKER['library'] = charlib.library.CharacterLibrary(library_url)
+    WORKER['scale'] = scale
+    WORKER['angle'] = angle
+    WORKER['brush'] = brushes.get(brush_name)
+    WORKER['split_rules'] = split_rules
+
+
+def plan_character(character):
+    """
+    plan a character relative to its origin, in a worker process
+    :param character: the character
+    :return: (character, array of sub-strokes), the sub-strokes are None if the character is not in the library
+    """
+    strokes = WORKER['library'].get(character)
+    if strokes is None:
+        return character, None
+    return character, robot_writing_logics.get_char_mover(
+        strokes,
+        [0, 0, 0],
+        robot_writing_logics.ORIENTATION,
+        WORKER['scale'],
+        WORKER['brush'],
+        WORKER['split_rules'],
+        WORKER['angle'],
+    )
+
+
+def fill_cache(texts, cache, library_url, scale, angle, brush_name, split_rules, processes=None):
+    """
+    plan every character of @texts that is not in the cache yet
+    :param texts: array of texts
+    :param cache: trajectory_cache.TrajectoryCache the plans are put in
+    :param library_url: the url of the binary character library
+    :param scale: a constant scalar, used for adjust the size of character you wanted to write
+    :param angle: rotating angle of the characters
+    :param brush_name: name of a registered brush
+    :param split_rules: stroke_split.SplitRules of where strokes are broken into sub-strokes
+    :param processes: number of worker processes, None for the number of cores
+    :return: number of characters planned
+    """
+    brush = brushes.get(brush_name)
+    pending = sorted({character for text in texts for character in text if not character.isspace()
+                      and cache.get(robot_writing_logics.character_key(character, scale, angle, brush,
+                                                                       split_rules)) is None})
+    print('characters to plan: ', len(pending))
+    if not pending:
+        return 0
+
+    planned = 0
+    pool = multiprocessing.Pool(processes, init_worker, (library_url, scale, angle, brush_name, split_rules))
+    try:
+        for character, relative in pool.imap_unordered(plan_character, pending):
+            if relative is None:
+                continue
+            cache.put(robot_writing_logics.character_key(character, scale, angle, brush, split_rules), relative)
+            planned += 1
+    finally:
+        pool.terminate()
+        pool.join()
+    return planned
+
+
+def metadata(text, scale, angle, brush, split_rules, page, chars):
+    """
+    describe a plan
+    :param text: the planned text
+    :param scale: a constant scalar, used for adjust the size of character you wanted to write
+    :param angle: rotating angle of the characters
+    :param brush: brushes.CompiledBrush
+    :param split_rules: stroke_split.SplitRules of where strokes are broken into sub-strokes
+    :param page: layout.PageSpec of the pages
+    :param chars: the plan, as returned by robot_writing_logics.plan_string
+    :return: JSON serializable dictionary
+    """
+    return {
+        'text': text,
+        'scale': scale,
+        'angle': angle,
+        'brush': brushes.calibration(brush),
+        'split_rules': split_rules._asdict(),
+        'waypoint_tolerance': robot_writing_logics.WAYPOINT_TOLERANCE,
+        'page': page._asdict(),
+        'pages': max([page_index for page_index, _ in chars] or [-1]) + 1,
+        'characters': len(chars),
+    }
+
+
+def plan_texts(texts, output_dir, prefix='plan', scale=0.0004, angle=math.pi, brush_name=brushes.DEFAULT_BRUSH,
+               split_rules=stroke_split.DEFAULT_RULES, page=robot_writing_logics.PAGE,
+               library_url=robot_writing_logics.CHAR_BIN_DIR, cache_url=robot_writing_logics.CACHE_DIR,
+               processes=None):
+    """
+    plan texts and write a plan file for each of them
+    :param texts: array of texts
+    :param output_dir: directory the plan files are written to
+    :param prefix: prefix of the names of the plan files
+    :param scale: a constant scalar, used for adjust the size of character you wanted to write
+    :param angle: rotating angle of the characters
+    :param brush_name: name of a registered brush
+    :param split_rules: stroke_split.SplitRules of where strokes are broken into sub-strokes
+    :param page: layout.PageSpec of the pages
+    :param library_url: the url of the binary character library
+    :param cache_url: the url of the trajectory cache
+    :param processes: number of worker processes, None for the number of cores
+    :return: array of the urls of the plan files
+    """
+    brush = brushes.get(brush_name)
+    cache = trajectory_cache.TrajectoryCache(cache_url)
+    fill_cache(texts, cache, library_url, scale, angle, brush_name, split_rules, processes)
+
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+    library = charlib.library.CharacterLibrary(library_url)
+    urls = []
+    for i, text in enumerate(texts):
+        chars = robot_writing_logics.plan_string(text, scale, library, angle, brush, cache, split_rules, page)
+        url = os.path.join(output_dir, '%s_%03d.cplan' % (prefix, i))
+        plan_file.write_plan(url, chars, metadata(text, scale, angle, brush, split_rules, page, chars))
+        urls.append(url)
+        print('planned ', len(chars), ' characters to ', url)
+    return urls
+
+
+def main(arguments):
+    """
+    plan the texts given on the command line
+    :param arguments: command line arguments
+    :return: none
+    """
+    parser = argparse.ArgumentParser(description='plan texts ahead of time into plan files')
+    parser.add_argument('texts', nargs='*', help='texts to plan, one plan file each')
+    parser.add_argument('--file', action='append', default=[],
+                        help='utf-8 text file to plan as one text, newlines start new lines; can be repeated')
+    parser.add_argument('--output', default=PLAN_DIR, help='directory of the plan files')
+    parser.add_argument('--prefix', default='plan', help='prefix of the names of the plan files')
+    parser.add_argument('--scale', type=float, default=0.0004, help='size of the characters')
+    parser.add_argument('--angle', type=float, default=math.pi, help='rotating angle of the characters in radians')
+    parser.add_argument('--brush', default=brushes.DEFAULT_BRUSH, choices=sorted(brushes.BRUSHES),
+                        help='brush mapping widths to the tool')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes')
+    parser.add_argument('--library', default=robot_writing_logics.CHAR_BIN_DIR, help='binary character library')
+    parser.add_argument('--cache', default=robot_writing_logics.CACHE_DIR, help='trajectory cache')
+    options = parser.parse_args(arguments)
+
+    texts = list(options.texts)
+    for url in options.file:
+        with open(url, 'r', encoding='utf-8') as file:
+            texts.append(file.read().strip('\n'))
+    if not texts:
+        parser.error('no text to plan')
+    charlib.binary.ensure_library(robot_writing_logics.CHAR_LIB_DIR, options.library)
+
+    plan_texts(texts, options.output, options.prefix, options.scale, options.angle, options.brush,
+               library_url=options.library, cache_url=options.cache, processes=options.processes)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
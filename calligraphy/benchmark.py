@@ -0,0 +1,474 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmarks of the trajectory planning hot path
+
+The strokes used here are generated synthetically, so the benchmarks can be run without data.json.
+Run this module to print the timings.
+"""
+import contextlib
+import copy
+import io
+import math
+import struct
+import time
+import numpy
+import brushes
+import easy_ur5
+import motion_monitor
+import program_cache
+import realtime_packet
+import robot_writing_logics
+import simplify
+import stroke_split
+import transform
+import ur5_simulator
+import urscript
+
+
+def synthetic_stroke(length=300, seed=0):
+    """
+    a wavy stroke in the format of data.json, with widths swelling and thinning along the way
+    :param length: number of points
+    :param seed: seed of the jitter of the points
+    :return: array of [[row, col], width]
+    """
+    random = numpy.random.RandomState(seed)
+    stroke = []
+    for i in range(length):
+        row = 40 + i * 220.0 / length + random.randint(0, 2)
+        col = 150 + 40 * math.sin(i / 25.0) + random.randint(0, 2)
+        width = 8 + 10 * abs(math.sin(i / 40.0))
+        stroke.append([[row, col], width])
+    return stroke
+
+
+def measure(function, repeat):
+    """
+    time a function
+    :param function: function without argument
+    :param repeat: number of calls
+    :return: the average time of a call in seconds
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def linear_function(x1, x2, y1, y2, x):
+    """
+    the line through (@x1, @y1) and (@x2, @y2) at @x, as the former double_linear3_mapping computed it
+    """
+    k = (y2 - y1) / (x2 - x1)
+    return k * (x - x1) + y1
+
+
+def loop_double_linear3_mapping(stroke_info, three_d_trajectory, scale_factor, start_position):
+    """
+    the former per-point implementation of double_linear3_mapping, kept as the baseline of benchmark_mapping
+    """
+    straight_width, middle_width, deepest_width = brushes.DOUBLE_LINEAR3.widths
+    straight_height, middle_height, deepest_height = brushes.DOUBLE_LINEAR3.depths
+    straight_deviation, middle_deviation, deepest_deviation = brushes.DOUBLE_LINEAR3.deviations
+    prev_point2d = stroke_info[0][0]
+    for point in stroke_info:
+        point3d = copy.deepcopy(point[0])
+        direction = numpy.array(point3d) - numpy.array(prev_point2d)
+        if prev_point2d == point3d:
+            standard_direction = 0
+        else:
+            standard_direction = numpy.array(direction) / numpy.linalg.norm(direction)
+        point3d = [x * scale_factor for x in point3d]
+        w = point[1] * scale_factor
+        if w > deepest_width:
+            w = deepest_width
+
+        if w <= middle_width:
+            deviation_needed = linear_function(straight_width, middle_width, straight_deviation, middle_deviation, w)
+            point3d = numpy.array(point3d) + numpy.array(standard_direction * deviation_needed)
+            depth = linear_function(straight_width, middle_width, straight_height, middle_height, w)
+        else:
+            deviation_needed = linear_function(middle_width, deepest_width, middle_deviation, deepest_deviation, w)
+            point3d = numpy.array(point3d) + numpy.array(standard_direction * deviation_needed)
+            depth = linear_function(middle_width, deepest_width, middle_height, deepest_height, w)
+        point3d = point3d.tolist()
+        point3d.append(depth)
+
+        point3d = numpy.array(point3d) + numpy.array(start_position)
+        point3d = point3d.tolist()
+        three_d_trajectory.append(point3d)
+        prev_point2d = point[0]
+
+
+def loop_rotate(character, angle):
+    """
+    the former in-place rotation of a character, one rotate_points call per point, kept as the baseline of
+    benchmark_mapping
+    """
+    origin = [150, 150]
+    for stroke in character:
+        for point in stroke:
+            px, py = point[0]
+            qx = origin[0] + math.cos(angle) * (px - origin[0]) - math.sin(angle) * (py - origin[1])
+            qy = origin[1] + math.sin(angle) * (px - origin[0]) + math.cos(angle) * (py - origin[1])
+            point[0] = qx, qy
+
+
+def stroke_array(stroke_info):
+    """
+    :param stroke_info: array of [[row, col], width] as in data.json
+    :return: (n, 3) array of [row, col, width]
+    """
+    return numpy.array([[point[0][0], point[0][1], point[1]] for point in stroke_info], dtype=float)
+
+
+def place_stroke(stroke, angle, scale_factor, start_position):
+    """
+    rotate, scale, place and map a stroke the way get_mover does
+    :param stroke: (n, 3) array of [row, col, width]
+    :param angle: rotating angle of the character
+    :param scale_factor: the scale of the character
+    :param start_position: start position of the character
+    :return: (n, 3) array of the positions of the tool
+    """
+    matrix = transform.character_transform(angle, scale_factor, start_position[0:2])
+    placed = transform.apply(matrix, stroke[:, 0:2])
+    return robot_writing_logics.brush_mapping(brushes.get('double_linear3'), placed, stroke[:, 2] * scale_factor,
+                                              start_position[2])
+
+
+def benchmark_mapping(repeat=20, scale_factor=0.0004, angle=math.pi):
+    """
+    compare the former per-point rotation and double_linear3_mapping with the affine transform and the lookup table of
+    the double_linear3 brush, and check that both plan the same up to rounding
+    :param repeat: number of calls
+    :param scale_factor: the scale of the character
+    :param angle: rotating angle of the character
+    :return: dictionary, key: name of the mapping value: average time per stroke in seconds
+    """
+    stroke_info = synthetic_stroke()
+    stroke = stroke_array(stroke_info)
+    start = robot_writing_logics.START_POSITION
+
+    def loop():
+        rotated = copy.deepcopy([stroke_info])
+        loop_rotate(rotated, angle)
+        trajectory = []
+        loop_double_linear3_mapping([[list(point[0]), point[1]] for point in rotated[0]], trajectory, scale_factor,
+                                    start)
+        return trajectory
+
+    before = numpy.array(loop())
+    after = place_stroke(stroke, angle, scale_factor, start)
+    assert numpy.allclose(before, after, rtol=0, atol=1e-12), 'the brush mapping differs from the former mapping'
+
+    return {
+        'loop_rotate_and_mapping': measure(loop, repeat),
+        'transform_and_mapping': measure(lambda: place_stroke(stroke, angle, scale_factor, start), repeat),
+    }
+
+
+def synthetic_character():
+    """
+    a character of three strokes in the format of data.json
+    :return: array of strokes
+    """
+    return [synthetic_stroke(300, 0), synthetic_stroke(120, 1), synthetic_stroke(200, 2)]
+
+
+def traced_stroke(length=300, phase=0):
+    """
+    a stroke as cv.cv traces it from a GIF: an 8-connected chain of whole pixels along a wave, with widths rounded as in
+    data.json
+    :param length: number of points the wave is sampled with before the pixels are chained
+    :param phase: phase of the swelling and thinning of the widths
+    :return: array of [[row, col], width]
+    """
+    stroke = []
+    for i in range(length * 4):
+        row = int(round(40 + i * 55.0 / length))
+        col = int(round(150 + 40 * math.sin(i / 100.0)))
+        if stroke and stroke[-1][0] == [row, col]:
+            continue
+        width = round(8 + 10 * abs(math.sin(i / 160.0 + phase)), 2)
+        stroke.append([[row, col], width])
+    return stroke
+
+
+def traced_character():
+    """
+    a character of three traced strokes in the format of data.json
+    :return: array of strokes
+    """
+    return [traced_stroke(300, 0), traced_stroke(120, 1), traced_stroke(200, 2)]
+
+
+def waypoint_report(characters, tolerance=robot_writing_logics.WAYPOINT_TOLERANCE, scale_factor=0.0004):
+    """
+    compare the waypoints kept by reduce_by_multiple (every 4th) with simplify.simplify, per character
+    :param characters: dictionary, key: name of the character value: array of strokes in the format of data.json
+    :param tolerance: max deviation of simplify.simplify in metres
+    :param scale_factor: the scale of the characters
+    :return: dictionary, key: name of the character value: dictionary of the number of waypoints before reducing, the
+        number of waypoints and the max error of both methods, and the number of waypoints sent once the tails of the
+        simplified sub-strokes are resampled for the speed ramps
+    """
+    report = {}
+    for name, strokes in characters.items():
+        row = {'waypoints': 0, 'multiple': 0, 'multiple_error': 0.0, 'simplified': 0, 'simplified_error': 0.0,
+               'sent': 0}
+        for stroke_info in strokes:
+            stroke = robot_writing_logics.get_mover(brushes.get('double_linear3'),
+                                                    stroke_array(stroke_info), transform.scaling(scale_factor), 0,
+                                                    robot_writing_logics.ORIENTATION, scale_factor)
+            for sub_stroke in robot_writing_logics.broke_stroke(stroke):
+                waypoints = sub_stroke[0]
+                multiple = robot_writing_logics.reduce_by_multiple(waypoints, 4)
+                simplified = simplify.simplify(waypoints, tolerance)
+                row['waypoints'] += len(waypoints)
+                row['multiple'] += len(multiple)
+                row['multiple_error'] = max(row['multiple_error'], simplify.max_error(waypoints, multiple))
+                row['simplified'] += len(simplified)
+                row['simplified_error'] = max(row['simplified_error'], simplify.max_error(waypoints, simplified))
+                row['sent'] += len(urscript.sub_stroke_waypoints(simplified, sub_stroke[1], sub_stroke[2])[0])
+        report[name] = row
+    return report
+
+
+def loop_broke_stroke(trajectory):
+    """
+    the former per-point implementation of broke_stroke, kept as the baseline of benchmark_split, for strokes of at least
+    11 waypoints (shorter strokes were returned without the slow down and first flags)
+    """
+    stroke_group = []
+    pointer1 = 0
+    for i in range(5, len(trajectory) - 5):
+        y_dif0 = trajectory[i][1] - trajectory[i - 1][1]
+        y_dif1 = trajectory[i + 1][1] - trajectory[i][1]
+        x_dif0 = trajectory[i][0] - trajectory[i - 1][0]
+        x_dif1 = trajectory[i + 1][0] - trajectory[i][0]
+
+        max_tolerance = 0.006
+        if (x_dif0 * x_dif1 < 0 and (abs(x_dif0) > max_tolerance or abs(x_dif1) > max_tolerance)) or \
+                (y_dif0 * y_dif1 < 0 and (abs(y_dif0) > max_tolerance or abs(y_dif1) > max_tolerance)):
+            stroke_group.append([trajectory[pointer1:i + 1], True])
+            pointer1 = i + 1
+    stroke_group.append([trajectory[pointer1:len(trajectory)], False])
+    stroke_group[0].append(True)
+    for i in range(1, len(stroke_group)):
+        stroke_group[i].append(False)
+    return stroke_group
+
+
+def random_trajectory(random):
+    """
+    a random walk of waypoints, with steps around the split tolerance and some repeated coordinates
+    :param random: numpy.random.RandomState
+    :return: array of [x, y, z, axis_1, axis_2, axis_3]
+    """
+    length = random.randint(11, 200)
+    steps = random.normal(0, 0.006, (length, 2))
+    steps[random.rand(length, 2) < 0.2] = 0
+    positions = numpy.cumsum(steps, axis=0)
+    return [[x, y, 0.01, 0, math.pi, 0] for x, y in positions.tolist()]
+
+
+def benchmark_split(cases=500, repeat=20, seed=0):
+    """
+    check on random trajectories that broke_stroke splits as the former implementation did, and time both
+    :param cases: number of random trajectories checked
+    :param repeat: number of calls timed
+    :param seed: seed of the random trajectories
+    :return: dictionary, key: name of the implementation value: average time per stroke in seconds, split_indices is
+        timed without the conversion of the waypoints to an array
+    """
+    random = numpy.random.RandomState(seed)
+    for _ in range(cases):
+        trajectory = random_trajectory(random)
+        before = loop_broke_stroke(trajectory)
+        after = robot_writing_logics.broke_stroke(trajectory)
+        assert [list(sub_stroke) for sub_stroke in after] == before, 'broke_stroke differs from the former split'
+
+    trajectory = robot_writing_logics.get_mover(brushes.get('double_linear3'),
+                                                stroke_array(synthetic_stroke()), transform.scaling(0.0004), 0,
+                                                robot_writing_logics.ORIENTATION, 0.0004)
+    positions = trajectory[:, 0:2]
+    # the former get_mover returned lists of waypoints
+    waypoints = trajectory.tolist()
+    return {
+        'loop_broke_stroke': measure(lambda: loop_broke_stroke(waypoints), repeat),
+        'broke_stroke': measure(lambda: robot_writing_logics.broke_stroke(trajectory), repeat),
+        'split_indices': measure(lambda: stroke_split.split_indices(positions), repeat),
+    }
+
+
+def synthetic_packet(seed=0):
+    """
+    a packet of the realtime interface with random values
+    :param seed: seed of the values
+    :return: bytes of the packet
+    """
+    packet = numpy.zeros(1, realtime_packet.PACKET_DTYPE)
+    random = numpy.random.RandomState(seed)
+    for name in realtime_packet.PACKET_DTYPE.names[1:]:
+        packet[0][name] = random.rand(*realtime_packet.PACKET_DTYPE.fields[name][0].shape)
+    packet[0]['message_size'] = realtime_packet.PACKET_SIZE
+    return packet.tobytes()
+
+
+def loop_parse_cartesian_info(data_bytes, byte_idx):
+    """
+    the former per-double parse of the tool pose, kept as the baseline of benchmark_decoder
+    """
+    actual_tool_pose = [0, 0, 0, 0, 0, 0]
+    for pose_value_idx in range(6):
+        actual_tool_pose[pose_value_idx] = struct.unpack('!d', data_bytes[(byte_idx + 0):(byte_idx + 8)])[0]
+        byte_idx += 8
+    return actual_tool_pose
+
+
+def benchmark_decoder(repeat=20000):
+    """
+    compare the decode time of a packet of the realtime interface, and check that all decoders read the same pose
+    :param repeat: number of packets decoded
+    :return: dictionary, key: name of the decoder value: average time per packet in seconds
+    """
+    packet = synthetic_packet()
+    offset = realtime_packet.TOOL_POSE_OFFSET
+    pose = loop_parse_cartesian_info(packet, offset)
+    assert realtime_packet.tool_pose(packet) == pose, 'tool_pose differs from the former parse'
+    assert realtime_packet.decode(packet)['tool_vector_actual'].tolist() == pose, 'decode differs from the former parse'
+    return {
+        'loop_parse_cartesian_info': measure(lambda: loop_parse_cartesian_info(packet, offset), repeat),
+        'tool_pose': measure(lambda: realtime_packet.tool_pose(packet), repeat),
+        'decode': measure(lambda: realtime_packet.decode(packet), repeat),
+        'decode_and_pose': measure(lambda: realtime_packet.decode(packet)['tool_vector_actual'].tolist(), repeat),
+    }
+
+
+def synthetic_char_mover():
+    """
+    the sub-strokes of a synthetic stroke
+    :return: array of stroke_split.SubStroke
+    """
+    trajectory = robot_writing_logics.get_mover(brushes.get('double_linear3'),
+                                                stroke_array(synthetic_stroke()), transform.scaling(0.0004), 0,
+                                                robot_writing_logics.ORIENTATION, 0.0004)
+    return stroke_split.split_stroke(trajectory)
+
+
+def benchmark_compile(repeat=200):
+    """
+    compare the time to build the scripts of a character, and check that the cached program is the generated one
+    :param repeat: number of times the scripts are built
+    :return: dictionary, key: way of building the scripts value: average time per character in seconds
+    """
+    char_mover = synthetic_char_mover()
+    cache = program_cache.ProgramCache(None)
+    program, _ = urscript.program(char_mover)
+    assert cache.compile(char_mover)[0] == (program + "%s()\n" % easy_ur5.PROGRAM_NAME).encode('utf-8'), \
+        'cached program differs from the generated one'
+    return {
+        'sub_stroke_program': measure(lambda: [easy_ur5.sub_stroke_program(*sub_stroke)
+                                               for sub_stroke in char_mover], repeat),
+        'urscript.program': measure(lambda: urscript.program(char_mover), repeat),
+        'ProgramCache.compile': measure(lambda: cache.compile(char_mover), repeat),
+    }
+
+
+def benchmark_pose_errors(cases=1000, repeat=20, seed=0):
+    """
+    compare easy_ur5.reached called per target with one motion_monitor.pose_errors over all targets, and check that
+    both accept the same targets
+    :param cases: number of targets
+    :param repeat: number of times the targets are checked
+    :param seed: seed of the poses
+    :return: dictionary, key: name of the check value: average time for all targets in seconds
+    """
+    random = numpy.random.RandomState(seed)
+    pose = [0.1, -0.4, 0.3, 0.0, math.pi, 0.0]
+    targets = numpy.array(pose) + random.normal(0, 1, (cases, 6)) * [0.001, 0.001, 0.001, 2, 2, 2]
+    target_lists = targets.tolist()
+
+    def loop_reached():
+        return [easy_ur5.reached(pose, target, easy_ur5.PATH_POSITION_TOLERANCE, easy_ur5.ANGLE_TOLERANCE)
+                for target in target_lists]
+
+    def vectorized():
+        positions, angles = motion_monitor.pose_errors(pose, targets)
+        return (positions < easy_ur5.PATH_POSITION_TOLERANCE) & (angles < easy_ur5.ANGLE_TOLERANCE)
+
+    assert loop_reached() == vectorized().tolist(), 'pose_errors differs from reached'
+    return {
+        'reached': measure(loop_reached, repeat),
+        'pose_errors': measure(vectorized, repeat),
+    }
+
+
+def benchmark_end_to_end(characters=3, time_scale=20.0):
+    """
+    write characters on ur5_simulator through EasyUr5, with one program per character and with one per sub-stroke
+    :param characters: number of characters written each way
+    :param time_scale: simulated seconds per second
+    :return: dictionary, key: way of writing value: dictionary of the seconds per character, the number of programs
+        sent and the average seconds the host took to send the next program after one finished
+    """
+    forward = synthetic_char_mover()
+    # the same stroke written backwards, so every character ends away from where the previous one ended
+    backward = [stroke_split.SubStroke(sub_stroke.points[::-1], sub_stroke.slow_down, sub_stroke.first)
+                for sub_stroke in reversed(forward)]
+    char_movers = [forward if i % 2 == 0 else backward for i in range(characters)]
+    simulator = ur5_simulator.Ur5Simulator(port=0, realtime_port=0, pose=forward[0].points[0],
+                                           time_scale=time_scale).start()
+    machine = easy_ur5.EasyUr5('127.0.0.1', simulator.port, simulator.realtime_port, program_cache.ProgramCache(None))
+
+    def write_characters():
+        for char_mover in char_movers:
+            machine.write_character(char_mover)
+
+    def write_sub_strokes():
+        with contextlib.redirect_stdout(io.StringIO()):
+            for char_mover in char_movers:
+                for sub_stroke in char_mover:
+                    machine.test_move_to_n(*sub_stroke)
+
+    results = {}
+    try:
+        for name, write in (('write_character', write_characters), ('test_move_to_n', write_sub_strokes)):
+            simulator.records = []
+            start = time.perf_counter()
+            write()
+            latencies = simulator.host_latencies()
+            results[name] = {
+                'seconds': (time.perf_counter() - start) / characters,
+                'programs': len(simulator.records),
+                'latency': sum(latencies) / len(latencies) if latencies else float('nan'),
+            }
+    finally:
+        machine.close()
+        simulator.stop()
+    return results
+
+
+if __name__ == '__main__':
+    for name, seconds in benchmark_mapping().items():
+        print('%-28s %8.3f ms per stroke' % (name, seconds * 1000))
+    for name, seconds in benchmark_split().items():
+        print('%-28s %8.3f ms per stroke' % (name, seconds * 1000))
+    for name, seconds in benchmark_decoder().items():
+        print('%-28s %8.3f us per packet' % (name, seconds * 1000000))
+    for name, seconds in benchmark_compile().items():
+        print('%-28s %8.3f ms per character' % (name, seconds * 1000))
+    for name, seconds in benchmark_pose_errors().items():
+        print('%-28s %8.3f ms per 1000 targets' % (name, seconds * 1000))
+    for name, row in benchmark_end_to_end().items():
+        print('%-28s %8.3f s per character, %d programs, %.3f ms host latency' % (name, row['seconds'],
+                                                                              row['programs'], row['latency'] * 1000))
+    print('%-10s %9s %9s %9s %12s %10s %12s %6s' % ('character', 'tolerance', 'waypoints', 'every 4th', 'max error mm',
+                                                   'simplified', 'max error mm', 'sent'))
+    characters = {'synthetic': synthetic_character(), 'traced': traced_character()}
+    for tolerance in (0.001, robot_writing_logics.WAYPOINT_TOLERANCE, 0.003):
+        for name, row in waypoint_report(characters, tolerance).items():
+            print('%-10s %9.4f %9d %9d %12.3f %10d %12.3f %6d' % (name, tolerance, row['waypoints'], row['multiple'],
+                                                                 row['multiple_error'] * 1000, row['simplified'],
+                                                                 row['simplified_error'] * 1000, row['sent']))
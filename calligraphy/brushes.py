@@ -0,0 +1,108 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Brush models, mapping the width of a stroke to the position of the tool
+
+A brush is calibrated by a table of widths and, for each width, the depth of the tool above the paper and the lateral
+deviation of the tool ahead of the tip of the brush. The table is compiled once into a dense lookup table over the
+widths, so mapping a stroke is a gather of the two neighbouring entries and a linear interpolation between them.
+Brushes are registered by name, to be selected without code edits.
+"""
+import collections
+import numpy
+
+# widths, depths and deviations in metres, widths ascending; widths past the ends of the table get the values at the end
+
+Brush = collections.namedtuple('Brush', ['name', 'widths', 'depths', 'deviations'])
+CompiledBrush = collections.namedtuple('CompiledBrush', ['brush', 'step', 'depths', 'deviations'])
+
+# width step of the lookup tables in metres
+
+LOOKUP_STEP = 0.000001
+
+DOUBLE_LINEAR3 = Brush(
+    name='double_linear3',
+    widths=[0.01 * 0, 0.01 * 0.3, 0.01 * 1.17],
+    depths=[0.01 * 1.3, 0.01 * 0.83, 0.01 * 0.37],
+    deviations=[0.01 * 0, 0.01 * 0.21, 0.01 * 0.1],
+)
+NAIVE = Brush(
+    name='naive',
+    widths=[0.0, 0.01],
+    depths=[0.01, 0.0],
+    deviations=[0.0, 0.0],
+)
+DEFAULT_BRUSH = DOUBLE_LINEAR3.name
+
+BRUSHES = {}
+
+
+def compile_brush(brush, step=LOOKUP_STEP):
+    """
+    interpolate the calibration table of a brush into a dense lookup table
+    :param brush: Brush
+    :param step: width step of the lookup table in metres
+    :return: CompiledBrush
+    """
+    if list(brush.widths) != sorted(brush.widths):
+        raise ValueError('widths of brush %s are not ascending' % brush.name)
+    grid = numpy.arange(int(numpy.ceil(brush.widths[-1] / step)) + 1) * step
+    depths = numpy.interp(grid, brush.widths, brush.depths)
+    deviations = numpy.interp(grid, brush.widths, brush.deviations)
+    depths.flags.writeable = False
+    deviations.flags.writeable = False
+    return CompiledBrush(brush, step, depths, deviations)
+
+
+def register(brush, step=LOOKUP_STEP):
+    """
+    compile a brush and register it under its name, replacing a brush of the same name
+    :param brush: Brush
+    :param step: width step of the lookup table in metres
+    :return: the CompiledBrush
+    """
+    BRUSHES[brush.name] = compile_brush(brush, step)
+    return BRUSHES[brush.name]
+
+
+def get(name):
+    """
+    :param name: name of a registered brush
+    :return: the CompiledBrush
+    """
+    if name not in BRUSHES:
+        raise KeyError('unknown brush %s, registered brushes: %s' % (name, ', '.join(sorted(BRUSHES))))
+    return BRUSHES[name]
+
+
+def lookup(compiled, widths):
+    """
+    look the depths and deviations of widths up, interpolating linearly between the neighbouring entries of the table
+    :param compiled: CompiledBrush
+    :param widths: array of widths in metres
+    :return: array of depths, array of deviations
+    """
+    position = numpy.asarray(widths, dtype=float) / compiled.step
+    if numpy.isnan(position).any():
+        raise ValueError('widths of a stroke mapped with brush %s contain NaN' % compiled.brush.name)
+    last = len(compiled.depths) - 1
+    if last == 0:
+        return numpy.full(position.shape, compiled.depths[0]), numpy.full(position.shape, compiled.deviations[0])
+    index = numpy.clip(numpy.floor(position), 0, last - 1).astype(numpy.intp)
+    fraction = numpy.clip(position - index, 0, 1)
+    depths = compiled.depths[index] + (compiled.depths[index + 1] - compiled.depths[index]) * fraction
+    deviations = compiled.deviations[index] + (compiled.deviations[index + 1] - compiled.deviations[index]) * fraction
+    return depths, deviations
+
+
+def calibration(compiled):
+    """
+    get what a plan made with a brush depends on
+    :param compiled: CompiledBrush
+    :return: array of the name, the calibration table and the lookup step
+    """
+    brush = compiled.brush
+    return [brush.name, list(brush.widths), list(brush.depths), list(brush.deviations), compiled.step]
+
+
+register(DOUBLE_LINEAR3)
+register(NAIVE)
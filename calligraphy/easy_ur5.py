@@ -4,49 +4,188 @@ robot_writing_logics holds an EasyUr5 object, and calls member method of this cl
 """
 import math
 import socket
-import struct
-import time
-import numpy
+import motion_monitor
+import program_cache
+import realtime_packet
+import ur5_constants
+import ur5_realtime
+import urscript
 
 HOST = "172.19.97.157"
 PORT_30002 = 30002
 PORT_30003 = 30003
-ROBOT_SPEED = 0.28
-ROBOT_ACCELERATION = 0.2
-BROKEN_FINAL_RATE = 0.1
-NORMAL_FINAL_RATE = 0.1
+ROBOT_SPEED = ur5_constants.ROBOT_SPEED
+ROBOT_ACCELERATION = ur5_constants.ROBOT_ACCELERATION
+BROKEN_FINAL_RATE = ur5_constants.BROKEN_FINAL_RATE
+NORMAL_FINAL_RATE = ur5_constants.NORMAL_FINAL_RATE
+# seconds to wait at most for a state from the realtime interface
+STATE_TIMEOUT = 1.0
+# seconds a move or a program may take at most before it is reported as failed
+MOTION_TIMEOUT = 120.0
+# a move is finished when the sum of the position errors and of the angle errors of the tool are below these
+MOVE_POSITION_TOLERANCE = 1e-2
+PATH_POSITION_TOLERANCE = 1e-3
+ANGLE_TOLERANCE = 0.1
+# TCP speed in m/s below which the tool counts as stopped at the end of a program
+STOP_SPEED = motion_monitor.STILL_SPEED
+PATH_TOLERANCES = motion_monitor.Tolerances(PATH_POSITION_TOLERANCE, ANGLE_TOLERANCE, STOP_SPEED)
+# script sent before every sub-stroke program
+ACTIVATE_SCRIPT = "rq_activate_and_wait()\n"
+PROGRAM_NAME = ur5_constants.PROGRAM_NAME
+
+
+def movel_command(position, r):
+    """
+    create the command moving the tool to @position
+    :param position: target position, [x, y, z, axis_1, axis_2, axis_3]
+    :param r: blend radius
+    :return: the command
+    """
+    command = "movel(p["
+    for i in range(5):
+        command = command + str(position[i]) + ", "
+    command = command + str(position[5])
+    command = command + "], a=" + str(ROBOT_ACCELERATION) + ", v=" + str(ROBOT_SPEED) + ", r= " + str(r) + ")\n"
+    return command
+
+
+def reached(current_pose, position, position_tolerance, angle_tolerance):
+    """
+    check if the tool is at @position, the rotation vector is compared both as is and negated
+    :param current_pose: actual position of the tool, [x, y, z, axis_1, axis_2, axis_3]
+    :param position: target position, [x, y, z, axis_1, axis_2, axis_3]
+    :param position_tolerance: bound of the sum of the position errors
+    :param angle_tolerance: bound of the sum of the angle errors
+    :return: True if the tool is at @position
+    """
+    error = 0
+    for i in range(3):
+        error += abs(current_pose[i] - position[i])
+    arg1, arg2 = 0, 0
+    for i in range(3, 6):
+        if abs(current_pose[i] - position[i]) > 2 * math.pi:
+            arg1 += (-abs(current_pose[i] - position[i]) + math.pi * 2)
+        else:
+            arg1 += abs(current_pose[i] - position[i])
+    for i in range(3, 6):
+        if abs(current_pose[i] + position[i]) > 2 * math.pi:
+            arg2 += (-abs(current_pose[i] + position[i]) + math.pi * 2)
+        else:
+            arg2 += abs(current_pose[i] + position[i])
+    return error < position_tolerance and min(arg1, arg2) < angle_tolerance
+
+
+def sub_stroke_program(pos_l, slow_down, first, r=0.002):
+    """
+    create the program following the trajectory of a sub-stroke
+    :param pos_l: position array
+    :param slow_down: boolean, if the stroke should slow down at the end of the sub-stroke
+    :param first: boolean, if the sub-stroke is the first of the stroke
+    :param r: blend radius
+    :return: positions the tool is moved to one by one before the program (the first two of the first sub-stroke),
+        the program, and the last position of the program
+    """
+    approach = []
+    move_cmd_ = "def %s():\n" % PROGRAM_NAME
+    pos_l, speeds = urscript.sub_stroke_waypoints(pos_l, slow_down, first)
+    argc = len(pos_l)
+    for i, pos in enumerate(pos_l):
+        if first and i < 2:
+            approach.append(pos)
+            continue
+        statement = "["
+        for item in range(5):
+            statement += str(pos[item]) + ", "
+        statement += str(pos[5]) + "]"
+        move_cmd_ += "  global Waypoint_%d_p=p%s\n" % (i + 1, statement)
+
+    move_cmd_ += "  $ 1 \"Robot Program\"\n  $ 2 \"MoveP\"\n"
+
+    for i in range(argc - 1):
+        if not slow_down and argc - 2 == i:
+            continue
+        if first and i < 2:
+            continue
+        move_cmd_ += "  $ %d \"Waypoint_%d\"\n" % (i + 3, i + 1)
+        move_cmd_ += "  movep(Waypoint_%d_p, a=%s, v=%.3f, r=%.3f)\n" % (
+            i + 1, str(ROBOT_ACCELERATION), speeds[i], r)
+
+    if slow_down:
+        move_cmd_ += "  $ %d \"Waypoint_%d\"\n" % (argc + 2, argc)
+        move_cmd_ += "  movep(Waypoint_%d_p, a=%s, v=%.3f)\n" % (
+            argc, str(ROBOT_ACCELERATION), BROKEN_FINAL_RATE * ROBOT_SPEED)
+    else:
+        move_cmd_ += "  $ %d \"Waypoint_%d\"\n" % (argc + 1, argc)
+        move_cmd_ += "  movep(Waypoint_%d_p, a=%s, v=%.3f, r=%.3f)\n" % (
+            argc - 1, str(ROBOT_ACCELERATION), NORMAL_FINAL_RATE * ROBOT_SPEED * 2, 0.001)
+        move_cmd_ += "  $ %d \"Waypoint_%d\"\n" % (argc + 2, argc)
+        move_cmd_ += "  movep(Waypoint_%d_p, a=%s, v=%.3f)\n" % (
+            argc, str(ROBOT_ACCELERATION), NORMAL_FINAL_RATE * ROBOT_SPEED * 2)
+
+    move_cmd_ += "end\n"
+    return approach, move_cmd_, pos_l[-1]
 
 
 class EasyUr5:
     """
     UR5 API class
     """
-    def __init__(self):
+    def __init__(self, host=HOST, port=PORT_30002, realtime_port=PORT_30003, programs=None,
+                 motion_timeout=MOTION_TIMEOUT):
         """
         create connection between local machine and UR5
+        :param host: address of UR5
+        :param port: port the scripts are sent to
+        :param realtime_port: port of the realtime interface the state of UR5 is read from
+        :param programs: program_cache.ProgramCache of the compiled programs, None for one in program_cache.PROGRAM_DIR
+        :param motion_timeout: seconds a move or a program may take at most, None for no limit
         """
         self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.socket.connect((HOST, PORT_30002))
+        self.socket.connect((host, port))
+        self.realtime = ur5_realtime.RealtimeReader(host, realtime_port).start()
+        self.monitor = motion_monitor.MotionMonitor(self.realtime)
+        self.motion_timeout = motion_timeout
+        self.activated = False
+        self.programs = programs if programs is not None else program_cache.ProgramCache()
+
+    def close(self):
+        """
+        close the connections to UR5
+        :return: None
+        """
+        self.monitor.close()
+        self.realtime.stop()
+        self.socket.close()
+
+    def get_state(self, after=None):
+        """
+        get the latest state of UR5 from the realtime reader, no network access unless no state is received yet
+        :param after: ur5_realtime.RealtimeState already seen, to wait for a newer one; None for the latest one
+        :return: ur5_realtime.RealtimeState
+        """
+        state = self.realtime.latest()
+        if state is None or (after is not None and state.sequence <= after.sequence):
+            state = self.realtime.wait_for_state(after, STATE_TIMEOUT)
+        return state
 
     def get_pose(self):
         """
         get the position of the tool of UR5
         :return: the position of the tool of UR5
         """
-        socket1 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        socket1.connect((HOST, PORT_30003))
-        socket1.settimeout(1)
-        try:
-            socket_res = socket1.recv(1108)
-        except Exception as e:
-            socket1 = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            socket1.connect((HOST, PORT_30003))
-            socket1.settimeout(1)
-            print(e)
-
-        pose = self.parse_cartesian_info(socket_res, 4 + 8 + 48 * 9 + 0 * 8)
-        socket1.close()
-        return pose
+        return list(self.get_state().pose)
+
+    def send_and_wait(self, data, target, tolerances):
+        """
+        send a script and wait until the motion it starts is finished
+        :param data: encoded script
+        :param target: position the tool reaches when the script is finished
+        :param tolerances: motion_monitor.Tolerances of the end of the motion
+        :return: the ur5_realtime.RealtimeState in which the motion is finished
+        """
+        future = self.monitor.watch(target, tolerances, self.motion_timeout, self.realtime.latest())
+        self.socket.sendall(data)
+        return self.monitor.wait(future, None if self.motion_timeout is None else self.motion_timeout + STATE_TIMEOUT)
 
     @staticmethod
     def parse_cartesian_info(data_bytes, byte_idx):
@@ -56,11 +195,7 @@ class EasyUr5:
         :param byte_idx: the index of current cursor
         :return: the actual position of the tool
         """
-        actual_tool_pose = [0, 0, 0, 0, 0, 0]
-        for pose_value_idx in range(6):
-            actual_tool_pose[pose_value_idx] = struct.unpack('!d', data_bytes[(byte_idx + 0):(byte_idx + 8)])[0]
-            byte_idx += 8
-        return actual_tool_pose
+        return list(realtime_packet.TOOL_POSE.unpack_from(data_bytes, byte_idx))
 
     def test_move_to(self, position, r=0.001):
         """
@@ -69,39 +204,34 @@ class EasyUr5:
         :param r: blend radius
         :return: ok if finished this function without exception
         """
-        # create command
-        command = "movel(p["
-        for i in range(5):
-            command = command + str(position[i]) + ", "
-        command = command + str(position[5])
-        command = command + "], a=" + str(ROBOT_ACCELERATION) + ", v=" + str(ROBOT_SPEED) + ", r= " + str(r) + ")\n"
+        command = movel_command(position, r)
         # send command
         print(command)
-        self.socket.sendall(command.encode('utf-8'))
-        while True:
-            time.sleep(0.002)
-            current_pose = self.get_pose()
-            error = 0
-            for i in range(3):
-                error += abs(current_pose[i] - position[i])
-            arg1, arg2 = 0, 0
-            for i in range(3, 6):
-                if abs(current_pose[i] - position[i]) > 2 * math.pi:
-                    arg1 += (-abs(current_pose[i] - position[i]) + math.pi * 2)
-                else:
-                    arg1 += abs(current_pose[i] - position[i])
-            for i in range(3, 6):
-                if abs(current_pose[i] + position[i]) > 2 * math.pi:
-                    arg2 += (-abs(current_pose[i] + position[i]) + math.pi * 2)
-                else:
-                    arg2 += abs(current_pose[i] + position[i])
-
-            if error < 1e-2 and min(arg1, arg2) < 0.1 + r * 3 * math.pi:
-                print('break')
-                break
+        tolerances = motion_monitor.Tolerances(MOVE_POSITION_TOLERANCE, ANGLE_TOLERANCE + r * 3 * math.pi, None)
+        self.send_and_wait(command.encode('utf-8'), position, tolerances)
         print('finished')
         return 'ok'
 
+    def activate(self):
+        """
+        send ACTIVATE_SCRIPT, once per connection
+        :return: None
+        """
+        if not self.activated:
+            self.socket.sendall(ACTIVATE_SCRIPT.encode('utf-8'))
+            self.activated = True
+
+    def write_character(self, char_mover, r=0.002):
+        """
+        write all sub-strokes of a character with one program
+        :param char_mover: array of stroke_split.SubStroke or [points, slow_down, first] of the character
+        :param r: blend radius
+        :return: None
+        """
+        data, endpos = self.programs.compile(char_mover, PROGRAM_NAME, r)
+        self.activate()
+        self.send_and_wait(data, endpos, PATH_TOLERANCES)
+
     def test_move_to_n(self, pos_l, slow_down, first, r=0.002):
         """
         move follow a trajectory of a sub-stroke
@@ -111,74 +241,9 @@ class EasyUr5:
         :param r: blend radius
         :return: None
         """
-        move_cmd_ = "def tes():\n"
-        if not slow_down:
-            midway = (numpy.array(pos_l[-2]) + numpy.array(pos_l[-1])) * 0.5
-            midway[2] = midway[2] - 0.0125
-            pos_l = numpy.insert(pos_l, -1, midway, axis=0)
-        argc = len(pos_l)
-        for i, pos in enumerate(pos_l):
-            if first and i < 2:
-                self.test_move_to(pos, 0.0)
-                continue
-            statement = "["
-            for item in range(5):
-                statement += str(pos[item]) + ", "
-            statement += str(pos[5]) + "]"
-            move_cmd_ += "  global Waypoint_%d_p=p%s\n" % (i + 1, statement)
-
-        move_cmd_ += "  $ 1 \"Robot Program\"\n  $ 2 \"MoveP\"\n"
-
-        broken_decrease_unit = ((1 - BROKEN_FINAL_RATE) * ROBOT_SPEED) / 35
-        decrease_unit = ((1 - NORMAL_FINAL_RATE) * ROBOT_SPEED) / 12
-        for i in range(argc - 1):
-            speed = ROBOT_SPEED
-            if not slow_down and argc - 2 == i:
-                continue
-            if slow_down and i >= argc - 1 - 35:
-                speed = ROBOT_SPEED - broken_decrease_unit * (i - (argc - 1 - 35))
-            if not slow_down and i >= argc - 1 - 12:
-                speed = ROBOT_SPEED - decrease_unit * (i - (argc - 1 - 12))
-            if first and i < 2:
-                continue
-            move_cmd_ += "  $ %d \"Waypoint_%d\"\n" % (i + 3, i + 1)
-            move_cmd_ += "  movep(Waypoint_%d_p, a=%s, v=%.3f, r=%.3f)\n" % (i + 1, str(ROBOT_ACCELERATION), speed, r)
-
-        if slow_down:
-            move_cmd_ += "  $ %d \"Waypoint_%d\"\n" % (argc + 2, argc)
-            move_cmd_ += "  movep(Waypoint_%d_p, a=%s, v=%.3f)\n" % (
-                argc, str(ROBOT_ACCELERATION), BROKEN_FINAL_RATE * ROBOT_SPEED)
-        else:
-            move_cmd_ += "  $ %d \"Waypoint_%d\"\n" % (argc + 1, argc)
-            move_cmd_ += "  movep(Waypoint_%d_p, a=%s, v=%.3f, r=%.3f)\n" % (
-                argc - 1, str(ROBOT_ACCELERATION), NORMAL_FINAL_RATE * ROBOT_SPEED * 2, 0.001)
-            move_cmd_ += "  $ %d \"Waypoint_%d\"\n" % (argc + 2, argc)
-            move_cmd_ += "  movep(Waypoint_%d_p, a=%s, v=%.3f)\n" % (
-                argc, str(ROBOT_ACCELERATION), NORMAL_FINAL_RATE * ROBOT_SPEED * 2)
-
-        move_cmd_ += "end\n"
+        approach, move_cmd_, endpos = sub_stroke_program(pos_l, slow_down, first, r)
+        for pos in approach:
+            self.test_move_to(pos, 0.0)
         print(move_cmd_)
-        self.socket.sendall("rq_activate_and_wait()\n".encode('utf-8'))
-        self.socket.sendall(move_cmd_.encode('utf-8'))
-        self.socket.sendall("tes()\n".encode('utf-8'))
-
-        endpos = pos_l[-1]
-        while True:
-            time.sleep(0.005)
-            current_pose = self.get_pose()
-            error = 0
-            for i in range(3):
-                error += abs(current_pose[i] - endpos[i])
-            angerr1, angerr2 = 0, 0
-            for i in range(3, 6):
-                if abs(current_pose[i] - endpos[i]) > 2 * math.pi:
-                    angerr1 += (-abs(current_pose[i] - endpos[i]) + math.pi * 2)
-                else:
-                    angerr1 += abs(current_pose[i] - endpos[i])
-            for i in range(3, 6):
-                if abs(current_pose[i] + endpos[i]) > 2 * math.pi:
-                    angerr2 += (-abs(current_pose[i] + endpos[i]) + math.pi * 2)
-                else:
-                    angerr2 += abs(current_pose[i] + endpos[i])
-            if error < 1e-3 and min(angerr1, angerr2) < 0.1:
-                break
+        data = (ACTIVATE_SCRIPT + move_cmd_ + "%s()\n" % PROGRAM_NAME).encode('utf-8')
+        self.send_and_wait(data, endpos, PATH_TOLERANCES)
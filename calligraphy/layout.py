@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Page layout of texts
+
+A text is laid out in cells of the size of a character, along lines that wrap at the margins of the page, and onto new
+pages when a page is full. Lines run down the glyphs with columns from right to left when writing vertically, and
+along the glyphs with lines from top to bottom when writing horizontally; the directions follow the rotation of the
+characters. All origins are computed up front, so a whole text is planned in one pass.
+"""
+import collections
+import math
+import numpy
+import transform
+
+# corner: [x, y, z] of the corner of the page where writing starts, top right when vertical and top left when horizontal
+# width: size of the page across the glyphs in metres
+# height: size of the page down the glyphs in metres
+# margin: empty border of the page in metres
+# vertical: True for columns from right to left, False for lines from top to bottom
+# character_spacing: gap between characters of a line in metres
+# line_spacing: gap between lines in metres
+
+PageSpec = collections.namedtuple('PageSpec', ['corner', 'width', 'height', 'margin', 'vertical', 'character_spacing',
+                                               'line_spacing'])
+
+# characters: array of the characters written, whitespace left out
+# origins: (n, 3) array of [x, y, z] of the origins of the characters, see transform.character_transform
+# pages: array of n indices of the pages of the characters
+
+Layout = collections.namedtuple('Layout', ['characters', 'origins', 'pages'])
+
+GLYPH_SIZE = 300
+
+
+def glyph_directions(angle):
+    """
+    get the directions of the glyphs on the paper
+    :param angle: rotating angle of the characters
+    :return: [x, y] of the downward direction of the glyphs, [x, y] of the rightward direction of the glyphs
+    """
+    rotation = transform.rotation_about([0, 0], angle)[0:2, 0:2]
+    return rotation.dot([1.0, 0.0]), rotation.dot([0.0, 1.0])
+
+
+def capacity(length, margin, cell, spacing):
+    """
+    :param length: size of the page along a direction in metres
+    :param margin: empty border of the page in metres
+    :param cell: size of a character in metres
+    :param spacing: gap between cells in metres
+    :return: number of cells that fit in @length
+    """
+    return int(math.floor((length - 2 * margin + spacing) / (cell + spacing) + 1e-9))
+
+
+def cells(text, per_line, lines_per_page):
+    """
+    assign the characters of a text to cells, spaces take a cell and newlines start a new line
+    :param text: the text
+    :param per_line: number of characters in a line
+    :param lines_per_page: number of lines in a page
+    :return: array of the characters, and (n, 3) int array of [page, line, position] of their cells
+    """
+    characters = []
+    positions = []
+    line = 0
+    position = 0
+    for character in text:
+        if character == '\n':
+            line += 1
+            position = 0
+            continue
+        if position == per_line:
+            line += 1
+            position = 0
+        if not character.isspace():
+            characters.append(character)
+            positions.append([line // lines_per_page, line % lines_per_page, position])
+        position += 1
+    return characters, numpy.array(positions, dtype=int).reshape(-1, 3)
+
+
+def layout_text(text, page, scale, angle):
+    """
+    lay a text out on pages
+    :param text: the text, newlines start a new line
+    :param page: PageSpec of the pages
+    :param scale: a constant scalar, used for adjust the size of character you wanted to write
+    :param angle: rotating angle of the characters
+    :return: Layout
+    """
+    cell = GLYPH_SIZE * scale
+    down, right = glyph_directions(angle)
+    if page.vertical:
+        along, across = down, -right
+        along_length, across_length = page.height, page.width
+    else:
+        along, across = right, down
+        along_length, across_length = page.width, page.height
+    per_line = capacity(along_length, page.margin, cell, page.character_spacing)
+    lines_per_page = capacity(across_length, page.margin, cell, page.line_spacing)
+    if per_line < 1 or lines_per_page < 1:
+        raise ValueError('a character of scale %s does not fit in the page' % scale)
+
+    characters, positions = cells(text, per_line, lines_per_page)
+    along_offsets = page.margin + positions[:, 2] * (cell + page.character_spacing) + cell / 2
+    across_offsets = page.margin + positions[:, 1] * (cell + page.line_spacing) + cell / 2
+    centres = numpy.array(page.corner[0:2], dtype=float) + numpy.outer(along_offsets, along) + \
+        numpy.outer(across_offsets, across)
+
+    origins = numpy.empty((len(characters), 3))
+    origins[:, 0:2] = centres - numpy.array(transform.GLYPH_CENTRE) * scale
+    origins[:, 2] = page.corner[2]
+    return Layout(characters, origins, positions[:, 0])
@@ -0,0 +1,273 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Detection of the end of the motions of UR5 from its realtime stream
+
+A MotionMonitor listens to the states published by ur5_realtime.RealtimeReader and checks every watched motion
+against each new packet, so the caller only waits on a future and the host does nothing in between. A motion is
+finished when the pose of the tool is within the tolerances of its target and, unless the tolerances say otherwise, the
+program is no longer playing and the TCP has stopped. States older than the command are not used, and a tool that
+already rests at the target only counts once the program had time to start, so a program is not taken as finished
+before it ran. A motion fails with TimeoutError when its deadline passes and with MotionStalled when the tool stands
+still away from the target for too long while no program is playing, so waiting in a program (rq_activate_and_wait)
+is not a stall. Every future is settled once, whichever of the reader thread, close and a timed out wait gets to it
+first. With the short packets of older controllers, the speed is taken from the last two poses when the packet does
+not hold the TCP speed, and the program counts as not playing without its state.
+
+    future = monitor.watch(target, PATH_TOLERANCES, timeout=60.0, after=state_before_sending)
+    future.add_done_callback(...)
+    state = monitor.wait(future)
+"""
+import collections
+import concurrent.futures
+import math
+import threading
+import time
+import numpy
+import realtime_packet
+
+# TCP speed in m/s below which the tool counts as standing still
+STILL_SPEED = 1e-3
+# seconds the tool may stand still away from the target before the motion is reported stalled
+STALL_TIME = 2.0
+# seconds after which a tool resting at the target counts as arrived, even if the program was never seen running
+START_TIME = 0.5
+
+# position: bound of the sum of the position errors in metres
+# angle: bound of the sum of the angle errors in radians, the rotation vector is compared both as is and negated
+# speed: TCP speed in m/s below which the tool counts as stopped at the target, None to finish as soon as the pose is
+#     within the bounds, while the tool may still move
+
+Tolerances = collections.namedtuple('Tolerances', ['position', 'angle', 'speed'])
+
+
+class MotionStalled(RuntimeError):
+    """
+    the tool stands still away from the target of a motion
+    """
+
+
+def pose_errors(poses, targets):
+    """
+    compute the errors of poses against targets, with the rules of easy_ur5.reached
+    :param poses: array of [x, y, z, axis_1, axis_2, axis_3], or one pose
+    :param targets: array of [x, y, z, axis_1, axis_2, axis_3], or one pose, broadcast against @poses
+    :return: sums of the position errors, and sums of the angle errors
+    """
+    poses = numpy.asarray(poses, dtype=float)
+    targets = numpy.asarray(targets, dtype=float)
+    position = numpy.abs(poses[..., 0:3] - targets[..., 0:3]).sum(axis=-1)
+    direct = numpy.abs(poses[..., 3:6] - targets[..., 3:6])
+    negated = numpy.abs(poses[..., 3:6] + targets[..., 3:6])
+    direct = numpy.where(direct > 2 * math.pi, 2 * math.pi - direct, direct).sum(axis=-1)
+    negated = numpy.where(negated > 2 * math.pi, 2 * math.pi - negated, negated).sum(axis=-1)
+    return position, numpy.minimum(direct, negated)
+
+
+def tcp_speed(state, previous):
+    """
+    get the speed of the TCP, from the packet or, for older controllers which do not send it, from the last two poses
+    :param state: ur5_realtime.RealtimeState
+    :param previous: the ur5_realtime.RealtimeState before @state, None if there is none
+    :return: the speed in m/s, inf if it is unknown
+    """
+    if realtime_packet.has_field(state.packet, 'tcp_speed_actual'):
+        velocity = state.packet['tcp_speed_actual'][0:3]
+        return float(numpy.sqrt(numpy.dot(velocity, velocity)))
+    if previous is None or state.timestamp <= previous.timestamp:
+        return float('inf')
+    moved = numpy.subtract(state.pose[0:3], previous.pose[0:3])
+    return float(numpy.sqrt(numpy.dot(moved, moved))) / (state.timestamp - previous.timestamp)
+
+
+def program_playing(packet):
+    """
+    :param packet: numpy record returned by realtime_packet.decode
+    :return: True if a program is playing, False if it is not or the packet does not hold the program state
+    """
+    return realtime_packet.has_field(packet, 'program_state') and \
+        int(packet['program_state']) == realtime_packet.PROGRAM_STATE_PLAYING
+
+
+def packet_value(packet, name):
+    """
+    :param packet: numpy record returned by realtime_packet.decode
+    :param name: name of a scalar field
+    :return: the field as an int, -1 if the packet does not hold it
+    """
+    return int(packet[name]) if realtime_packet.has_field(packet, name) else -1
+
+
+def settle(future, result, error):
+    """
+    resolve a future unless it is cancelled or settled by another thread already
+    :param future: concurrent.futures.Future of a motion
+    :param result: the result, used if @error is None
+    :param error: the exception, None to set @result
+    :return: True if this call settled @future
+    """
+    try:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+    except concurrent.futures.InvalidStateError:
+        # cancelled by a wait which timed out, or settled by close in another thread
+        return False
+    return True
+
+
+class Motion:
+    """
+    a watched motion
+    """
+    def __init__(self, target, tolerances, deadline, after, created):
+        """
+        :param target: [x, y, z, axis_1, axis_2, axis_3]
+        :param tolerances: Tolerances
+        :param deadline: time.monotonic() after which the motion fails, None for no deadline
+        :param after: sequence of the last state before the command, -1 for none
+        :param created: time.monotonic() when the motion is watched
+        """
+        self.target = numpy.array(target, dtype=float)
+        self.tolerances = tolerances
+        self.deadline = deadline
+        self.after = after
+        self.created = created
+        self.started = False
+        self.still_since = None
+        self.future = concurrent.futures.Future()
+
+    def check(self, state, position, angle, speed, playing, still, stall_time, start_time):
+        """
+        check the motion against a new state
+        :param state: ur5_realtime.RealtimeState
+        :param position: sum of the position errors of the pose of @state against the target
+        :param angle: sum of the angle errors of the pose of @state against the target
+        :param speed: speed of the TCP in m/s, see tcp_speed
+        :param playing: True if a program is playing
+        :param still: True if the tool stands still
+        :param stall_time: seconds the tool may stand still away from the target, None to never report a stall
+        :param start_time: seconds after which a tool resting at the target counts as arrived
+        :return: (@state, None) if the motion is finished, (None, exception) if it failed, None otherwise
+        """
+        now = state.received
+        tolerances = self.tolerances
+        if playing or not still:
+            self.started = True
+        if position < tolerances.position and angle < tolerances.angle and (tolerances.speed is None or (
+                speed < tolerances.speed and not playing and (self.started or now - self.created >= start_time))):
+            return state, None
+        if self.deadline is not None and now > self.deadline:
+            return None, TimeoutError('motion to %s not finished within its deadline, the tool is at %s' %
+                                      (self.target.tolist(), state.pose))
+        if not still or playing:
+            self.still_since = None
+        elif self.still_since is None:
+            self.still_since = now
+        elif stall_time is not None and now - self.still_since > stall_time:
+            return None, MotionStalled(
+                'the tool stands still at %s for %.1f s, %.4f m and %.4f rad from the target %s '
+                '(program state %d, safety mode %d)' %
+                (state.pose, now - self.still_since, position, angle, self.target.tolist(),
+                 packet_value(state.packet, 'program_state'), packet_value(state.packet, 'safety_mode')))
+        return None
+
+
+class MotionMonitor:
+    """
+    checks the watched motions against every state of a ur5_realtime.RealtimeReader
+    """
+    def __init__(self, reader, stall_time=STALL_TIME, still_speed=STILL_SPEED, start_time=START_TIME):
+        """
+        :param reader: ur5_realtime.RealtimeReader
+        :param stall_time: seconds the tool may stand still away from a target, None to never report stalls
+        :param still_speed: TCP speed in m/s below which the tool counts as standing still
+        :param start_time: seconds after which a tool resting at a target counts as arrived
+        """
+        self.reader = reader
+        self.stall_time = stall_time
+        self.still_speed = still_speed
+        self.start_time = start_time
+        self.lock = threading.Lock()
+        self.motions = []
+        # the state before the last one, for the speed of packets without tcp_speed_actual
+        self.previous = None
+        reader.add_listener(self.update)
+
+    def close(self):
+        """
+        stop listening, the motions still watched fail with ConnectionError
+        :return: None
+        """
+        self.reader.remove_listener(self.update)
+        with self.lock:
+            motions, self.motions = self.motions, []
+        for motion in motions:
+            settle(motion.future, None, ConnectionError('motion monitor closed'))
+
+    def watch(self, target, tolerances, timeout=None, after=None):
+        """
+        watch a motion, call it right before the command is sent
+        :param target: [x, y, z, axis_1, axis_2, axis_3] the tool moves to
+        :param tolerances: Tolerances
+        :param timeout: seconds the motion may take at most, None for no limit
+        :param after: ur5_realtime.RealtimeState received before the command was sent, None for the latest state
+        :return: concurrent.futures.Future resolved with the ur5_realtime.RealtimeState in which the motion is
+            finished; callbacks are called in the reader thread
+        """
+        if after is None:
+            after = self.reader.latest()
+        now = time.monotonic()
+        motion = Motion(target, tolerances, None if timeout is None else now + timeout,
+                        -1 if after is None else after.sequence, now)
+        with self.lock:
+            self.motions.append(motion)
+        return motion.future
+
+    def wait(self, future, timeout=None):
+        """
+        wait for a watched motion
+        :param future: future returned by watch
+        :param timeout: seconds to wait at most, None for no limit; covers a stream that stopped, the deadline of the
+            motion itself is checked on every state. the motion is no longer watched when the wait times out
+        :return: the ur5_realtime.RealtimeState in which the motion is finished
+        """
+        try:
+            return future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            if future.done():
+                # the motion failed with its own TimeoutError, which concurrent.futures.TimeoutError may alias
+                raise
+            if not future.cancel():
+                # the reader thread settled the motion right after the timeout
+                return future.result()
+            raise TimeoutError('no end of the motion within %s s, no state from UR5 may have arrived' % timeout)
+
+    def update(self, state):
+        """
+        check the watched motions against a new state, listener of the reader
+        :param state: ur5_realtime.RealtimeState
+        :return: None
+        """
+        previous, self.previous = self.previous, state
+        with self.lock:
+            # futures cancelled by their callers are dropped
+            self.motions = [motion for motion in self.motions if not motion.future.done()]
+            motions = [motion for motion in self.motions if motion.after < state.sequence]
+        if not motions:
+            return
+        speed = tcp_speed(state, previous)
+        playing = program_playing(state.packet)
+        positions, angles = pose_errors(state.pose, numpy.array([motion.target for motion in motions]))
+        outcomes = []
+        for motion, position, angle in zip(motions, positions, angles):
+            outcome = motion.check(state, position, angle, speed, playing, speed < self.still_speed,
+                                   self.stall_time, self.start_time)
+            if outcome is not None:
+                outcomes.append((motion,) + outcome)
+        if not outcomes:
+            return
+        with self.lock:
+            self.motions = [motion for motion in self.motions if all(motion is not done for done, _, _ in outcomes)]
+        for motion, result, error in outcomes:
+            settle(motion.future, result, error)
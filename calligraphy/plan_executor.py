@@ -0,0 +1,59 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Executor of plans
+
+Streams a plan to UR5 in writing order, one program per character, with no planning at run time. Run this module with
+the url of a plan file written by batch_planner to write it, and optionally the address of UR5.
+"""
+import sys
+import easy_ur5
+import plan_file
+
+
+def wait_for_page(page_index):
+    """
+    wait for the user to put a new page
+    :param page_index: index of the page to be written
+    :return: None
+    """
+    input('put page %d and press enter' % (page_index + 1))
+
+
+def execute_characters(chars, machine, next_page=wait_for_page):
+    """
+    write planned characters, each with one program
+    :param chars: iterable of (page index, array of sub-strokes of the character) in writing order
+    :param machine: UR5 client
+    :param next_page: function called with the index of a page before it is written, but the first one
+    :return: None
+    """
+    current_page = 0
+    for page_index, char_mover in chars:
+        if page_index != current_page:
+            next_page(page_index)
+            current_page = page_index
+        machine.write_character(char_mover)
+
+
+def execute_file(url, machine, next_page=wait_for_page):
+    """
+    write a plan file
+    :param url: the url of the plan file
+    :param machine: UR5 client
+    :param next_page: function called with the index of a page before it is written, but the first one
+    :return: None
+    """
+    plan = plan_file.PlanFile(url)
+    try:
+        print('writing', plan.metadata.get('text'), '(%d sub-strokes)' % len(plan))
+        execute_characters(plan.characters(), machine, next_page)
+    finally:
+        plan.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) not in (2, 3):
+        print('usage: plan_executor.py <plan file> [host of UR5, or of ur5_simulator]')
+        sys.exit(1)
+    MACHINE = easy_ur5.EasyUr5(sys.argv[2] if len(sys.argv) == 3 else easy_ur5.HOST)
+    execute_file(sys.argv[1], MACHINE)
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Plan files
+
+A plan file holds everything UR5 needs to write a text, so it can be written without planning anything at run time:
+
+    header     magic, version, length of the metadata, number of sub-strokes, number of waypoints
+    metadata   utf-8 JSON of the text and the parameters it was planned with
+    index      (page, character, first waypoint, waypoint count, slow down, first) per sub-stroke, in writing order
+    waypoints  (x, y, z, axis_1, axis_2, axis_3) float64 per waypoint
+
+The file is opened with mmap and the sub-strokes are read one at a time.
+"""
+import json
+import mmap
+import os
+import struct
+import numpy
+import stroke_split
+
+MAGIC = b'CPLN'
+VERSION = 1
+HEADER = struct.Struct('<4sIIII4x')
+INDEX_DTYPE = numpy.dtype([('page', '<u4'), ('character', '<u4'), ('first_waypoint', '<u4'), ('waypoint_count', '<u4'),
+                           ('slow_down', 'u1'), ('first', 'u1'), ('padding', 'V2')])
+WAYPOINT_DTYPE = numpy.dtype('<f8')
+
+
+def write_plan(url, chars, metadata):
+    """
+    write a plan file, the file is written to a temporary file first and then moved over @url
+    :param url: the url of the plan file
+    :param chars: array of (page index, array of sub-strokes) of the characters in writing order, a sub-stroke is
+        stroke_split.SubStroke or [points, slow_down, first]
+    :param metadata: JSON serializable dictionary
+    :return: none
+    """
+    sub_strokes = [(page_index, character, stroke_split.SubStroke(*sub_stroke))
+                   for character, (page_index, char_mover) in enumerate(chars) for sub_stroke in char_mover]
+    index = numpy.zeros(len(sub_strokes), INDEX_DTYPE)
+    first_waypoint = 0
+    for i, (page_index, character, sub_stroke) in enumerate(sub_strokes):
+        index[i] = (page_index, character, first_waypoint, len(sub_stroke.points), sub_stroke.slow_down,
+                    sub_stroke.first, b'')
+        first_waypoint += len(sub_stroke.points)
+    waypoints = numpy.array([waypoint for _, _, sub_stroke in sub_strokes for waypoint in sub_stroke.points],
+                            WAYPOINT_DTYPE).reshape(-1, 6)
+    encoded = json.dumps(metadata, ensure_ascii=False).encode('utf-8')
+
+    temp_url = url + '.tmp'
+    with open(temp_url, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(encoded), len(index), len(waypoints)))
+        file.write(encoded)
+        file.write(index.tobytes())
+        file.write(waypoints.tobytes())
+    os.replace(temp_url, url)
+
+
+class PlanFile:
+    """
+    read-only view of a plan file
+    """
+    def __init__(self, url):
+        """
+        map a plan file into memory
+        :param url: the url of the plan file
+        """
+        with open(url, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, metadata_size, sub_stroke_count, waypoint_count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a plan file of version %d: %s' % (VERSION, url))
+        offset = HEADER.size
+        self.metadata = json.loads(self.buffer[offset:offset + metadata_size].decode('utf-8'))
+        offset += metadata_size
+        self.index = numpy.frombuffer(self.buffer, INDEX_DTYPE, sub_stroke_count, offset)
+        offset += self.index.nbytes
+        self.waypoints = numpy.frombuffer(self.buffer, WAYPOINT_DTYPE, waypoint_count * 6, offset).reshape(-1, 6)
+
+    def __len__(self):
+        return len(self.index)
+
+    def sub_strokes(self):
+        """
+        iterate over the sub-strokes in writing order
+        :return: generator of (page index, stroke_split.SubStroke), points are arrays of [x, y, z, axis_1, axis_2, axis_3]
+        """
+        for entry in self.index:
+            first = int(entry['first_waypoint'])
+            points = self.waypoints[first:first + int(entry['waypoint_count'])].tolist()
+            yield int(entry['page']), stroke_split.SubStroke(points, bool(entry['slow_down']), bool(entry['first']))
+
+    def characters(self):
+        """
+        iterate over the characters in writing order
+        :return: generator of (page index, array of stroke_split.SubStroke of the character)
+        """
+        character = None
+        char_mover = []
+        page_index = 0
+        for entry, (entry_page, sub_stroke) in zip(self.index, self.sub_strokes()):
+            if character is not None and int(entry['character']) != character:
+                yield page_index, char_mover
+                char_mover = []
+            character = int(entry['character'])
+            page_index = entry_page
+            char_mover.append(sub_stroke)
+        if char_mover:
+            yield page_index, char_mover
+
+    def close(self):
+        """
+        unmap the plan file
+        :return: none
+        """
+        self.index = self.waypoints = None
+        self.buffer.close()
@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Cache of compiled URScript programs
+
+A plan of a character, or of any run of sub-strokes, is compiled once into the bytes sent to UR5. The programs are
+keyed by a hash of the waypoint arrays, the flags of the sub-strokes and every parameter the program depends on, and
+are kept in memory (least recently used first out) and on disk, one file per program, so replaying a plan sends
+precompiled bytes without formatting a single float. The files are evicted least recently used first once they take up
+more than a size bound; reading or writing a file marks it as used, across runs by its modification time.
+"""
+import collections
+import hashlib
+import os
+import numpy
+import ur5_constants
+import urscript
+
+MY_PATH = os.path.abspath(os.path.dirname(__file__))
+PROGRAM_DIR = os.path.join(MY_PATH, r"..\data\programs")
+DEFAULT_MAX_ITEMS = 256
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# changed whenever urscript generates different programs from the same parameters
+FORMAT_VERSION = 2
+
+
+def program_key(sub_strokes, name, r):
+    """
+    hash everything a program depends on
+    :param sub_strokes: array of stroke_split.SubStroke or [points, slow_down, first]
+    :param name: name of the program
+    :param r: blend radius
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    parameters = (FORMAT_VERSION, name, r, ur5_constants.ROBOT_SPEED, ur5_constants.ROBOT_ACCELERATION,
+                  ur5_constants.BROKEN_FINAL_RATE, ur5_constants.NORMAL_FINAL_RATE, ur5_constants.BROKEN_SLOW_DOWN,
+                  ur5_constants.NORMAL_SLOW_DOWN, ur5_constants.RAMP_STEP)
+    digest.update(repr(parameters).encode('utf-8'))
+    for points, slow_down, first in sub_strokes:
+        waypoints = numpy.asarray(points, dtype='<f8')
+        digest.update(b'%d,%d,%d;' % (len(waypoints), bool(slow_down), bool(first)))
+        digest.update(waypoints.tobytes())
+    return digest.hexdigest()
+
+
+def compile_program(sub_strokes, name, r):
+    """
+    compile sub-strokes into the bytes of a program and its call
+    :param sub_strokes: array of stroke_split.SubStroke or [points, slow_down, first]
+    :param name: name of the program
+    :param r: blend radius
+    :return: bytes sent to UR5
+    """
+    program, _ = urscript.program(sub_strokes, name, r)
+    return (program + "%s()\n" % name).encode('utf-8')
+
+
+class ProgramCache:
+    """
+    memory and disk cache of compiled programs
+    """
+    def __init__(self, directory=PROGRAM_DIR, max_items=DEFAULT_MAX_ITEMS, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        :param directory: directory of the compiled programs, None to keep them in memory only
+        :param max_items: number of programs kept in memory
+        :param max_bytes: upper bound of the size of the files of the programs on disk
+        """
+        self.directory = directory
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.programs = collections.OrderedDict()
+        # key: key of a program value: size of its file, least recently used first, read from the directory on first use
+        self.files = None
+        self.file_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key):
+        """
+        :param key: key of a program
+        :return: the url of the file of the program
+        """
+        return os.path.join(self.directory, key + '.script')
+
+    def get(self, key):
+        """
+        look a compiled program up, in memory and then on disk
+        :param key: key of the program
+        :return: the bytes of the program, None if it is not cached
+        """
+        if key in self.programs:
+            self.programs.move_to_end(key)
+            if self.files is not None and key in self.files:
+                self.files.move_to_end(key)
+            return self.programs[key]
+        if self.directory is not None and key in self.disk_files():
+            with open(self.path(key), 'rb') as file:
+                data = file.read()
+            os.utime(self.path(key))
+            self.files.move_to_end(key)
+            self.remember(key, data)
+            return data
+        return None
+
+    def disk_files(self):
+        """
+        list the files of the programs in the directory once, oldest first
+        :return: the ordered dictionary of the sizes of the files
+        """
+        if self.files is None:
+            self.files = collections.OrderedDict()
+            self.file_bytes = 0
+            if os.path.isdir(self.directory):
+                entries = []
+                for entry in os.scandir(self.directory):
+                    if entry.is_file() and entry.name.endswith('.script'):
+                        status = entry.stat()
+                        entries.append((status.st_mtime, entry.name[:-len('.script')], status.st_size))
+                for _, key, size in sorted(entries):
+                    self.files[key] = size
+                    self.file_bytes += size
+        return self.files
+
+    def remember(self, key, data):
+        """
+        keep a program in memory as the most recently used one
+        :param key: key of the program
+        :param data: bytes of the program
+        :return: none
+        """
+        self.programs[key] = data
+        self.programs.move_to_end(key)
+        while len(self.programs) > self.max_items:
+            self.programs.popitem(last=False)
+
+    def put(self, key, data):
+        """
+        cache a program in memory and on disk, the file is written to a temporary file first and then moved
+        :param key: key of the program
+        :param data: bytes of the program
+        :return: none
+        """
+        self.remember(key, data)
+        if self.directory is None:
+            return
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+        temp_url = self.path(key) + '.tmp'
+        with open(temp_url, 'wb') as file:
+            file.write(data)
+        os.replace(temp_url, self.path(key))
+        files = self.disk_files()
+        self.file_bytes += len(data) - files.pop(key, 0)
+        files[key] = len(data)
+        self.evict()
+
+    def evict(self):
+        """
+        delete the least recently used files until the files fit in max_bytes, the last written one is kept
+        :return: none
+        """
+        while self.file_bytes > self.max_bytes and len(self.files) > 1:
+            key, size = self.files.popitem(last=False)
+            self.file_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def compile(self, sub_strokes, name=None, r=0.002):
+        """
+        get the compiled program of sub-strokes, compiling and caching it on a miss. the program ends at the last
+        point of the last sub-stroke
+        :param sub_strokes: array of stroke_split.SubStroke or [points, slow_down, first]
+        :param name: name of the program, None for ur5_constants.PROGRAM_NAME
+        :param r: blend radius
+        :return: bytes sent to UR5, and the last position of the program
+        """
+        name = name or ur5_constants.PROGRAM_NAME
+        key = program_key(sub_strokes, name, r)
+        data = self.get(key)
+        if data is None:
+            self.misses += 1
+            data = compile_program(sub_strokes, name, r)
+            self.put(key, data)
+        else:
+            self.hits += 1
+        return data, [float(value) for value in sub_strokes[-1][0][-1]] if len(sub_strokes) else None
@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Decoder of the packets of the realtime interface of UR5 (port 30003)
+
+A packet is a big-endian int32 message size followed by 138 big-endian doubles (1108 bytes, controller 3.5 onwards).
+Newer controllers append fields at the end, so longer packets are decoded up to the known fields; older controllers send
+fewer fields, so shorter packets are decoded up to the last whole field they hold, as long as they hold the pose of the
+tool. The packet is decoded with one numpy.frombuffer into a structured record whose fields are views of the packet,
+nothing is copied.
+"""
+import struct
+import numpy
+
+FIELDS = [
+    ('message_size', '>i4'),
+    ('time', '>f8'),
+    ('q_target', '>f8', (6,)),
+    ('qd_target', '>f8', (6,)),
+    ('qdd_target', '>f8', (6,)),
+    ('i_target', '>f8', (6,)),
+    ('m_target', '>f8', (6,)),
+    ('q_actual', '>f8', (6,)),
+    ('qd_actual', '>f8', (6,)),
+    ('i_actual', '>f8', (6,)),
+    ('i_control', '>f8', (6,)),
+    ('tool_vector_actual', '>f8', (6,)),
+    ('tcp_speed_actual', '>f8', (6,)),
+    ('tcp_force', '>f8', (6,)),
+    ('tool_vector_target', '>f8', (6,)),
+    ('tcp_speed_target', '>f8', (6,)),
+    ('digital_input_bits', '>f8'),
+    ('motor_temperatures', '>f8', (6,)),
+    ('controller_timer', '>f8'),
+    ('test_value', '>f8'),
+    ('robot_mode', '>f8'),
+    ('joint_modes', '>f8', (6,)),
+    ('safety_mode', '>f8'),
+    ('unused_1', '>f8', (6,)),
+    ('tool_accelerometer', '>f8', (3,)),
+    ('unused_2', '>f8', (6,)),
+    ('speed_scaling', '>f8'),
+    ('linear_momentum_norm', '>f8'),
+    ('unused_3', '>f8', (2,)),
+    ('v_main', '>f8'),
+    ('v_robot', '>f8'),
+    ('i_robot', '>f8'),
+    ('v_actual', '>f8', (6,)),
+    ('digital_outputs', '>f8'),
+    ('program_state', '>f8'),
+    ('elbow_position', '>f8', (3,)),
+    ('elbow_velocity', '>f8', (3,)),
+]
+PACKET_DTYPE = numpy.dtype(FIELDS)
+PACKET_SIZE = PACKET_DTYPE.itemsize
+MESSAGE_SIZE = struct.Struct('!i')
+TOOL_POSE_OFFSET = PACKET_DTYPE.fields['tool_vector_actual'][1]
+TOOL_POSE = struct.Struct('!6d')
+# the shortest packet decoded, up to the pose of the tool
+MIN_PACKET_SIZE = TOOL_POSE_OFFSET + TOOL_POSE.size
+# key: size of a packet shorter than PACKET_SIZE value: the dtype of the whole fields it holds
+SHORT_DTYPES = {}
+
+# values of robot_mode
+
+ROBOT_MODE_RUNNING = 7
+
+# values of program_state
+
+PROGRAM_STATE_STOPPED = 1
+PROGRAM_STATE_PLAYING = 2
+PROGRAM_STATE_PAUSED = 4
+
+
+def message_size(packet):
+    """
+    :param packet: bytes of a packet, at least its first 4 bytes
+    :return: the message size in the header of the packet
+    """
+    return MESSAGE_SIZE.unpack_from(packet, 0)[0]
+
+
+def packet_dtype(size):
+    """
+    get the dtype of the fields a packet holds
+    :param size: size of the packet in bytes, at least MIN_PACKET_SIZE
+    :return: PACKET_DTYPE, or for a shorter packet the dtype of its whole fields
+    """
+    if size >= PACKET_SIZE:
+        return PACKET_DTYPE
+    if size not in SHORT_DTYPES:
+        count = 0
+        while numpy.dtype(FIELDS[:count + 1]).itemsize <= size:
+            count += 1
+        SHORT_DTYPES[size] = numpy.dtype(FIELDS[:count])
+    return SHORT_DTYPES[size]
+
+
+def decode(packet):
+    """
+    decode a whole packet
+    :param packet: bytes of a packet, message size included; it must stay unchanged while the record is used
+    :return: numpy record of PACKET_DTYPE, the fields are read-only views of @packet. a packet shorter than
+        PACKET_SIZE is decoded up to its last whole field, see has_field
+    """
+    size = message_size(packet)
+    if size != len(packet):
+        raise ValueError('message size %d does not match a packet of %d bytes' % (size, len(packet)))
+    if size < MIN_PACKET_SIZE:
+        raise ValueError('packet of %d bytes is shorter than the %d bytes up to the pose of the tool' %
+                         (size, MIN_PACKET_SIZE))
+    return numpy.frombuffer(packet, packet_dtype(size), 1)[0]
+
+
+def has_field(record, name):
+    """
+    :param record: numpy record returned by decode
+    :param name: name of a field of PACKET_DTYPE
+    :return: True if the packet of @record holds the field
+    """
+    return name in record.dtype.names
+
+
+def tool_pose(packet):
+    """
+    decode only the actual cartesian coordinates of the tool
+    :param packet: bytes of a packet, message size included
+    :return: [x, y, z, axis_1, axis_2, axis_3]
+    """
+    return list(TOOL_POSE.unpack_from(packet, TOOL_POSE_OFFSET))
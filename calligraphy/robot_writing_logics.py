@@ -3,41 +3,55 @@
 """The logics of robot calligraphy
 
 This module contains all the methods needed to convert a paths extracted from GIFs to trajectory information for UR5
-The module would use data.json as the paths extracted from GIFs,
-please use cv.cv to obtain data.json if you cannot find data.py
-The module would store all the trajectories it ever calculated in previously_calculated_trajectory. And it would use
-this information when writing the same string.
-Please make sure previously_calculated_trajectory.json is existed in ..\data\
+The module would use data.json as the paths extracted from GIFs, converted to the binary library data.clib whenever
+data.json is newer, please use cv.cv to obtain data.json if you cannot find data.py
+The module would store the trajectory of every character it ever calculated in trajectory_cache.jsonl, relative to the
+origin of the character. And it would use this information when writing the same character with the same parameters.
 Please make sure data.json is existed in ..\data\
 """
-import time
 import copy
 import os
 import json
 import math
 import numpy
+import brushes
 import easy_ur5
+import layout
+import plan_executor
+import simplify
+import stroke_split
+import transform
+import trajectory_cache
+import charlib.binary
+import charlib.library
 
 START_POSITION = [0.10018570816351019, -0.4535427417650308,
                   0.2590640572333883]
 ORIENTATION = [0, math.pi, 0]
-R = 0.0
-
-STRAIGHT_HEIGHT = 0.01 * 1.3
-STRAIGHT_DEVIATION = 0.01 * 0
-STRAIGHT_WIDTH = 0.01 * 0
 
-MIDDLE_HEIGHT = 0.01 * 0.83
-MIDDLE_DEVIATION = 0.01 * 0.21
-MIDDLE_WIDTH = 0.01 * 000.3
+# an A3 page written in columns, the first character of scale 0.0004 is at START_POSITION
+
+PAGE = layout.PageSpec(
+    corner=[START_POSITION[0] + 0.14, START_POSITION[1] - 0.02, START_POSITION[2]],
+    width=0.297,
+    height=0.42,
+    margin=0.02,
+    vertical=True,
+    character_spacing=0.0,
+    line_spacing=0.01,
+)
+R = 0.0
 
-DEEPEST_HEIGHT = 0.01 * 0.37
-DEEPEST_DEVIATION = 0.01 * 0.1
-DEEPEST_WIDTH = 0.01 * 1.17
+# largest deviation in metres of the tool path when waypoints are simplified. the offset of the brush ahead of the tool
+# follows the direction of every pixel step, so on an 8-connected path it zigzags by up to 1.6 mm between straight and
+# diagonal steps. 2.5 mm drops that zigzag: on the strokes of benchmark.waypoint_report it keeps fewer waypoints than
+# keeping every 4th one did, with a smaller largest deviation (every 4th was up to 3.2 to 4 mm off)
+WAYPOINT_TOLERANCE = 0.0025
 
 MY_PATH = os.path.abspath(os.path.dirname(__file__))
-JSON_DIR = os.path.join(MY_PATH, r"..\data\previously_calculated_trajectory.json")
+CACHE_DIR = os.path.join(MY_PATH, r"..\data\trajectory_cache.jsonl")
 CHAR_LIB_DIR = os.path.join(MY_PATH, r"..\data\data.json")
+CHAR_BIN_DIR = os.path.join(MY_PATH, r"..\data\data.clib")
 
 
 def reduce_by_multiple(trajectory, integer):
@@ -55,209 +69,79 @@ def reduce_by_multiple(trajectory, integer):
     return reduced
 
 
-def naive_width2z(width):
-    # assert width <= 0.01
-    """
-    a naive way to map width to z axis position
-    :param width: width of a corresponding control point
-    :return: the z axis position
-    """
-    assert width >= 0
-    return 0.01 - width
-
-
 def get_mover(
-        map_3d,
-        stroke_info,
-        start_position,
+        brush,
+        stroke,
+        matrix,
+        base_z,
         orientation,
         scale_factor,
 ):
     """
     get calculated trajectory of a stroke
-    :param map_3d: functions for mapping width to z-axis, a polymorphism design
-    :param stroke_info: array that describes a stroke
-    :param start_position: starting position for a character
+    :param brush: brushes.CompiledBrush mapping width to z-axis
+    :param stroke: (n, 3) array of [row, col, width] in pixels of a stroke
+    :param matrix: 3x3 transform.character_transform placing the character on the paper
+    :param base_z: z-axis position of the character
     :param orientation: orientation of tool
     :param scale_factor: a constant scalar, used for adjust the size of character you wanted to write
-    :return: the calculated trajectory of the given stroke
+    :return: the calculated trajectory of the given stroke, (n + 1, 6) array of [x, y, z, axis_1, axis_2, axis_3]
+        waypoints, the first one lifted above the start of the stroke
     """
-    three_d_trajectory = []
+    placed = transform.apply(matrix, stroke[:, 0:2])
+    three_d_trajectory = brush_mapping(brush, placed, stroke[:, 2] * scale_factor, base_z)
 
-    map_3d(stroke_info, three_d_trajectory, scale_factor,
-           start_position)
+    mover = numpy.empty((len(three_d_trajectory) + 1, 3 + len(orientation)))
+    mover[1:, 0:3] = three_d_trajectory
+    mover[:, 3:] = orientation
 
-    start_lift = copy.deepcopy(three_d_trajectory[0])
+    start_lift = mover[0, 0:3]
+    start_lift[:] = three_d_trajectory[0]
     start_lift[2] = start_lift[2] + 0.02
 
     # add tilt value
 
     if len(three_d_trajectory) > 1:
-        vector_a = numpy.array(three_d_trajectory[0])
-        vector_b = numpy.array(three_d_trajectory[1])
-        vector_ba = vector_a - vector_b
+        vector_ba = three_d_trajectory[0] - three_d_trajectory[1]
         dev_start = vector_ba / numpy.linalg.norm(vector_ba) * 0.009
         start_lift[0] += dev_start[0]
         start_lift[1] += dev_start[1]
 
-    three_d_trajectory.insert(0, start_lift)
-
-    mover = []
-    for i in three_d_trajectory:
-        real_pos = i
-        real_ori = orientation
-        mover.append(real_pos + real_ori)
-
-    time.sleep(1)
     return mover
 
 
-def broke_stroke(trajectory):
+def broke_stroke(trajectory, rules=stroke_split.DEFAULT_RULES):
     """
     break one stroke into one or multiple sub-stroke for preventing error caused by UR5 cannot maintain a speed
-    :param trajectory: the trajectory of a stroke
-    :return: a array of broken sub-stroke
-    """
-    stroke_group = []
-    pointer1 = 0
-    if len(trajectory) < 11:
-        print(len(trajectory))
-        stroke_group.append(trajectory)
-        return stroke_group
-
-    for i in range(5, len(trajectory) - 5):
-        y0 = trajectory[i - 1][1]
-        y1 = trajectory[i][1]
-        y2 = trajectory[i + 1][1]
-        y_dif0 = y1 - y0
-        y_dif1 = y2 - y1
-
-        x0 = trajectory[i - 1][0]
-        x1 = trajectory[i][0]
-        x2 = trajectory[i + 1][0]
-        x_dif0 = x1 - x0
-        x_dif1 = x2 - x1
-
-        max_tolerance = 0.006
-        if (x_dif0 * x_dif1 < 0 and (abs(x_dif0) > max_tolerance or abs(x_dif1)
-                                     > max_tolerance)) or (y_dif0 * y_dif1 < 0 \
-                                                   and (abs(y_dif0) > max_tolerance or abs(y_dif1) > max_tolerance)):
-            stroke_group.append([trajectory[pointer1:i + 1], True])
-            pointer1 = i + 1
-    if pointer1 == len(trajectory) - 1:
-        stroke_group[0].append([trajectory[len(trajectory) - 1], False])
-    else:
-        stroke_group.append([trajectory[pointer1:len(trajectory)],
-                             False])
-
-    # mark first:
-
-    stroke_group[0].append(True)
-    for i in range(1, len(stroke_group)):
-        stroke_group[i].append(False)
-
-    return stroke_group
-
-
-def double_linear3_mapping(
-        stroke_info,
-        three_d_trajectory,
-        scale_factor,
-        start_position,
-):
-    """
-    a way of mapping considering the offset of the brush increases then decreases when z axis position is decreasing
-    :param stroke_info: array that describes the stroke information
-    :param three_d_trajectory: array that describes the 3D trajectory
-    :param scale_factor: a constant scalar, used for adjust the size of character you wanted to write
-    :param start_position: start position of the stroke
-    :return: a array that describes processed position of the tool
-    """
-    prev_point2d = stroke_info[0][0]
-    for point in stroke_info:
-        point3d = copy.deepcopy(point[0])
-        direction = numpy.array(point3d) - numpy.array(prev_point2d)
-        if prev_point2d == point3d:
-            standard_direction = 0
-        else:
-            standard_direction = numpy.array(direction) / numpy.linalg.norm(direction)
-        point3d = [x * scale_factor for x in point3d]
-        w = point[1] * scale_factor
-        if w > DEEPEST_WIDTH:
-            w = DEEPEST_WIDTH
-
-        if w <= MIDDLE_WIDTH:
-            deviation_needed = linear_function(STRAIGHT_WIDTH,
-                                               MIDDLE_WIDTH, STRAIGHT_DEVIATION, MIDDLE_DEVIATION,
-                                               w)
-            point3d = numpy.array(point3d) + numpy.array(standard_direction * deviation_needed)
-            depth = linear_function(STRAIGHT_WIDTH, MIDDLE_WIDTH,
-                                    STRAIGHT_HEIGHT, MIDDLE_HEIGHT, w)
-        else:
-            deviation_needed = linear_function(MIDDLE_WIDTH,
-                                               DEEPEST_WIDTH, MIDDLE_DEVIATION, DEEPEST_DEVIATION,
-                                               w)
-            point3d = numpy.array(point3d) + numpy.array(standard_direction * deviation_needed)
-            depth = linear_function(MIDDLE_WIDTH, DEEPEST_WIDTH,
-                                    MIDDLE_HEIGHT, DEEPEST_HEIGHT, w)
-        point3d = point3d.tolist()
-        point3d.append(depth)
-
-        point3d = numpy.array(point3d) + numpy.array(start_position)
-        point3d = point3d.tolist()
-        three_d_trajectory.append(point3d)
-        prev_point2d = point[0]
-
-
-def linear_function(
-        x1,
-        x2,
-        y1,
-        y2,
-        x,
-):
-    """
-    linear function, given a line and a point on that line, It would output the y value corresponding to the x value
-    :param x1: x value of point 1
-    :param x2: x value of point 2
-    :param y1: y value of point 1
-    :param y2: y value of point 2
-    :param x: x value corresponding to wanted y value
-    :return: y value corresponding to the given x value
-    """
-    k = (y2 - y1) / (x2 - x1)
-    y = k * (x - x1) + y1
-    return y
-
-
-def rotate(character, angle):
-    """
-    given a character and an angle that you want want for rotating, return an rotated character
-    :param character: character that you want to rotate
-    :param angle: angle you want for rotating
-    :return: the rotated character
+    :param trajectory: the trajectory of a stroke, see get_mover
+    :param rules: stroke_split.SplitRules of where a stroke is broken
+    :return: a array of broken sub-stroke, stroke_split.SubStroke
     """
-    for i in character:
-        for j in i:
-            j[0] = rotate_points([150, 150], j[0], angle)
+    return stroke_split.split_stroke(trajectory, rules)
 
 
-def rotate_points(origin, point, angle):
+def brush_mapping(brush, placed, widths, base_z):
     """
-    otate a point counterclockwise by a given angle around a given origin.
-    The angle should be given in radians.
-    :param origin:
-    :param point:
-    :param angle:
-    :return: the rotated list of point
+    a way of mapping considering the offset of the brush ahead of the tool and the depth of the tool, as calibrated
+    for a brush
+    :param brush: brushes.CompiledBrush
+    :param placed: (n, 2) array of the points of a stroke placed on the paper, see transform.character_transform
+    :param widths: array of n widths of the stroke in metres
+    :param base_z: z-axis position of the character
+    :return: (n, 3) array of the positions of the tool
     """
+    direction = numpy.zeros_like(placed)
+    direction[1:] = placed[1:] - placed[:-1]
+    norm = numpy.sqrt(numpy.einsum('ij,ij->i', direction, direction))
+    moved = norm > 0
+    direction[moved] = direction[moved] / norm[moved, None]
 
-    (ox, oy) = origin
-    (px, py) = point
+    depth, deviation_needed = brushes.lookup(brush, widths)
 
-    qx = ox + math.cos(angle) * (px - ox) - math.sin(angle) * (py - oy)
-    qy = oy + math.sin(angle) * (px - ox) + math.cos(angle) * (py - oy)
-    return qx, qy
+    trajectory = numpy.empty((len(placed), 3))
+    trajectory[:, 0:2] = placed + direction * deviation_needed[:, None]
+    trajectory[:, 2] = depth + base_z
+    return trajectory
 
 
 def load_character_lib(file):
@@ -275,152 +159,180 @@ def get_char_mover(
         start_position,
         orientation,
         scale_factor,
-        mapping,
+        brush,
+        split_rules=stroke_split.DEFAULT_RULES,
+        angle=0.0,
 ):
     """
     get the writing trajectory of a character
-    :param char: character you want to write
+    :param char: array of (n, 3) arrays of [row, col, width] of the strokes of the character you want to write
     :param start_position: start position of the character
     :param orientation: orientation of the character
     :param scale_factor: a constant scalar, used for adjust the size of character you wanted to write
-    :param mapping: the way of mapping width to z-axis coordinate
-    :return: the writing trajectory of a character
+    :param brush: brushes.CompiledBrush mapping width to z-axis coordinate
+    :param split_rules: stroke_split.SplitRules of where strokes are broken into sub-strokes
+    :param angle: rotating angle of the character
+    :return: the writing trajectory of a character, array of stroke_split.SubStroke
     """
-    previous_location = copy.deepcopy(start_position)
-    previous_location[2] += 0.15
+    matrix = transform.character_transform(angle, scale_factor, start_position[0:2])
 
     char_mover = []
     counter = 1
     for i in char:
         print('--------------------')
         stroke = get_mover(
-            mapping,
+            brush,
             i,
-            start_position,
+            matrix,
+            start_position[2],
             orientation,
             scale_factor,
         )
         print('stroke #: ', counter)
-        sub_stroke_group = broke_stroke(stroke)
+        sub_stroke_group = broke_stroke(stroke, split_rules)
         print('a stroke broken into: ', len(sub_stroke_group))
         for j in sub_stroke_group:
-            print('before reduce: ', len(j[0]))
-            j[0] = reduce_by_multiple(j[0], 4)
-            print('after reduced: ', len(j[0]))
+            print('before reduce: ', len(j.points))
+            j = j._replace(points=simplify.simplify(j.points, WAYPOINT_TOLERANCE))
+            print('after reduced: ', len(j.points))
             char_mover.append(j)
 
-        end_lift = copy.deepcopy(char_mover[-1][0][-1])
+        end_lift = copy.deepcopy(char_mover[-1].points[-1])
         end_lift[2] = end_lift[2] + 0.045
-        c = numpy.array((char_mover[-1][0][-2])[0:2])
-        d = numpy.array((char_mover[-1][0][-1])[0:2])
+        c = numpy.array((char_mover[-1].points[-2])[0:2])
+        d = numpy.array((char_mover[-1].points[-1])[0:2])
         cd = d - c
         dev_end = cd / numpy.linalg.norm(cd) * 0.03
         end_lift[0] += dev_end[0]
         end_lift[1] += dev_end[1]
-        char_mover[-1][0].append(end_lift)
+        char_mover[-1].points.append(end_lift)
 
         counter += 1
     return char_mover
 
 
-def write_considering_depth(
+def plan_string(
         string_to_write,
         scale,
-        dictionary,
+        library,
         angle,
-        mapping,
-        machine,
+        brush,
+        cache=None,
+        split_rules=stroke_split.DEFAULT_RULES,
+        page=PAGE,
 ):
     """
-    write a string
+    plan the writing of a string
     :param string_to_write: string to be written
     :param scale: a constant scalar, used for adjust the size of character you wanted to write
-    :param dictionary: the dictionary from unicode to writing path
+    :param library: charlib.library.CharacterLibrary of the writing paths
     :param angle: rotating angle of the string you want to write
-    :param mapping: the way of mapping width to z-axis
-    :param machine: UR5 client
-    :return: None
+    :param brush: brushes.CompiledBrush mapping width to z-axis
+    :param cache: trajectory_cache.TrajectoryCache of previously calculated characters, None for the one in CACHE_DIR
+    :param split_rules: stroke_split.SplitRules of where strokes are broken into sub-strokes
+    :param page: layout.PageSpec of the pages the string is written on
+    :return: array of (page index, sub-strokes of the character) in writing order
     """
+    if cache is None:
+        cache = trajectory_cache.TrajectoryCache(CACHE_DIR)
+    placement = layout.layout_text(string_to_write, page, scale, angle)
     chars = []
 
-    composed_key = string_to_write + ", " + str(scale) + "," + str(angle) + ", " + mapping.__name__
-    check_result, previous_dictionary = try_previously_calculated_trajectory(composed_key)
-
-    if check_result is not None:
-        chars = check_result
-    else:
-        for character in string_to_write:
-            character = character.encode('unicode_escape')
-            character = str(character)
-            character = character[5:-1]
-
-            if character not in dictionary:
-                print('characters cannot be found in data.json')
-                START_POSITION[0] = START_POSITION[0] + scale * 1.1
-                continue
-
-            trajectory = dictionary[character]
-            rotate(trajectory, angle)
-            current = copy.deepcopy(trajectory)
-            chars.append(get_char_mover(
-                current,
-                START_POSITION,
+    library.prefetch(string_to_write)
+    for character, origin, page_index in zip(placement.characters, placement.origins.tolist(), placement.pages):
+        strokes = library.get(character)
+        if strokes is None:
+            print('characters cannot be found in data.json')
+            continue
+
+        key = character_key(character, scale, angle, brush, split_rules)
+        relative = cache.get(key)
+        if relative is None:
+            relative = get_char_mover(
+                strokes,
+                [0, 0, 0],
                 ORIENTATION,
                 scale,
-                mapping
-            ))
-            START_POSITION[0] = START_POSITION[0] - scale * 300
+                brush,
+                split_rules,
+                angle,
+            )
+            cache.put(key, relative)
+        else:
+            print('trajectory record founded')
+        chars.append((int(page_index), trajectory_cache.translate(relative, origin)))
+    return chars
+
 
-        previous_dictionary[composed_key] = chars
-        with open(JSON_DIR, 'w') as file:
-            json.dump(previous_dictionary, file)
+def write_considering_depth(
+        string_to_write,
+        scale,
+        library,
+        angle,
+        brush,
+        machine,
+        cache=None,
+        split_rules=stroke_split.DEFAULT_RULES,
+        page=PAGE,
+        next_page=plan_executor.wait_for_page,
+):
+    """
+    write a string
+    :param string_to_write: string to be written
+    :param scale: a constant scalar, used for adjust the size of character you wanted to write
+    :param library: charlib.library.CharacterLibrary of the writing paths
+    :param angle: rotating angle of the string you want to write
+    :param brush: brushes.CompiledBrush mapping width to z-axis
+    :param machine: UR5 client
+    :param cache: trajectory_cache.TrajectoryCache of previously calculated characters, None for the one in CACHE_DIR
+    :param split_rules: stroke_split.SplitRules of where strokes are broken into sub-strokes
+    :param page: layout.PageSpec of the pages the string is written on
+    :param next_page: function called with the index of a page before it is written, but the first one
+    :return: None
+    """
+    chars = plan_string(string_to_write, scale, library, angle, brush, cache, split_rules, page)
 
     assert machine is not None
 
-    for i in chars:
-        for j in i:
-            stroke = j[0]
-            slow_down = j[1]
-            first = j[2]
-            machine.test_move_to_n(stroke, slow_down, first)
+    plan_executor.execute_characters(chars, machine, next_page)
 
 
-def try_previously_calculated_trajectory(composed_key):
+def character_key(character, scale, angle, brush, split_rules=stroke_split.DEFAULT_RULES):
     """
-    try if there is record of previous writing that share the same writing parameters
-    (string_to_write , scale, angle, mapping) with current writing. If yes, the function would return previous record
-    and the json dictionary. If no, the function would return None and the json dictionary.
-    :param composed_key: the string that contains writing parameters(string_to_write , scale, angle, mapping)
-    :return: If previous record that share the same parameter with current writing exists, the function would return
-    previous record and the json dictionary. If no, the function would return None and the json dictionary.
+    get the key of the trajectory of a character in the trajectory cache
+    :param character: the character
+    :param scale: a constant scalar, used for adjust the size of character you wanted to write
+    :param angle: rotating angle of the character
+    :param brush: brushes.CompiledBrush mapping width to z-axis
+    :param split_rules: stroke_split.SplitRules of where strokes are broken into sub-strokes
+    :return: array of (codepoint, scale, angle, calibration of the brush, tolerance of the waypoint simplification,
+        rules of the split)
     """
-    previously_calculated_trajectory = \
-        load_character_lib(open(JSON_DIR
-                                , 'r'))
-    if composed_key in previously_calculated_trajectory:
-        print('trajectory record founded')
-        return previously_calculated_trajectory[composed_key], previously_calculated_trajectory
-    return None, previously_calculated_trajectory
+    return [ord(character), scale, angle, brushes.calibration(brush), WAYPOINT_TOLERANCE, list(split_rules)]
 
 
 if __name__ == '__main__':
     # ask for argument
     string_to_write = ''
     scale = 0.0004
+    brush = None
     while True:
         try:
             string_to_write = input('input a string you want to write: ')
             scale = float(input('input scale (you can try 0.0004 first): '))
-        except ValueError:
-            print("please input valid value")
+            brush = brushes.get(input('input brush (%s, empty for %s): ' % (', '.join(sorted(brushes.BRUSHES)),
+                                                                          brushes.DEFAULT_BRUSH))
+                                or brushes.DEFAULT_BRUSH)
+        except (ValueError, KeyError) as error:
+            print("please input valid value", error)
             continue
         else:
             break
 
     # read lib
-    DIC = \
-        load_character_lib(open(CHAR_LIB_DIR, 'r'))
-    print(len(DIC))
+    charlib.binary.ensure_library(CHAR_LIB_DIR, CHAR_BIN_DIR)
+    LIBRARY = charlib.library.CharacterLibrary(CHAR_BIN_DIR)
+    print(len(LIBRARY))
 
     # connect to UR5
     MACHINE = None
@@ -429,8 +341,8 @@ if __name__ == '__main__':
     write_considering_depth(
         string_to_write,
         scale,
-        DIC,
+        LIBRARY,
         math.pi,
-        double_linear3_mapping,
+        brush,
         MACHINE,
     )
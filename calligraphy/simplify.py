@@ -0,0 +1,120 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Error-bounded simplification of waypoints
+
+Ramer-Douglas-Peucker in 3D: a waypoint is dropped only if the tool path without it stays within a maximum deviation,
+measured on x, y and z, so the depth that encodes the stroke width is kept as faithfully as the outline. Straight
+segments collapse to their ends while tight curves keep the waypoints they need. Whatever is dropped, the tail of a
+sub-stroke can be resampled along the same path, so a speed ramp measured in metres before the end keeps its waypoints.
+"""
+import numpy
+
+MAX_DEVIATION = 0.001
+
+
+def segment_distances(points, start, end):
+    """
+    distances from points to a line segment
+    :param points: (n, 3) array of points
+    :param start: [x, y, z] of the start of the segment
+    :param end: [x, y, z] of the end of the segment
+    :return: array of n distances
+    """
+    segment = end - start
+    length = numpy.dot(segment, segment)
+    if length == 0:
+        return numpy.linalg.norm(points - start, axis=1)
+    t = numpy.clip(numpy.dot(points - start, segment) / length, 0, 1)
+    return numpy.linalg.norm(points - (start + t[:, None] * segment), axis=1)
+
+
+def simplify_indices(points, max_deviation=MAX_DEVIATION):
+    """
+    find the waypoints kept by Ramer-Douglas-Peucker
+    :param points: (n, 3) array of positions
+    :param max_deviation: the largest distance in metres between a dropped waypoint and the simplified path
+    :return: sorted array of indices of the kept waypoints, the first and the last are always kept
+    """
+    points = numpy.asarray(points, dtype=float)
+    if len(points) < 3:
+        return numpy.arange(len(points))
+    keep = numpy.zeros(len(points), bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        distances = segment_distances(points[first + 1:last], points[first], points[last])
+        farthest = int(numpy.argmax(distances))
+        if distances[farthest] > max_deviation:
+            middle = first + 1 + farthest
+            keep[middle] = True
+            stack.append((first, middle))
+            stack.append((middle, last))
+    return numpy.flatnonzero(keep)
+
+
+def simplify(waypoints, max_deviation=MAX_DEVIATION):
+    """
+    simplify a trajectory, only x, y and z are considered
+    :param waypoints: array of [x, y, z, axis_1, axis_2, axis_3]
+    :param max_deviation: the largest distance in metres between a dropped waypoint and the simplified path
+    :return: array of the kept waypoints
+    """
+    positions = numpy.array([waypoint[0:3] for waypoint in waypoints], dtype=float)
+    return [waypoints[i] for i in simplify_indices(positions, max_deviation)]
+
+
+def max_error(waypoints, simplified):
+    """
+    the largest distance between a waypoint of a trajectory and the path through a simplified version of it
+    :param waypoints: array of [x, y, z, ...] of the trajectory
+    :param simplified: array of [x, y, z, ...] of the simplified trajectory
+    :return: the distance in metres
+    """
+    points = numpy.array([waypoint[0:3] for waypoint in waypoints], dtype=float)
+    path = numpy.array([waypoint[0:3] for waypoint in simplified], dtype=float)
+    if len(path) == 1:
+        return float(numpy.linalg.norm(points - path[0], axis=1).max())
+    distances = numpy.stack([segment_distances(points, path[i], path[i + 1]) for i in range(len(path) - 1)])
+    return float(distances.min(axis=0).max())
+
+
+def distances_to_end(waypoints):
+    """
+    the length of the path from every waypoint to the last one, only x, y and z are considered
+    :param waypoints: array of [x, y, z, ...]
+    :return: array of distances in metres, 0 for the last waypoint
+    """
+    positions = numpy.array([waypoint[0:3] for waypoint in waypoints], dtype=float).reshape(-1, 3)
+    lengths = numpy.linalg.norm(numpy.diff(positions, axis=0), axis=1)
+    return numpy.append(numpy.cumsum(lengths[::-1])[::-1], 0.0)
+
+
+def resample_tail(waypoints, distance, step):
+    """
+    add waypoints on the path within @distance of its end, so no two waypoints there are more than @step apart and one
+    waypoint is @distance before the end. the path itself is not changed, a speed ramp over the tail gets a waypoint
+    every @step however few waypoints simplify kept
+    :param waypoints: array of [x, y, z, axis_1, axis_2, axis_3]
+    :param distance: the length in metres of the tail
+    :param step: the largest distance in metres between two waypoints of the tail
+    :return: array of waypoints, lists of floats
+    """
+    points = numpy.array(waypoints, dtype=float)
+    if len(points) < 2:
+        return points.tolist()
+    remaining = distances_to_end(points)
+    result = [points[0]]
+    for i in range(1, len(points)):
+        start, end = remaining[i - 1], remaining[i]
+        if end < distance and start > end:
+            ramp_start = min(start, distance)
+            pieces = int(numpy.ceil((ramp_start - end) / step - 1e-9))
+            for k in range(pieces):
+                at = ramp_start - k * (ramp_start - end) / pieces
+                if at < start:
+                    result.append(points[i - 1] + (start - at) / (start - end) * (points[i] - points[i - 1]))
+        result.append(points[i])
+    return numpy.array(result).tolist()
@@ -0,0 +1,59 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Splitting of strokes into sub-strokes
+
+UR5 cannot keep its speed through a sharp turn of the tool, so a stroke is split after every waypoint at which the tool
+reverses its direction along x or y by more than a tolerance. The split points are found at once from the signs of the
+first differences of the positions.
+"""
+import collections
+import numpy
+
+# points: array of [x, y, z, axis_1, axis_2, axis_3] waypoints
+# slow_down: True if the robot should slow down at the end of the sub-stroke, i.e. it is followed by a sharp turn
+# first: True for the first sub-stroke of a stroke
+
+SubStroke = collections.namedtuple('SubStroke', ['points', 'slow_down', 'first'])
+
+# max_tolerance: a reversal is a split if the step before or after it is longer than this, in metres
+# margin: number of waypoints at each end of a stroke in which it is never split
+# min_points: strokes with fewer waypoints are never split
+
+SplitRules = collections.namedtuple('SplitRules', ['max_tolerance', 'margin', 'min_points'])
+DEFAULT_RULES = SplitRules(max_tolerance=0.006, margin=5, min_points=11)
+
+
+def split_indices(positions, rules=DEFAULT_RULES):
+    """
+    find the waypoints after which a stroke is split
+    :param positions: (n, 2) or wider array, x and y of the waypoints are the first two columns
+    :param rules: SplitRules of the split
+    :return: sorted array of indices of the last waypoints of the sub-strokes but the last one
+    """
+    positions = numpy.asarray(positions, dtype=float)
+    if len(positions) < rules.min_points:
+        return numpy.zeros(0, int)
+    steps = numpy.diff(positions[:, 0:2], axis=0)
+    before = steps[rules.margin - 1:len(steps) - rules.margin]
+    after = steps[rules.margin:len(steps) - rules.margin + 1]
+    long_enough = (numpy.abs(before) > rules.max_tolerance) | (numpy.abs(after) > rules.max_tolerance)
+    reversed_axes = (before * after < 0) & long_enough
+    return rules.margin + numpy.flatnonzero(reversed_axes.any(axis=1))
+
+
+def split_stroke(trajectory, rules=DEFAULT_RULES):
+    """
+    split a stroke into sub-strokes
+    :param trajectory: (n, 6) array of [x, y, z, axis_1, axis_2, axis_3] waypoints of a stroke
+    :param rules: SplitRules of the split
+    :return: array of SubStroke, covering every waypoint of @trajectory once and in order, the points of a sub-stroke
+        are lists of waypoints
+    """
+    trajectory = numpy.asarray(trajectory, dtype=float)
+    ends = list(split_indices(trajectory, rules) + 1) + [len(trajectory)]
+    sub_strokes = []
+    start = 0
+    for end in ends:
+        sub_strokes.append(SubStroke(trajectory[start:end].tolist(), end != len(trajectory), start == 0))
+        start = end
+    return sub_strokes
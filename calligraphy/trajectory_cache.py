@@ -0,0 +1,174 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Per-character cache of calculated trajectories
+
+Trajectories are cached per character, keyed on everything that changes the plan of a character (codepoint, scale,
+angle, mapping and the constants of the mapping) but not on where the character is written: waypoints are stored
+relative to the origin of the character and translated when they are written. The cache is persisted as JSON lines,
+a new entry is one appended line, and the least recently used entries are evicted once the cache grows past its size
+bound; the file is rewritten only when stale lines take up as much room as the live ones. A hit appends a line with only
+the key, so the order of use survives a restart, and a line cut off by an interrupted append is terminated before the
+next one is appended.
+"""
+import collections
+import json
+import os
+import stroke_split
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def translate(char_mover, offset):
+    """
+    move the waypoints of a character
+    :param char_mover: array of [waypoints, slow_down, first] sub-strokes, as stroke_split.SubStroke or as read from
+        the cache, waypoints are [x, y, z, axis_1, axis_2, axis_3]
+    :param offset: [x, y, z] added to every waypoint
+    :return: the translated copy of @char_mover, array of stroke_split.SubStroke
+    """
+    translated = []
+    for points, slow_down, first in char_mover:
+        waypoints = [[waypoint[0] + offset[0], waypoint[1] + offset[1], waypoint[2] + offset[2]] + list(waypoint[3:])
+                     for waypoint in points]
+        translated.append(stroke_split.SubStroke(waypoints, slow_down, first))
+    return translated
+
+
+class TrajectoryCache:
+    """
+    append-only JSON lines store of character trajectories with size-bounded LRU eviction
+    """
+    def __init__(self, url, max_bytes=DEFAULT_MAX_BYTES):
+        """
+        load the cache file, a missing file is an empty cache
+        :param url: the url of the .jsonl cache file
+        :param max_bytes: upper bound of the size of the live entries
+        """
+        self.url = url
+        self.max_bytes = max_bytes
+        self.entries = collections.OrderedDict()
+        self.sizes = {}
+        self.live_bytes = 0
+        self.file_bytes = 0
+        # False if the last line of the file is cut off
+        self.terminated = True
+        self.load()
+
+    @staticmethod
+    def compose_key(key):
+        """
+        :param key: array of the parameters of a plan
+        :return: the string used as key in the store
+        """
+        return json.dumps(list(key), ensure_ascii=True)
+
+    def load(self):
+        """
+        read the cache file, later lines replace earlier lines of the same key and count as more recently used, a line
+        without value marks a hit of its key
+        :return: none
+        """
+        if not os.path.exists(self.url):
+            return
+        with open(self.url, 'r') as file:
+            for line in file:
+                self.file_bytes += len(line)
+                self.terminated = line.endswith('\n')
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # the tail of an interrupted append
+                    continue
+                if 'value' not in record:
+                    if record['key'] in self.entries:
+                        self.entries.move_to_end(record['key'])
+                    continue
+                self.remember(record['key'], record['value'], len(line))
+        if self.evict():
+            self.compact()
+
+    def remember(self, composed_key, value, size):
+        """
+        put an entry in memory as the most recently used one
+        :param composed_key: key string of the entry
+        :param value: the relative trajectory of the character
+        :param size: size of the line of the entry in the cache file
+        :return: none
+        """
+        if composed_key in self.entries:
+            self.live_bytes -= self.sizes[composed_key]
+        self.entries[composed_key] = value
+        self.entries.move_to_end(composed_key)
+        self.sizes[composed_key] = size
+        self.live_bytes += size
+
+    def evict(self):
+        """
+        drop the least recently used entries until the live entries fit in max_bytes
+        :return: True if any entry is dropped
+        """
+        evicted = False
+        while self.live_bytes > self.max_bytes and self.entries:
+            composed_key, _ = self.entries.popitem(last=False)
+            self.live_bytes -= self.sizes.pop(composed_key)
+            evicted = True
+        return evicted
+
+    def get(self, key):
+        """
+        look a trajectory up
+        :param key: array of the parameters of the plan of a character
+        :return: the trajectory relative to the origin of the character, None if it is not cached
+        """
+        composed_key = self.compose_key(key)
+        if composed_key not in self.entries:
+            return None
+        if next(reversed(self.entries)) != composed_key:
+            self.entries.move_to_end(composed_key)
+            self.append(json.dumps({'key': composed_key}) + '\n')
+            if self.file_bytes > 2 * max(self.live_bytes, 1):
+                self.compact()
+        return self.entries[composed_key]
+
+    def append(self, line):
+        """
+        append a line to the cache file, after terminating a line cut off by an interrupted append
+        :param line: the line, newline included
+        :return: none
+        """
+        if not self.terminated:
+            line = '\n' + line
+            self.terminated = True
+        with open(self.url, 'a') as file:
+            file.write(line)
+        self.file_bytes += len(line)
+
+    def put(self, key, value):
+        """
+        cache a trajectory, it is appended to the cache file at once
+        :param key: array of the parameters of the plan of a character
+        :param value: the trajectory relative to the origin of the character
+        :return: none
+        """
+        composed_key = self.compose_key(key)
+        line = json.dumps({'key': composed_key, 'value': value}) + '\n'
+        self.append(line)
+        self.remember(composed_key, value, len(line))
+        self.evict()
+        if self.file_bytes > 2 * max(self.live_bytes, 1):
+            self.compact()
+
+    def compact(self):
+        """
+        rewrite the cache file with only the live entries, least recently used first
+        :return: none
+        """
+        temp_url = self.url + '.tmp'
+        self.file_bytes = 0
+        with open(temp_url, 'w') as file:
+            for composed_key, value in self.entries.items():
+                line = json.dumps({'key': composed_key, 'value': value}) + '\n'
+                file.write(line)
+                self.file_bytes += len(line)
+        os.replace(temp_url, self.url)
+        self.terminated = True
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Affine transforms of the points of characters
+
+Rotation about the centre of the glyph, scaling from pixels to metres and placement on the paper are composed into one
+3x3 matrix in homogeneous coordinates, which is applied to all points of a stroke in a single matmul. Points are never
+modified in place, so the character library is left as it was loaded.
+"""
+import math
+import numpy
+
+# centre of the 300x300 pixel box the paths of the characters are extracted in
+
+GLYPH_CENTRE = [150, 150]
+
+
+def rotation_about(centre, angle):
+    """
+    rotate counterclockwise by a given angle around a given centre
+    :param centre: [x, y] of the centre of the rotation
+    :param angle: angle in radians
+    :return: 3x3 matrix
+    """
+    cos = math.cos(angle)
+    sin = math.sin(angle)
+    return numpy.array([
+        [cos, -sin, centre[0] - cos * centre[0] + sin * centre[1]],
+        [sin, cos, centre[1] - sin * centre[0] - cos * centre[1]],
+        [0.0, 0.0, 1.0],
+    ])
+
+
+def scaling(factor):
+    """
+    :param factor: scale of both axes
+    :return: 3x3 matrix
+    """
+    return numpy.array([[factor, 0.0, 0.0], [0.0, factor, 0.0], [0.0, 0.0, 1.0]])
+
+
+def translation(offset):
+    """
+    :param offset: [x, y] added to the points
+    :return: 3x3 matrix
+    """
+    return numpy.array([[1.0, 0.0, offset[0]], [0.0, 1.0, offset[1]], [0.0, 0.0, 1.0]])
+
+
+def compose(*matrices):
+    """
+    compose transforms, the last one is applied first
+    :param matrices: 3x3 matrices
+    :return: 3x3 matrix
+    """
+    composed = numpy.identity(3)
+    for matrix in matrices:
+        composed = composed.dot(matrix)
+    return composed
+
+
+def character_transform(angle, scale, origin, centre=GLYPH_CENTRE):
+    """
+    the transform from the pixels of a character to its place on the paper
+    :param angle: rotating angle of the character in radians, about @centre
+    :param scale: metres per pixel
+    :param origin: [x, y] of the origin of the character
+    :param centre: [x, y] of the centre of the glyph in pixels
+    :return: 3x3 matrix
+    """
+    return compose(translation(origin), scaling(scale), rotation_about(centre, angle))
+
+
+def apply(matrix, points):
+    """
+    transform points
+    :param matrix: 3x3 matrix
+    :param points: (n, 2) array of [x, y]
+    :return: new (n, 2) array of the transformed points
+    """
+    points = numpy.asarray(points, dtype=float).reshape(-1, 2)
+    homogeneous = numpy.empty((len(points), 3))
+    homogeneous[:, 0:2] = points
+    homogeneous[:, 2] = 1.0
+    return homogeneous.dot(matrix[0:2].T)
@@ -0,0 +1,20 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Motion parameters of the programs sent to UR5
+
+The speeds and the name of the programs are shared by easy_ur5, which sends the programs, and by urscript and
+program_cache, which generate and cache them, so the generators do not import easy_ur5.
+"""
+
+ROBOT_SPEED = 0.28
+ROBOT_ACCELERATION = 0.2
+BROKEN_FINAL_RATE = 0.1
+NORMAL_FINAL_RATE = 0.1
+PROGRAM_NAME = "tes"
+# the speed ramps down to the final rate over these lengths in metres of the written path before the end of a
+# sub-stroke, slowed down before a sharp turn or not. they are the ramps of 35 and 12 waypoints of 1.6 mm, every 4th
+# pixel of a character of scale 0.0004, used before the waypoints were simplified
+BROKEN_SLOW_DOWN = 0.056
+NORMAL_SLOW_DOWN = 0.019
+# the largest distance in metres between two waypoints of a ramp
+RAMP_STEP = 0.004
@@ -0,0 +1,185 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Persistent reader of the realtime interface of UR5
+
+UR5 streams its state on port 30003 at 125 Hz. A background thread keeps one connection open, frames the packets by
+the message size in their first 4 bytes, and publishes the latest parsed state as one immutable snapshot; readers take
+the snapshot without locking and without touching the network, and listeners are called with every new state in the
+reader thread. The connection is opened again if it drops.
+"""
+import collections
+import socket
+import threading
+import time
+import realtime_packet
+
+PORT_30003 = 30003
+MESSAGE_SIZE = realtime_packet.MESSAGE_SIZE
+# packets of the realtime interface are about 1 KiB, anything outside of these bounds means the stream is out of sync
+MIN_MESSAGE_SIZE = 12
+MAX_MESSAGE_SIZE = 1 << 16
+RECONNECT_DELAY = 0.5
+
+# pose: [x, y, z, axis_1, axis_2, axis_3] of the tool
+# timestamp: time since the controller started, in seconds
+# received: time.monotonic() when the packet was received
+# sequence: number of packets received before this one
+# packet: the packet decoded by realtime_packet.decode, older controllers send fewer fields, see
+#     realtime_packet.has_field
+
+RealtimeState = collections.namedtuple('RealtimeState', ['pose', 'timestamp', 'received', 'sequence', 'packet'])
+
+
+def receive_exactly(connection, view):
+    """
+    fill a buffer from a socket
+    :param connection: connected socket
+    :param view: memoryview of the buffer
+    :return: none
+    """
+    received = 0
+    while received < len(view):
+        count = connection.recv_into(view[received:])
+        if count == 0:
+            raise ConnectionError('connection closed by UR5')
+        received += count
+
+
+class RealtimeReader:
+    """
+    background thread publishing the latest state of UR5
+    """
+    def __init__(self, host, port=PORT_30003, timeout=1.0):
+        """
+        :param host: address of UR5
+        :param port: port of the realtime interface
+        :param timeout: seconds without data after which the connection is opened again
+        """
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.state = None
+        self.updated = threading.Condition()
+        self.listeners = []
+        self.running = False
+        self.connection = None
+        self.thread = None
+
+    def start(self):
+        """
+        start reading in a daemon thread
+        :return: self
+        """
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self.run, name='ur5-realtime', daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        stop reading and close the connection
+        :return: none
+        """
+        self.running = False
+        connection = self.connection
+        if connection is not None:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def run(self):
+        """
+        body of the reader thread, connects and reads until stopped
+        :return: none
+        """
+        while self.running:
+            try:
+                self.connection = socket.create_connection((self.host, self.port), self.timeout)
+                self.connection.settimeout(self.timeout)
+                self.read_packets(self.connection)
+            except (OSError, ValueError) as e:
+                if self.running:
+                    print('realtime connection lost:', e)
+                    time.sleep(RECONNECT_DELAY)
+            finally:
+                if self.connection is not None:
+                    self.connection.close()
+                    self.connection = None
+
+    def read_packets(self, connection):
+        """
+        read packets from a connection and publish them until stopped
+        :param connection: connected socket
+        :return: none
+        """
+        header = bytearray(MESSAGE_SIZE.size)
+        buffer = bytearray(MAX_MESSAGE_SIZE)
+        sequence = 0 if self.state is None else self.state.sequence + 1
+        while self.running:
+            receive_exactly(connection, memoryview(header))
+            size = MESSAGE_SIZE.unpack(header)[0]
+            if not MIN_MESSAGE_SIZE <= size <= MAX_MESSAGE_SIZE:
+                raise ValueError('invalid message size %d' % size)
+            buffer[0:MESSAGE_SIZE.size] = header
+            receive_exactly(connection, memoryview(buffer)[MESSAGE_SIZE.size:size])
+            packet = realtime_packet.decode(bytes(buffer[0:size]))
+            self.publish(RealtimeState(packet['tool_vector_actual'].tolist(), float(packet['time']), time.monotonic(),
+                                       sequence, packet))
+            sequence += 1
+
+    def publish(self, state):
+        """
+        replace the snapshot, wake the threads waiting for it and call the listeners, a listener raising an exception
+        does not stop the reader thread nor the other listeners
+        :param state: RealtimeState
+        :return: none
+        """
+        with self.updated:
+            self.state = state
+            self.updated.notify_all()
+        for listener in self.listeners:
+            try:
+                listener(state)
+            except Exception as e:
+                print('realtime listener failed:', repr(e))
+
+    def add_listener(self, listener):
+        """
+        call @listener with every new state, in the reader thread; it must return quickly
+        :param listener: function taking a RealtimeState
+        :return: none
+        """
+        self.listeners = self.listeners + [listener]
+
+    def remove_listener(self, listener):
+        """
+        :param listener: function added with add_listener
+        :return: none
+        """
+        self.listeners = [function for function in self.listeners if function is not listener]
+
+    def latest(self):
+        """
+        :return: the latest RealtimeState, None before the first packet
+        """
+        return self.state
+
+    def wait_for_state(self, after=None, timeout=None):
+        """
+        wait for a state newer than @after
+        :param after: RealtimeState already seen, None for any state
+        :param timeout: seconds to wait at most, None for no limit
+        :return: the latest RealtimeState
+        """
+        def fresh():
+            state = self.state
+            return state is not None and (after is None or state.sequence > after.sequence)
+        with self.updated:
+            if not self.updated.wait_for(fresh, timeout):
+                raise TimeoutError('no state from UR5 within %s s' % timeout)
+            return self.state
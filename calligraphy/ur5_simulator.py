@@ -0,0 +1,450 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Simulator of the UR5 controller, for running easy_ur5 without a robot
+
+The simulator listens on the script port (30002) and on the realtime port (30003) like the controller does. Scripts
+are parsed line by line: poses are assigned to variables or written in place, a def ... end block is run as soon as it
+ends (calling it right after the definition does not run it twice), a single movel or movep line is run as a program of
+its own, a call runs a defined program again, and anything else, such as rq_activate_and_wait(), is ignored. A new
+program replaces the running one.
+
+The tool follows the moves in cartesian space: it accelerates and brakes with the given a, runs at most at the given
+v, cuts through a waypoint once it is within the blend radius r, and stops at waypoints without blend and at the end of
+a program. Joints are not simulated. Every 8 ms the state is sent to all realtime clients as a packet of
+realtime_packet.PACKET_DTYPE, with the pose, speed, target, robot mode and program state filled in.
+
+    simulator = Ur5Simulator(port=0, realtime_port=0).start()
+    machine = easy_ur5.EasyUr5('127.0.0.1', simulator.port, simulator.realtime_port)
+
+Run this module to serve on the default ports until interrupted.
+"""
+import collections
+import math
+import re
+import socket
+import threading
+import time
+import numpy
+import realtime_packet
+
+PORT_30002 = 30002
+PORT_30003 = 30003
+FREQUENCY = 125
+HOME_POSE = [0.0, -0.4, 0.3, 0.0, math.pi, 0.0]
+# defaults of movel and movep of URScript
+DEFAULT_ACCELERATION = 1.2
+DEFAULT_SPEED = 0.25
+# distance in metres below which a position counts as reached
+EPSILON = 1e-9
+SAFETY_MODE_NORMAL = 1
+JOINT_MODE_RUNNING = 253
+
+# kind: 'movel' or 'movep'
+# pose: numpy array of [x, y, z, axis_1, axis_2, axis_3]
+# acceleration: tool acceleration in m/s^2
+# speed: tool speed in m/s
+# blend: blend radius in metres, 0 to stop at the pose
+
+Motion = collections.namedtuple('Motion', ['kind', 'pose', 'acceleration', 'speed', 'blend'])
+
+# name: name of the program, None for a single move
+# moves: number of moves of the program
+# received: time.monotonic() when the program was received
+# finished: time.monotonic() when the tool stopped at the end of the program, None if it is running or was replaced
+
+ProgramRecord = collections.namedtuple('ProgramRecord', ['name', 'moves', 'received', 'finished'])
+
+MOVE_PATTERN = re.compile(r'^(movel|movep)\(\s*(?:p\[([^\]]*)\]|(\w+))\s*(.*)\)$')
+ASSIGN_PATTERN = re.compile(r'^(?:global\s+|local\s+)?(\w+)\s*=\s*p\[([^\]]*)\]$')
+ARGUMENT_PATTERN = re.compile(r'(\w+)\s*=\s*([-+0-9.eE]+)')
+DEF_PATTERN = re.compile(r'^def\s+(\w+)\(\)\s*:$')
+CALL_PATTERN = re.compile(r'^(\w+)\(\)$')
+
+
+def parse_pose(text):
+    """
+    :param text: the values of a pose literal, "x, y, z, axis_1, axis_2, axis_3"
+    :return: numpy array of the pose, None if @text is not a pose
+    """
+    try:
+        pose = numpy.array([float(value) for value in text.split(',')])
+    except ValueError:
+        return None
+    return pose if len(pose) == 6 else None
+
+
+def parse_move(statement, variables):
+    """
+    parse a movel or movep statement
+    :param statement: one line of URScript, stripped
+    :param variables: dictionary, key: name of a pose variable value: numpy array of the pose
+    :return: Motion, None if @statement is not a move to a known pose
+    """
+    match = MOVE_PATTERN.match(statement)
+    if match is None:
+        return None
+    pose = parse_pose(match.group(2)) if match.group(2) is not None else variables.get(match.group(3))
+    if pose is None:
+        return None
+    arguments = dict((name, float(value)) for name, value in ARGUMENT_PATTERN.findall(match.group(4)))
+    return Motion(match.group(1), pose, arguments.get('a', DEFAULT_ACCELERATION), arguments.get('v', DEFAULT_SPEED),
+                  arguments.get('r', 0.0))
+
+
+class ScriptParser:
+    """
+    turns the text received on the script port into programs to run
+    """
+    def __init__(self):
+        self.buffer = ''
+        self.functions = {}
+        self.variables = {}
+        self.block = None
+        # the last statements that were not understood, line markers ($ ...) excluded
+        self.ignored = collections.deque(maxlen=100)
+
+    def feed(self, text):
+        """
+        parse the complete lines of @text and of the text fed before
+        :param text: text received on the script port
+        :return: array of ('define', name, motions), ('call', name, motions) and ('move', None, motions)
+        """
+        lines = (self.buffer + text).split('\n')
+        self.buffer = lines.pop()
+        actions = []
+        for line in lines:
+            statement = line.strip()
+            if not statement or statement.startswith('$'):
+                continue
+            match = ASSIGN_PATTERN.match(statement)
+            if match is not None and parse_pose(match.group(2)) is not None:
+                self.variables[match.group(1)] = parse_pose(match.group(2))
+                continue
+            if self.block is not None:
+                name, motions = self.block
+                if statement == 'end':
+                    self.functions[name] = motions
+                    actions.append(('define', name, motions))
+                    self.block = None
+                    continue
+                motion = parse_move(statement, self.variables)
+                if motion is None:
+                    self.ignored.append(statement)
+                else:
+                    motions.append(motion)
+                continue
+            match = DEF_PATTERN.match(statement)
+            if match is not None:
+                self.block = (match.group(1), [])
+                continue
+            motion = parse_move(statement, self.variables)
+            if motion is not None:
+                actions.append(('move', None, [motion]))
+                continue
+            match = CALL_PATTERN.match(statement)
+            if match is not None and match.group(1) in self.functions:
+                actions.append(('call', match.group(1), self.functions[match.group(1)]))
+                continue
+            self.ignored.append(statement)
+        return actions
+
+
+class ToolModel:
+    """
+    cartesian kinematic model of the tool
+    """
+    def __init__(self, pose=HOME_POSE):
+        """
+        :param pose: initial pose of the tool, [x, y, z, axis_1, axis_2, axis_3]
+        """
+        self.pose = numpy.array(pose, dtype=float)
+        self.speed = 0.0
+        self.velocity = numpy.zeros(6)
+        self.motions = collections.deque()
+
+    def run(self, motions):
+        """
+        replace the running moves, the tool keeps its speed
+        :param motions: array of Motion
+        :return: None
+        """
+        self.motions = collections.deque(motions)
+
+    def running(self):
+        return len(self.motions) > 0
+
+    def target(self):
+        """
+        :return: pose the tool is moving to, its current pose when it is not moving
+        """
+        return self.motions[0].pose if self.motions else self.pose
+
+    def step(self, dt):
+        """
+        advance the tool by @dt seconds
+        :param dt: seconds
+        :return: None
+        """
+        start = self.pose.copy()
+        remaining = dt
+        while remaining > 0 and self.motions:
+            motion = self.motions[0]
+            last = len(self.motions) == 1
+            blend = 0.0 if last else motion.blend
+            delta = motion.pose[0:3] - self.pose[0:3]
+            distance = float(numpy.sqrt(numpy.dot(delta, delta)))
+            if distance <= max(blend, EPSILON):
+                if blend == 0.0:
+                    self.pose[:] = motion.pose
+                    self.speed = 0.0
+                self.motions.popleft()
+                continue
+            end_speed = 0.0 if blend == 0.0 else min(motion.speed, self.motions[1].speed)
+            braking = math.sqrt(end_speed * end_speed + 2 * motion.acceleration * distance)
+            self.speed = max(min(motion.speed, self.speed + motion.acceleration * remaining, braking), EPSILON)
+            travel = self.speed * remaining
+            if travel >= distance - blend:
+                # the waypoint, or its blend radius, is reached within this step
+                used = distance - blend
+                remaining -= used / self.speed
+                self.pose += (motion.pose - self.pose) * (used / distance)
+                if blend == 0.0:
+                    self.pose[:] = motion.pose
+                    self.speed = 0.0
+                self.motions.popleft()
+            else:
+                self.pose += (motion.pose - self.pose) * (travel / distance)
+                remaining = 0
+        if not self.motions:
+            self.speed = 0.0
+        self.velocity = (self.pose - start) / dt
+
+
+class Ur5Simulator:
+    """
+    script and realtime servers driven by a ToolModel
+    """
+    def __init__(self, host='127.0.0.1', port=PORT_30002, realtime_port=PORT_30003, pose=HOME_POSE,
+                 frequency=FREQUENCY, time_scale=1.0):
+        """
+        :param host: address to listen on
+        :param port: script port, 0 for any free port
+        :param realtime_port: realtime port, 0 for any free port
+        :param pose: initial pose of the tool
+        :param frequency: packets sent per second
+        :param time_scale: simulated seconds per second, above 1 to run the moves faster than UR5
+        """
+        self.host = host
+        self.port = port
+        self.realtime_port = realtime_port
+        self.period = 1.0 / frequency
+        self.time_scale = time_scale
+        self.model = ToolModel(pose)
+        self.lock = threading.Lock()
+        self.clients = []
+        self.records = []
+        self.pending = None
+        self.clock = 0.0
+        self.packet = numpy.zeros(1, realtime_packet.PACKET_DTYPE)
+        self.servers = []
+        self.threads = []
+        self.running = False
+
+    def start(self):
+        """
+        open the ports and start serving
+        :return: self
+        """
+        script_server = self.listen(self.port)
+        realtime_server = self.listen(self.realtime_port)
+        self.port = script_server.getsockname()[1]
+        self.realtime_port = realtime_server.getsockname()[1]
+        self.servers = [script_server, realtime_server]
+        self.running = True
+        self.threads = [
+            threading.Thread(target=self.accept_scripts, args=(script_server,), daemon=True),
+            threading.Thread(target=self.accept_realtime, args=(realtime_server,), daemon=True),
+            threading.Thread(target=self.tick, daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def stop(self):
+        """
+        close all connections and wait for the threads
+        :return: None
+        """
+        self.running = False
+        for server in self.servers:
+            server.close()
+        with self.lock:
+            clients, self.clients = self.clients, []
+        for client in clients:
+            client.close()
+        for thread in self.threads:
+            if thread is not threading.current_thread():
+                thread.join(1.0)
+
+    def listen(self, port):
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        server.bind((self.host, port))
+        server.listen(4)
+        server.settimeout(0.2)
+        return server
+
+    def accept_scripts(self, server):
+        """
+        accept script connections, each is read by a thread of its own
+        :param server: listening socket
+        :return: None
+        """
+        while self.running:
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            thread = threading.Thread(target=self.read_scripts, args=(connection,), daemon=True)
+            thread.start()
+
+    def read_scripts(self, connection):
+        """
+        read and run the scripts of one connection until it is closed
+        :param connection: connected socket
+        :return: None
+        """
+        parser = ScriptParser()
+        connection.settimeout(0.2)
+        with connection:
+            while self.running:
+                try:
+                    data = connection.recv(65536)
+                except socket.timeout:
+                    continue
+                except OSError:
+                    return
+                if not data:
+                    return
+                received = time.monotonic()
+                for kind, name, motions in parser.feed(data.decode('utf-8', 'replace')):
+                    self.run(kind, name, motions, received)
+
+    def run(self, kind, name, motions, received):
+        """
+        run a parsed program
+        :param kind: 'define', 'call' or 'move'
+        :param name: name of the program
+        :param motions: array of Motion
+        :param received: time.monotonic() when the program was received
+        :return: None
+        """
+        with self.lock:
+            if kind == 'call' and self.pending == name:
+                # the program is already running since its definition
+                self.pending = None
+                return
+            self.pending = name if kind == 'define' else None
+            self.model.run(motions)
+            self.records.append(ProgramRecord(name, len(motions), received, None))
+            if not motions:
+                self.finish(received)
+
+    def finish(self, now):
+        """
+        mark the last program as finished, the lock is held
+        :param now: time.monotonic()
+        :return: None
+        """
+        if self.records and self.records[-1].finished is None:
+            self.records[-1] = self.records[-1]._replace(finished=now)
+
+    def accept_realtime(self, server):
+        """
+        accept realtime connections, the packets are sent to them by tick
+        :param server: listening socket
+        :return: None
+        """
+        while self.running:
+            try:
+                connection, _ = server.accept()
+            except socket.timeout:
+                continue
+            except OSError:
+                return
+            with self.lock:
+                self.clients.append(connection)
+
+    def build_packet(self):
+        """
+        write the state of the model into the packet, the lock is held
+        :return: bytes of the packet
+        """
+        record = self.packet[0]
+        record['message_size'] = realtime_packet.PACKET_SIZE
+        record['time'] = self.clock
+        record['controller_timer'] = self.clock
+        record['tool_vector_actual'] = self.model.pose
+        record['tool_vector_target'] = self.model.target()
+        record['tcp_speed_actual'] = self.model.velocity
+        record['tcp_speed_target'] = self.model.velocity
+        record['robot_mode'] = realtime_packet.ROBOT_MODE_RUNNING
+        record['safety_mode'] = SAFETY_MODE_NORMAL
+        record['joint_modes'] = JOINT_MODE_RUNNING
+        record['speed_scaling'] = 1.0
+        record['program_state'] = (realtime_packet.PROGRAM_STATE_PLAYING if self.model.running()
+                                   else realtime_packet.PROGRAM_STATE_STOPPED)
+        return self.packet.tobytes()
+
+    def tick(self):
+        """
+        advance the model and send a packet to every realtime client, once per period
+        :return: None
+        """
+        deadline = time.monotonic()
+        while self.running:
+            with self.lock:
+                dt = self.period * self.time_scale
+                was_running = self.model.running()
+                self.model.step(dt)
+                self.clock += dt
+                if was_running and not self.model.running():
+                    self.finish(time.monotonic())
+                data = self.build_packet()
+                clients = list(self.clients)
+            for client in clients:
+                try:
+                    client.sendall(data)
+                except OSError:
+                    client.close()
+                    with self.lock:
+                        if client in self.clients:
+                            self.clients.remove(client)
+            deadline += self.period
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                deadline = time.monotonic()
+
+    def host_latencies(self):
+        """
+        get the time the host needed to send the next program after each finished program
+        :return: array of seconds
+        """
+        with self.lock:
+            records = list(self.records)
+        return [following.received - record.finished for record, following in zip(records, records[1:])
+                if record.finished is not None and following.received >= record.finished]
+
+
+if __name__ == '__main__':
+    SIMULATOR = Ur5Simulator('0.0.0.0').start()
+    print('simulating UR5 on ports %d and %d, press Ctrl-C to stop' % (SIMULATOR.port, SIMULATOR.realtime_port))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        SIMULATOR.stop()
@@ -0,0 +1,123 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""URScript programs writing whole characters
+
+One program is generated for all sub-strokes of a character, or of any run of sub-strokes such as a line of a page.
+The entries of the strokes, the slowed down ends before sharp turns and the lifts follow each other as consecutive
+movel and movep blocks of the same program, so UR5 runs through them without waiting for the host in between. The
+speeds, blend radii and the extra waypoint before the end of a sub-stroke are those of easy_ur5.sub_stroke_program, both
+get them from sub_stroke_waypoints.
+"""
+import collections
+import numpy
+import simplify
+import ur5_constants
+
+# kind: 'movel' or 'movep'
+# pose: [x, y, z, axis_1, axis_2, axis_3]
+# speed: tool speed in m/s
+# blend: blend radius in metres, 0 to stop at the pose
+
+Move = collections.namedtuple('Move', ['kind', 'pose', 'speed', 'blend'])
+
+
+def sub_stroke_waypoints(pos_l, slow_down, first):
+    """
+    get the waypoints of a sub-stroke and the speeds the tool moves to them with. the speed ramps down to the final rate
+    over the last ur5_constants.BROKEN_SLOW_DOWN or NORMAL_SLOW_DOWN metres of the written path, which gets a waypoint
+    every ur5_constants.RAMP_STEP there. a sub-stroke which does not slow down ends with the lift of the brush, reached
+    through an extra waypoint midway and lower
+    :param pos_l: position array
+    :param slow_down: boolean, if the stroke should slow down at the end of the sub-stroke
+    :param first: boolean, if the sub-stroke is the first of the stroke
+    :return: array of waypoints, and array of the speeds of the waypoints written with the ramp
+    """
+    begin = 1 if first else 0
+    end = len(pos_l) if slow_down else len(pos_l) - 1
+    if slow_down:
+        rate, distance = ur5_constants.BROKEN_FINAL_RATE, ur5_constants.BROKEN_SLOW_DOWN
+    else:
+        rate, distance = ur5_constants.NORMAL_FINAL_RATE, ur5_constants.NORMAL_SLOW_DOWN
+    written = simplify.resample_tail(pos_l[begin:end], distance, ur5_constants.RAMP_STEP)
+    ramp = numpy.clip(1 - simplify.distances_to_end(written) / distance, 0, 1) if written else numpy.zeros(0)
+    speeds = [ur5_constants.ROBOT_SPEED] * begin + (
+        ur5_constants.ROBOT_SPEED * (1 - (1 - rate) * ramp)).tolist()
+    pos_l = [[float(value) for value in pos] for pos in pos_l[:begin]] + written + \
+        [[float(value) for value in pos] for pos in pos_l[end:]]
+    if not slow_down:
+        midway = (numpy.array(pos_l[-2]) + numpy.array(pos_l[-1])) * 0.5
+        midway[2] = midway[2] - 0.0125
+        pos_l.insert(len(pos_l) - 1, midway.tolist())
+    return pos_l, speeds
+
+
+def sub_stroke_moves(pos_l, slow_down, first, r=0.002):
+    """
+    get the moves of a sub-stroke
+    :param pos_l: position array
+    :param slow_down: boolean, if the stroke should slow down at the end of the sub-stroke
+    :param first: boolean, if the sub-stroke is the first of the stroke
+    :param r: blend radius
+    :return: array of Move
+    """
+    speed = ur5_constants.ROBOT_SPEED
+    pos_l, speeds = sub_stroke_waypoints(pos_l, slow_down, first)
+    argc = len(pos_l)
+
+    moves = []
+    if first:
+        moves.extend(Move('movel', pos, speed, 0.0) for pos in pos_l[0:2])
+    for i in range(argc - 1):
+        if not slow_down and argc - 2 == i:
+            continue
+        if first and i < 2:
+            continue
+        moves.append(Move('movep', pos_l[i], speeds[i], r))
+
+    if slow_down:
+        moves.append(Move('movep', pos_l[argc - 1], ur5_constants.BROKEN_FINAL_RATE * speed, 0.0))
+    else:
+        moves.append(Move('movep', pos_l[argc - 2], ur5_constants.NORMAL_FINAL_RATE * speed * 2, 0.001))
+        moves.append(Move('movep', pos_l[argc - 1], ur5_constants.NORMAL_FINAL_RATE * speed * 2, 0.0))
+    return moves
+
+
+def format_poses(poses):
+    """
+    format poses for URScript in one pass, each value as str() would
+    :param poses: array of [x, y, z, axis_1, axis_2, axis_3]
+    :return: array of "p[x, y, z, axis_1, axis_2, axis_3]"
+    """
+    values = [repr(value) for value in numpy.asarray(poses, dtype=float).reshape(-1).tolist()]
+    return ["p[" + ", ".join(values[i:i + 6]) + "]" for i in range(0, len(values), 6)]
+
+
+def move_lines(moves):
+    """
+    :param moves: array of Move
+    :return: array of the URScript statements of @moves
+    """
+    poses = format_poses([move.pose for move in moves])
+    acceleration = ur5_constants.ROBOT_ACCELERATION
+    lines = []
+    for move, pose in zip(moves, poses):
+        if move.kind == 'movel':
+            lines.append("  movel(%s, a=%s, v=%s, r=%s)\n" % (pose, acceleration, move.speed, move.blend))
+        else:
+            lines.append("  movep(%s, a=%s, v=%.3f, r=%.3f)\n" % (pose, acceleration, move.speed, move.blend))
+    return lines
+
+
+def program(sub_strokes, name=None, r=0.002):
+    """
+    create one program writing sub-strokes one after another
+    :param sub_strokes: iterable of stroke_split.SubStroke or [points, slow_down, first]
+    :param name: name of the program, None for ur5_constants.PROGRAM_NAME
+    :param r: blend radius
+    :return: the program, and the last position of the program
+    """
+    moves = []
+    for points, slow_down, first in sub_strokes:
+        moves.extend(sub_stroke_moves(points, slow_down, first, r))
+    lines = ["def %s():\n" % (name or ur5_constants.PROGRAM_NAME)] + move_lines(moves) + ["end\n"]
+    return "".join(lines), moves[-1].pose if moves else None
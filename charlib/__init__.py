@@ -0,0 +1,2 @@
+import charlib.binary
+import charlib.library
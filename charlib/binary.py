@@ -0,0 +1,207 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Binary character library
+
+A compact replacement of data.json. The file holds a header, an index of codepoints sorted in ascending order, the
+offsets of the strokes in the point array, and the packed float64 [row, col, width] points of all strokes, so the
+integer coordinates and the widths of data.json come back exactly:
+
+    header   magic, version, number of characters, number of strokes, number of points
+    index    (codepoint, first stroke, stroke count) per character
+    offsets  first point of every stroke, plus the total number of points
+    points   (row, col, width) per point, width is nan where data.json has null
+
+The file is opened with mmap, so looking a character up reads only its own strokes and returns zero-copy NumPy views.
+Run this module to convert ..\\data\\data.json to ..\\data\\data.clib
+"""
+import json
+import mmap
+import os
+import struct
+import numpy as np
+
+MY_PATH = os.path.abspath(os.path.dirname(__file__))
+JSON_DIR = os.path.join(MY_PATH, r"..\data\data.json")
+LIB_DIR = os.path.join(MY_PATH, r"..\data\data.clib")
+
+MAGIC = b'CLIB'
+VERSION = 2
+HEADER = struct.Struct('<4sIIII4x')
+INDEX_DTYPE = np.dtype([('codepoint', '<u4'), ('first_stroke', '<u4'), ('stroke_count', '<u4')])
+OFFSET_DTYPE = np.dtype('<u4')
+POINT_DTYPE = np.dtype('<f8')
+
+
+def pack_stroke(complete):
+    """
+    pack a stroke of data.json
+    :param complete: array of [[row, col], width] of the points of a stroke
+    :return: (n, 3) float64 array of [row, col, width]
+    """
+    return np.array([[point[0][0], point[0][1], np.nan if point[1] is None else point[1]] for point in complete],
+                    POINT_DTYPE).reshape(-1, 3)
+
+
+def to_complete_set(strokes):
+    """
+    unpack the strokes of a character to the nested array format of data.json
+    :param strokes: array of (n, 3) arrays of [row, col, width]
+    :return: array of strokes, each an array of [[row, col], width]
+    """
+    complete_set = []
+    for stroke in strokes:
+        complete_set.append([[[int(row), int(col)], None if width != width else width]
+                             for row, col, width in stroke.tolist()])
+    return complete_set
+
+
+def write_library(url, library):
+    """
+    write a binary character library, the file is written to a temporary file first and then moved over @url
+    :param url: the url of the binary library
+    :param library: dictionary, key: hex codepoint as in data.json value: array of strokes in data.json format
+    :return: none
+    """
+    keys = sorted(library, key=lambda key: int(key, 16))
+    index = np.zeros(len(keys), INDEX_DTYPE)
+    strokes = []
+    for i, key in enumerate(keys):
+        index[i] = (int(key, 16), len(strokes), len(library[key]))
+        strokes.extend(pack_stroke(complete) for complete in library[key])
+    lengths = [len(stroke) for stroke in strokes]
+    offsets = np.zeros(len(strokes) + 1, OFFSET_DTYPE)
+    offsets[1:] = np.cumsum(lengths)
+    points = np.concatenate(strokes) if strokes else np.zeros((0, 3), POINT_DTYPE)
+
+    temp_url = url + '.tmp'
+    with open(temp_url, 'wb') as file:
+        file.write(HEADER.pack(MAGIC, VERSION, len(keys), len(strokes), len(points)))
+        file.write(index.tobytes())
+        file.write(offsets.tobytes())
+        file.write(points.astype(POINT_DTYPE).tobytes())
+    os.replace(temp_url, url)
+
+
+def convert_json(json_url=JSON_DIR, library_url=LIB_DIR):
+    """
+    convert data.json to a binary character library
+    :param json_url: the url of the .json library
+    :param library_url: the url of the binary library to be written
+    :return: none
+    """
+    with open(json_url, 'r') as file:
+        library = json.load(file)
+    write_library(library_url, library)
+
+
+def up_to_date(library_url, json_url):
+    """
+    check if a binary library can be used instead of converting the .json library again
+    :param library_url: the url of the binary library
+    :param json_url: the url of the .json library it is converted from
+    :return: True if the binary library exists, is of this VERSION and is not older than the .json library
+    """
+    if not os.path.exists(library_url):
+        return False
+    if os.path.exists(json_url) and os.path.getmtime(library_url) < os.path.getmtime(json_url):
+        return False
+    with open(library_url, 'rb') as file:
+        header = file.read(HEADER.size)
+    return len(header) == HEADER.size and HEADER.unpack(header)[0:2] == (MAGIC, VERSION)
+
+
+def ensure_library(json_url=JSON_DIR, library_url=LIB_DIR):
+    """
+    convert the .json library unless the binary library is up to date
+    :param json_url: the url of the .json library
+    :param library_url: the url of the binary library
+    :return: none
+    """
+    if not up_to_date(library_url, json_url):
+        convert_json(json_url, library_url)
+
+
+class BinaryLibrary:
+    """
+    read-only view of a binary character library. it can also be used like the dictionary loaded from data.json: keys
+    are hex codepoints and values are fresh nested arrays of strokes
+    """
+    def __init__(self, url=LIB_DIR):
+        """
+        map a binary character library into memory
+        :param url: the url of the binary library
+        """
+        with open(url, 'rb') as file:
+            self.buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, char_count, stroke_count, point_count = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('not a character library of version %d: %s' % (VERSION, url))
+        offset = HEADER.size
+        self.index = np.frombuffer(self.buffer, INDEX_DTYPE, char_count, offset)
+        offset += self.index.nbytes
+        self.offsets = np.frombuffer(self.buffer, OFFSET_DTYPE, stroke_count + 1, offset)
+        offset += self.offsets.nbytes
+        self.points = np.frombuffer(self.buffer, POINT_DTYPE, point_count * 3, offset).reshape(-1, 3)
+        self.codepoints = self.index['codepoint']
+
+    def find(self, codepoint):
+        """
+        find a character in the index
+        :param codepoint: unicode codepoint of the character
+        :return: position of the character in the index, -1 if it is not in the library
+        """
+        position = int(np.searchsorted(self.codepoints, codepoint))
+        if position < len(self.codepoints) and self.codepoints[position] == codepoint:
+            return position
+        return -1
+
+    def strokes(self, codepoint):
+        """
+        get the strokes of a character
+        :param codepoint: unicode codepoint of the character
+        :return: array of (n, 3) float64 views of [row, col, width], None if the character is not in the library
+        """
+        position = self.find(codepoint)
+        if position < 0:
+            return None
+        first = int(self.index[position]['first_stroke'])
+        count = int(self.index[position]['stroke_count'])
+        bounds = self.offsets[first:first + count + 1].tolist()
+        return [self.points[bounds[i]:bounds[i + 1]] for i in range(count)]
+
+    def keys(self):
+        """
+        :return: hex codepoints of all characters, as in data.json
+        """
+        return [hex(codepoint)[2:] for codepoint in self.codepoints.tolist()]
+
+    def __len__(self):
+        return len(self.codepoints)
+
+    def __contains__(self, key):
+        try:
+            return self.find(int(key, 16)) >= 0
+        except ValueError:
+            return False
+
+    def __getitem__(self, key):
+        try:
+            strokes = self.strokes(int(key, 16))
+        except ValueError:
+            strokes = None
+        if strokes is None:
+            raise KeyError(key)
+        return to_complete_set(strokes)
+
+    def close(self):
+        """
+        unmap the library, views returned by strokes must not be used afterwards
+        :return: none
+        """
+        self.index = self.offsets = self.points = self.codepoints = None
+        self.buffer.close()
+
+
+if __name__ == '__main__':
+    convert_json()
+    print('converted ', JSON_DIR, ' to ', LIB_DIR)
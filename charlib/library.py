@@ -0,0 +1,84 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Character lookup for writing services
+
+CharacterLibrary looks characters up by the character itself instead of the hex key of data.json. Strokes are decoded
+from the memory-mapped binary library only when a character is first asked for, and the decoded characters are kept in
+an LRU cache bounded by memory, so a long running service keeps the characters it writes often and nothing else.
+"""
+import collections
+import numpy as np
+import charlib.binary
+
+DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class CharacterLibrary:
+    """
+    codepoint keyed access to a binary character library with an LRU cache of decoded characters
+    """
+    def __init__(self, url=charlib.binary.LIB_DIR, max_bytes=DEFAULT_CACHE_BYTES):
+        """
+        open a binary character library, no stroke is read yet
+        :param url: the url of the binary library
+        :param max_bytes: upper bound of the memory used by the decoded characters in the cache
+        """
+        self.library = charlib.binary.BinaryLibrary(url)
+        self.max_bytes = max_bytes
+        self.cache = collections.OrderedDict()
+        self.cache_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, char):
+        """
+        get the strokes of a character
+        :param char: the character, a string of length 1
+        :return: array of read-only (n, 3) float64 arrays of [row, col, width], None if the character is not in the
+            library
+        """
+        codepoint = ord(char)
+        if codepoint in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(codepoint)
+            return self.cache[codepoint]
+        self.misses += 1
+        strokes = self.library.strokes(codepoint)
+        if strokes is None:
+            return None
+        decoded = []
+        for stroke in strokes:
+            stroke = np.array(stroke, np.float64)
+            stroke.flags.writeable = False
+            decoded.append(stroke)
+        self.cache[codepoint] = decoded
+        self.cache_bytes += sum(stroke.nbytes for stroke in decoded)
+        self.evict()
+        return decoded
+
+    def evict(self):
+        """
+        drop the least recently used characters until the cache fits in max_bytes, the most recent one is always kept
+        :return: none
+        """
+        while self.cache_bytes > self.max_bytes and len(self.cache) > 1:
+            _, strokes = self.cache.popitem(last=False)
+            self.cache_bytes -= sum(stroke.nbytes for stroke in strokes)
+
+    def prefetch(self, string):
+        """
+        decode all characters of a job before it starts
+        :param string: the string to be written
+        :return: array of the characters of @string that are not in the library
+        """
+        missing = []
+        for char in collections.OrderedDict.fromkeys(string):
+            if self.get(char) is None:
+                missing.append(char)
+        return missing
+
+    def __contains__(self, char):
+        return ord(char) in self.cache or self.library.find(ord(char)) >= 0
+
+    def __len__(self):
+        return len(self.library)
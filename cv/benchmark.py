@@ -0,0 +1,381 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Benchmarks of the extraction hot path
+
+The strokes and stroke order GIFs used here are drawn synthetically, so the benchmarks can be run without the GIFs
+library. Run this module to print the timings, the extraction benchmark times parse_gif stage by stage:
+
+    python benchmark.py                          print per-stage timings of the synthetic GIFs
+    python benchmark.py --save baseline.json     also save them as a baseline
+    python benchmark.py --compare baseline.json  fail if a stage got slower than the baseline allows
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import PIL.Image
+import cv2
+import cv
+import frame_labels
+import frames
+import skeleton_graph
+import stroke_width
+import stroke_matrix
+
+STROKE_THICKNESS = 15
+# BGR colour of the stroke being written, it is inside the HSV and the BGR ranges of red of
+# frame_labels.DEFAULT_THRESHOLDS
+WRITING_COLOR = (120, 110, 235)
+WRITTEN_COLOR = (0, 0, 0)
+BACKGROUND_COLOR = (255, 255, 255)
+FRAMES_PER_STROKE = 12
+STAGES = ['decode', 'preprocess', 'thinning', 'tracing', 'width', 'direction', 'union']
+# a stage regresses if it is slower than this factor times its baseline
+REGRESSION_FACTOR = 1.5
+
+
+def synthetic_stroke(points, thickness=STROKE_THICKNESS):
+    """
+    draw a stroke the way processing_logic sees it
+    :param points: array of [x, y] control points of the stroke
+    :param thickness: width of the stroke in pixels
+    :return: gray, the gray graph of the stroke; thinned, the Zhang-Suen thinned matrix of the stroke
+    """
+    gray = np.zeros((300, 300), np.uint8)
+    cv2.polylines(gray, [np.array(points, np.int32)], False, 255, thickness)
+    thinned = cv2.ximgproc.thinning(gray, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+    return gray, thinned
+
+
+def stroke_shapes():
+    """
+    a few typical strokes: a horizontal, a vertical, a slanted and a hooked one
+    :return: array of arrays of [x, y] control points
+    """
+    hook = [[60 + 2 * i, 40 + int(60 * math.sin(i / 30.0))] for i in range(90)] + [[240, 120], [220, 140]]
+    return [
+        [[30, 150], [270, 150]],
+        [[150, 30], [150, 270]],
+        [[60, 240], [250, 60]],
+        hook,
+    ]
+
+
+def synthetic_strokes():
+    """
+    the strokes of stroke_shapes, drawn
+    :return: array of (gray, thinned) pairs
+    """
+    return [synthetic_stroke(points) for points in stroke_shapes()]
+
+
+def densify(points, step=4):
+    """
+    insert points along a polyline, so it can be drawn a little at a time
+    :param points: array of [x, y] control points
+    :param step: distance between two inserted points in pixels
+    :return: (n, 2) int32 array of points
+    """
+    result = [points[0]]
+    for start, end in zip(points[:-1], points[1:]):
+        count = max(1, int(math.hypot(end[0] - start[0], end[1] - start[1]) / step))
+        for i in range(1, count + 1):
+            result.append([start[0] + (end[0] - start[0]) * i / count, start[1] + (end[1] - start[1]) * i / count])
+    return np.array(result, np.int32)
+
+
+def make_stroke_order_gif(url, strokes, frames_per_stroke=FRAMES_PER_STROKE, thickness=STROKE_THICKNESS):
+    """
+    write a stroke order GIF in the style of hanzi5: every stroke is drawn in red a little more in every frame, and
+    turns black in the frame after it is complete
+    :param url: the url of the GIF to be written
+    :param strokes: array of strokes, each an array of [x, y] control points, in writing order
+    :param frames_per_stroke: number of frames in which a stroke is drawn
+    :param thickness: width of the strokes in pixels
+    :return: none
+    """
+    canvas = np.full((300, 300, 3), BACKGROUND_COLOR, np.uint8)
+    images = [canvas.copy()]
+    for stroke in strokes:
+        points = densify(stroke)
+        for i in range(1, frames_per_stroke + 1):
+            image = canvas.copy()
+            count = max(2, int(round(len(points) * i / float(frames_per_stroke))))
+            cv2.polylines(image, [points[:count]], False, WRITING_COLOR, thickness)
+            images.append(image)
+        cv2.polylines(canvas, [points], False, WRITTEN_COLOR, thickness)
+        images.append(canvas.copy())
+    images = [PIL.Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)) for image in images]
+    images[0].save(url, save_all=True, append_images=images[1:], duration=50)
+
+
+def synthetic_gifs(directory, count=8):
+    """
+    write a set of synthetic stroke order GIFs, each with a different subset and order of stroke_shapes
+    :param directory: the directory the GIFs are written to
+    :param count: number of GIFs
+    :return: array of urls of the GIFs
+    """
+    shapes = stroke_shapes()
+    urls = []
+    for i in range(count):
+        strokes = [shapes[(i + j) % len(shapes)] for j in range(1 + i % len(shapes))]
+        if i % 2:
+            strokes = [stroke[::-1] for stroke in strokes]
+        url = os.path.join(directory, 'synthetic-%d.gif' % i)
+        make_stroke_order_gif(url, strokes)
+        urls.append(url)
+    return urls
+
+
+def measure(function, repeat):
+    """
+    time a function
+    :param function: function without argument
+    :param repeat: number of calls
+    :return: the average time of a call in seconds
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) / repeat
+
+
+def benchmark_tracer(repeat=10):
+    """
+    compare the recursive find_path with the iterative trace_path, both include the width lookup of every point.
+    trace_skeleton is the ordering of trace_path alone
+    :param repeat: number of calls for each stroke
+    :return: dictionary, key: name of the tracer value: average time per stroke in seconds
+    """
+    strokes = synthetic_strokes()
+    tracers = [
+        ('find_path', cv.find_path),
+        ('trace_path', cv.trace_path),
+        ('trace_skeleton', lambda thinned, gray: skeleton_graph.trace_skeleton(thinned)),
+    ]
+    result = {}
+    for name, tracer in tracers:
+        total = 0
+        for gray, thinned in strokes:
+            total += measure(lambda: tracer(thinned, gray), repeat)
+        result[name] = total / len(strokes)
+    return result
+
+
+def benchmark_width(repeat=10):
+    """
+    compare find_width called per point with the vectorized width lookups of stroke_width
+    :param repeat: number of calls for each stroke
+    :return: dictionary, key: name of the width engine value: average time per stroke in seconds
+    """
+    strokes = [(gray, skeleton_graph.trace_skeleton(thinned)) for gray, thinned in synthetic_strokes()]
+    engines = [
+        ('find_width', lambda points, gray: [cv.find_width(point, gray) for point in points.tolist()]),
+        ('compatible_widths', lambda points, gray: stroke_width.stroke_widths(points, gray, True)),
+        ('stroke_widths', stroke_width.stroke_widths),
+    ]
+    result = {}
+    for name, engine in engines:
+        total = 0
+        for gray, points in strokes:
+            total += measure(lambda: engine(points, gray), repeat)
+        result[name] = total / len(strokes)
+    return result
+
+
+def loop_all_black(image):
+    """
+    the former Python implementation of all_black, kept as the baseline of benchmark_matrix
+    """
+    return (np.array(image) == 0).all()
+
+
+def loop_find_first(graph):
+    """
+    the former Python implementation of find_first, kept as the baseline of benchmark_matrix
+    """
+    shape = np.shape(np.array(graph))
+    shortest = shape[0] + shape[1] + 1
+    shortest_index = [-1, -1]
+    for i in range(shape[0]):
+        for j in range(shape[1]):
+            if graph[i][j] > 0 and shortest > i + j:
+                shortest = i + j
+                shortest_index = [i, j]
+    return shortest_index
+
+
+def loop_union(matrix_set):
+    """
+    the former Python implementation of union, kept as the baseline of benchmark_matrix
+    """
+    shape = np.shape(np.array(matrix_set[0]))
+    result = np.zeros(shape, np.uint8)
+    for i in range(shape[0]):
+        for j in range(shape[1]):
+            for matrix in matrix_set:
+                if matrix[i][j] != 0:
+                    result[i][j] = 255
+    return result
+
+
+def benchmark_matrix(repeat=3):
+    """
+    compare the former Python loops with the helpers of stroke_matrix, on the thinned synthetic strokes
+    :param repeat: number of calls of each helper
+    :return: dictionary, key: name of the helper value: (time before, time after) in seconds
+    """
+    matrix_set = [thinned for _, thinned in synthetic_strokes()]
+    helpers = [
+        ('all_black', loop_all_black, stroke_matrix.all_black, matrix_set[0]),
+        ('find_first', loop_find_first, stroke_matrix.find_first, matrix_set[0]),
+        ('get_shape', lambda matrix: np.shape(np.array(matrix)), stroke_matrix.get_shape, matrix_set[0]),
+        ('union', loop_union, stroke_matrix.union, matrix_set),
+    ]
+    result = {}
+    for name, before, after, argument in helpers:
+        result[name] = (measure(lambda: before(argument), repeat), measure(lambda: after(argument), repeat))
+    return result
+
+
+def run_stage(name, function, count, result):
+    """
+    time one stage of the extraction and record its peak traced memory, the stage is run a second time for the memory
+    so the tracing does not slow the timed run down
+    :param name: name of the stage
+    :param function: function without argument doing the work of the stage
+    :param count: number of items (frames or strokes) the stage processes
+    :param result: dictionary the measurement is added to
+    :return: the return value of @function
+    """
+    start = time.perf_counter()
+    value = function()
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stage = result.setdefault(name, {'seconds': 0.0, 'items': 0, 'peak_bytes': 0})
+    stage['seconds'] += seconds
+    stage['items'] += count
+    stage['peak_bytes'] = max(stage['peak_bytes'], peak)
+    return value
+
+
+def benchmark_extraction(urls):
+    """
+    run the stages of parse_gif one by one on every GIF
+    :param urls: urls of stroke order GIFs
+    :return: dictionary, key: name of the stage value: dictionary of seconds, items, throughput (items per second)
+        and peak_bytes
+    """
+    result = {}
+    for url in urls:
+        raw = run_stage('decode', lambda: list(frames.iter_frames(url)), 1, result)
+        prepared = run_stage('preprocess', lambda: [frames.prepare_frame(frame) for frame in raw], len(raw), result)
+        completed = [previous for previous, frame in zip(prepared, prepared[1:]) if cv.stroke_complete(previous, frame)]
+
+        def thin():
+            strokes = []
+            for frame in completed:
+                result_image = cv2.bitwise_and(frame.blurred, frame.blurred, mask=frame.mask)
+                gray = cv2.cvtColor(result_image, cv2.COLOR_BGR2GRAY)
+                strokes.append((gray, cv2.ximgproc.thinning(gray, thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)))
+            return strokes
+
+        strokes = run_stage('thinning', thin, len(completed), result)
+        paths = run_stage('tracing', lambda: [skeleton_graph.trace_skeleton(thinned) for _, thinned in strokes],
+                          len(strokes), result)
+        run_stage('width', lambda: [stroke_width.stroke_widths(path, gray) for (gray, _), path in zip(strokes, paths)],
+                  len(strokes), result)
+
+        def direction():
+            # the strokes come out of cv.completed_strokes in the order of completed, so of paths
+            return [frame_labels.drawn_reversed(red_since, path[0], path[-1])
+                    for (_, red_since), path in zip(cv.completed_strokes(prepared), paths) if len(path)]
+
+        run_stage('direction', direction, len(prepared), result)
+        run_stage('union', lambda: stroke_matrix.union([thinned for _, thinned in strokes]), len(strokes), result)
+    for stage in result.values():
+        stage['throughput'] = stage['items'] / stage['seconds'] if stage['seconds'] > 0 else float('inf')
+    return result
+
+
+def environment():
+    """
+    :return: dictionary of the versions the benchmark ran with
+    """
+    return {
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'machine': platform.machine(),
+    }
+
+
+def compare_baseline(result, baseline, factor=REGRESSION_FACTOR):
+    """
+    find the stages which are slower per item than @factor times the baseline
+    :param result: the result of benchmark_extraction
+    :param baseline: a result of benchmark_extraction saved earlier
+    :param factor: the allowed slow down
+    :return: array of (stage, seconds per item, baseline seconds per item) of the regressed stages
+    """
+    regressions = []
+    for name in STAGES:
+        if name not in result or name not in baseline:
+            continue
+        current = result[name]['seconds'] / max(1, result[name]['items'])
+        before = baseline[name]['seconds'] / max(1, baseline[name]['items'])
+        if current > before * factor:
+            regressions.append((name, current, before))
+    return regressions
+
+
+def main(arguments):
+    """
+    run every benchmark of this module
+    :param arguments: command line arguments
+    :return: exit status, 1 if a stage regressed
+    """
+    parser = argparse.ArgumentParser(description='benchmark the extraction of writing paths from GIFs')
+    parser.add_argument('--gifs', type=int, default=8, help='number of synthetic GIFs')
+    parser.add_argument('--save', help='save the per-stage result as a JSON baseline')
+    parser.add_argument('--compare', help='compare the per-stage result with a JSON baseline')
+    options = parser.parse_args(arguments)
+
+    for name, (before, after) in benchmark_matrix().items():
+        print('%-18s %8.3f ms before %8.3f ms after' % (name, before * 1000, after * 1000))
+    for benchmark in (benchmark_tracer, benchmark_width):
+        for name, seconds in benchmark().items():
+            print('%-18s %8.3f ms per stroke' % (name, seconds * 1000))
+
+    with tempfile.TemporaryDirectory() as directory:
+        result = benchmark_extraction(synthetic_gifs(directory, options.gifs))
+    for name in STAGES:
+        stage = result[name]
+        print('%-18s %8.3f ms %10.1f items/s %10.1f KiB peak' % (
+            name, stage['seconds'] * 1000, stage['throughput'], stage['peak_bytes'] / 1024.0))
+
+    if options.save:
+        with open(options.save, 'w') as file:
+            json.dump({'environment': environment(), 'stages': result}, file, indent=2)
+    if options.compare:
+        with open(options.compare, 'r') as file:
+            baseline = json.load(file)['stages']
+        regressions = compare_baseline(result, baseline)
+        for name, current, before in regressions:
+            print('regression: %s %.3f ms per item, baseline %.3f ms' % (name, current * 1000, before * 1000))
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
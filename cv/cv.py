@@ -3,22 +3,29 @@
 import math
 import os
 import json
+import functools
+import multiprocessing
 import numpy as np
-import PIL.Image
 import cv2
-import data.common_characters
+import charlib.binary
+import frame_labels
+import frames
+import segmentation
+import skeleton_graph
+import stroke_width
+from stroke_matrix import all_black, find_first, get_shape, union
 
 MY_PATH = os.path.abspath(os.path.dirname(__file__))
 JSON_DIR = os.path.join(MY_PATH, r"..\data\data.json")
-
-
-def all_black(image):
-    """
-    the method would check if a matrix of a image is consisted of all black points
-    :param image: matrix of a image
-    :return: if the matrix of a image is consisted of all black points
-    """
-    return (np.array(image) == 0).all()
+LIB_DIR = os.path.join(MY_PATH, r"..\data\data.clib")
+JOURNAL_DIR = os.path.join(MY_PATH, r"..\data\extracted.jsonl")
+# extracted characters between two progress messages
+CHECKPOINT_INTERVAL = 20
+# compute widths the way find_width does, for comparing with an existing data.json
+WIDTH_COMPATIBLE = False
+SEGMENTATION_COMPLETION = 'completion'
+SEGMENTATION_DIFFERENCE = 'difference'
+SEGMENTATION = SEGMENTATION_COMPLETION
 
 
 def obtain_container(gif_name):
@@ -27,35 +34,11 @@ def obtain_container(gif_name):
     :param gif_name: name of the GIF
     :return: the container of the frames of the GIF
     """
-    container = []
-    image = PIL.Image.open(gif_name)
-    iterator = PIL.ImageSequence.Iterator(image)
-    for frame in iterator:
-        img = frame.convert('RGB')
-        img = cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
-        container.append(img)
-    return container
+    return list(frames.iter_frames(gif_name))
 
 
 # define graph algo
 
-def find_first(graph):
-    """
-    the method would find the most top-left point of a matrix of a stroke
-    :param graph: matrix of a stroke
-    :return: the coordinate of the point
-    """
-    shape = get_shape(graph)
-    shortest = shape[0] + shape[1] + 1
-    shortest_index = [-1, -1]
-    for i in range(shape[0]):
-        for j in range(shape[1]):
-            if graph[i][j] > 0 and shortest > i + j:
-                shortest = i + j
-                shortest_index = [i, j]
-    return shortest_index
-
-
 def dfs(
         matrix,
         current,
@@ -139,29 +122,23 @@ def find_path(matrix, gray):
     return trajectory, complete
 
 
-def get_shape(matrix):
-    """
-    get the shape of a matrix array
-    :param matrix: 2D array matrix
-    :return: the shape of the matrix
-    """
-    return np.shape(np.array(matrix))
-
-
-def union(matrix_set):
+def trace_path(matrix, gray, compatible_width=WIDTH_COMPATIBLE):
     """
-    get the union of all stroke of one character
-    :param matrix_set: set of path matrices of strokes of a characters
-    :return: the union matrix of paths of strokes of a character
+    iterative replacement of find_path, the points are ordered by skeleton_graph.trace_skeleton instead of the visiting
+    order of dfs, and their widths are looked up by stroke_width.stroke_widths in one pass
+    :param matrix: the matrix of image of a stroke
+    :param gray: the gray graph of the image of a stroke
+    :param compatible_width: boolean, if the widths should be computed the way find_width does
+    :return: the path founded by this method
     """
-    shape = get_shape(matrix_set[0])
-    union = np.zeros(shape, np.uint8)
-    for i in range(shape[0]):
-        for j in range(shape[1]):
-            for matrix in matrix_set:
-                if matrix[i][j] != 0:
-                    union[i][j] = 255
-    return union
+    points = skeleton_graph.trace_skeleton(matrix)
+    widths = stroke_width.stroke_widths(points, gray, compatible_width)
+    if not compatible_width:
+        widths = np.round(widths, 2)
+    trajectory = points.tolist()
+    complete = [[point, None if math.isnan(width) else width]
+                for point, width in zip(trajectory, widths.tolist())]
+    return trajectory, complete
 
 
 def find_width(index, matrix):
@@ -215,35 +192,23 @@ def get_circle(index, radius):
     return circle
 
 
-def parse_gif(url, show_image):
+def parse_gif(url, show_image, segmentation_mode=SEGMENTATION, thresholds=frame_labels.DEFAULT_THRESHOLDS):
     """
     parse a gif, get the writing paths of a character, the return of the method would be stored in a .json file if
     extract_and_save is called. the .json file can be used as reference for robot calligraphy
 
     :param url: the url of the GIF of the character
     :param show_image boolean, if you want image to be shown
+    :param segmentation_mode: SEGMENTATION_COMPLETION for processing_logic, SEGMENTATION_DIFFERENCE for
+        difference_logic
+    :param thresholds: frame_labels.ColourThresholds of the red strokes and of the red pixels of the GIF
     :return: 2D array of data structures which contain the coordinates of points on the writing path and
     their corresponding width
     """
-    gray_set = []
-    all_black_set = []
-    container = obtain_container(url)
-    for i in container:
-        # get image
-
-        image = i
-        cv2.rectangle(image, (180, 270), (300, 300), (100, 186, 245),
-                      -1)
-        image = cv2.GaussianBlur(image, (5, 5), 0)
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        lower = np.array([165, 60, 60])
-        upper = np.array([190, 255, 255])
-        mask = cv2.inRange(image, lower, upper)
-        black = all_black(mask)
-        all_black_set.append(black)
-
-    matrix_set, complete_set = \
-        processing_logic(container, all_black_set, gray_set)
+    if segmentation_mode == SEGMENTATION_DIFFERENCE:
+        matrix_set, complete_set = difference_logic(frames.prepare_frames(url, thresholds))
+    else:
+        matrix_set, complete_set = processing_logic(frames.prepare_frames(url, thresholds), thresholds)
 
     union_map = union(matrix_set)
     if show_image:
@@ -252,95 +217,144 @@ def parse_gif(url, show_image):
     return complete_set
 
 
-def processing_logic(container, all_black_set, gray_set):
+def stroke_complete(previous, frame):
+    """
+    the one rule of both segmentation modes: a stroke is complete in a frame which is not all black while the next
+    frame is all black
+    :param previous: frames.PreparedFrame before @frame, None for the first frame
+    :param frame: frames.PreparedFrame
+    :return: True if a stroke is complete in @previous
     """
-    the logics of parse_gif
-    :param container: container of frames of a GIF about a character
-    :param all_black_set: the set of the boolean values about if frames are all constituted of black RGB = (0, 0, 0) points
-    :param gray_set: an array of gray graph of frames
-    :return: matrix_set, an array of matrices of skeletonized strokes
+    return previous is not None and not previous.black and frame.black
+
+
+def completed_strokes(prepared_frames, thresholds=frame_labels.DEFAULT_THRESHOLDS):
+    """
+    stream the frames of a GIF and keep the map of the frames since which the pixels have been red up to date, see
+    frame_labels.update_red_since
+    :param prepared_frames: iterable of frames.PreparedFrame of a GIF about a character, in order
+    :param thresholds: frame_labels.ColourThresholds of the red pixels of the GIF
+    :return: generator of (frame, red_since) for every frames.PreparedFrame in which a stroke is complete; red_since is
+        updated in place once the next frame is read
+    """
+    red_since = None
+    red = None
+    previous = None
+    for counter, frame in enumerate(prepared_frames):
+        if stroke_complete(previous, frame):
+            yield previous, red_since
+        current = frame_labels.red_mask(frame.raw, thresholds)
+        red_since = frame_labels.update_red_since(red_since, current, red, counter)
+        red = current
+        previous = frame
+
+
+def processing_logic(prepared_frames, thresholds=frame_labels.DEFAULT_THRESHOLDS):
+    """
+    the logics of parse_gif. a stroke is complete in a frame which is not all black while the next frame is all black.
+    the direction of a stroke is looked up in the map of the frames since which the pixels have been red, kept by
+    completed_strokes
+    :param prepared_frames: iterable of frames.PreparedFrame of a GIF about a character, in order
+    :param thresholds: frame_labels.ColourThresholds of the red pixels of the GIF
+    :return: matrix_set, an array of matrices of skeletonized strokes, one per entry of complete_set
         complete_set, an nested array of data structures which contain the coordinates of points on the path of strokes
         and their corresponding width
     """
-    char = []
     matrix_set = []
     complete_set = []
-    counter = -1
-    for i in container:
+    for frame, red_since in completed_strokes(prepared_frames, thresholds):
+        thinned, complete = extract_stroke(frame, red_since)
+        # an empty trace is skipped in both sets, so they stay in step
+        if complete:
+            matrix_set.append(thinned)
+            complete_set.append(complete)
+
+    return matrix_set, complete_set
 
-        # get image
 
-        counter += 1
-        if not (counter != len(all_black_set) - 1
-                and not all_black_set[counter]
-                and all_black_set[counter + 1]):
+def difference_logic(prepared_frames):
+    """
+    the logics of parse_gif in SEGMENTATION_DIFFERENCE mode. strokes are complete in the same frames as in
+    processing_logic, found by stroke_complete while the frames stream by, but their direction is taken from the order
+    in which their pixels turned red, computed for all frames in one pass by segmentation.turned_red_times. the red
+    pixels are the masks of the frames, so their thresholds are the ones given to frames.prepare_frames
+    :param prepared_frames: iterable of frames.PreparedFrame of a GIF about a character, in order
+    :return: matrix_set, an array of matrices of skeletonized strokes, one per entry of complete_set
+        complete_set, an nested array of data structures which contain the coordinates of points on the path of strokes
+        and their corresponding width
+    """
+    masks = []
+    completed = []
+    previous = None
+    for counter, frame in enumerate(prepared_frames):
+        masks.append(frame.mask > 0)
+        if stroke_complete(previous, frame):
+            completed.append((counter - 1, previous))
+        previous = frame
+    if not masks:
+        return [], []
+    masks = np.stack(masks)
+    times = segmentation.turned_red_times(masks)
+
+    matrix_set = []
+    complete_set = []
+    for counter, frame in completed:
+        thinned, trajectory, complete = trace_stroke(frame)
+        # an empty trace is skipped in both sets, so they stay in step
+        if not trajectory:
             continue
-        image = i
-        cv2.rectangle(image, (180, 270), (300, 300), (100, 186, 245),
-                      -1)
-        image = cv2.GaussianBlur(image, (5, 5), 0)
-        result = image.copy()
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-        lower = np.array([165, 60, 60])
-        upper = np.array([190, 255, 255])
-        mask = cv2.inRange(image, lower, upper)
-
-        result = cv2.bitwise_and(result, result, mask=mask)
-        inverted = result
-        gray = cv2.cvtColor(inverted, cv2.COLOR_BGR2GRAY)
-        gray_set.append(gray)
-
-        thinned = cv2.ximgproc.thinning(gray,
-                                        thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
         matrix_set.append(thinned)
-
-        (trajectory, complete) = find_path(thinned, gray)
-
-        # find direction
-
-        first = trajectory[0]
-        last = trajectory[len(trajectory) - 1]
-        p_f = image[first[0]][first[1]]
-        p_l = image[last[0]][last[1]]
-        f_red = 255 > p_f[2] > 165 and p_f[1] > 60 and p_f[0] > 60 \
-                and p_f[1] < 200 and p_f[0] < 200
-        l_red = 255 > p_l[2] > 165 and p_l[1] > 60 and p_l[0] > 60 \
-                and p_l[1] < 200 and p_l[0] < 200
-        f_white = p_f[2] > 240 and p_f[1] > 240 and p_f[0] > 240
-        l_white = p_l[2] > 240 and p_l[1] > 240 and p_l[0] > 240
-        counter2 = counter
-        while f_red and l_red and not (f_white and l_white):
-            counter2 -= 1
-            img_prev = container[counter2]
-            p_f = img_prev[first[0]][first[1]]
-            p_l = img_prev[last[0]][last[1]]
-            f_red = 255 > p_f[2] > 165 and p_f[1] > 60 and p_f[0] > 60 \
-                    and p_f[1] < 200 and p_f[0] < 200
-            l_red = 255 > p_l[2] > 165 and p_l[1] > 60 and p_l[0] > 60 \
-                    and p_l[1] < 200 and p_l[0] < 200
-            f_white = p_f[2] > 240 and p_f[1] > 240 and p_f[0] > 240
-            l_white = p_l[2] > 240 and p_l[1] > 240 and p_l[0] > 240
-        if not (f_white and l_white) and l_red:
-            trajectory.reverse()
+        if segmentation.drawn_reversed(times[counter], trajectory):
             complete.reverse()
-            print('reversed')
-        char.append(trajectory)
         complete_set.append(complete)
 
     return matrix_set, complete_set
 
 
+def trace_stroke(frame):
+    """
+    skeletonize the red stroke of a frame and trace its path
+    :param frame: frames.PreparedFrame in which a stroke is complete
+    :return: the matrix of the skeletonized stroke, the array of points on its path, and the array of the points with
+        their corresponding width
+    """
+    result = cv2.bitwise_and(frame.blurred, frame.blurred, mask=frame.mask)
+    gray = cv2.cvtColor(result, cv2.COLOR_BGR2GRAY)
+    thinned = cv2.ximgproc.thinning(gray,
+                                    thinningType=cv2.ximgproc.THINNING_ZHANGSUEN)
+
+    (trajectory, complete) = trace_path(thinned, gray)
+    return thinned, trajectory, complete
+
+
+def extract_stroke(frame, red_since):
+    """
+    get the writing path of the stroke completed in @frame
+    :param frame: frames.PreparedFrame in which the stroke is complete
+    :param red_since: map of the frames since which the pixels have been red, see frame_labels.update_red_since
+    :return: the matrix of the skeletonized stroke and the array of points on its path with their corresponding width
+    """
+    thinned, trajectory, complete = trace_stroke(frame)
+    if trajectory and frame_labels.drawn_reversed(red_since, trajectory[0], trajectory[-1]):
+        complete.reverse()
+        print('reversed')
+    return thinned, complete
+
+
 def write_json(url, new_pairs):
     """
     save json into a .json file, it would be placed in ..\data\
-    if extract_and_save is called.
+    if extract_and_save is called. the file is written to a temporary file first and then moved over @url, so an
+    interrupted write never leaves a truncated library behind
 
     :param url: the url of the .json file
     :param new_pairs: array of pairs of unicode and writing path pairs (unicode, paths).
     :return: none
     """
-    with open(url, 'w') as file:
+    temp_url = url + '.tmp'
+    with open(temp_url, 'w') as file:
         json.dump(new_pairs, file)
+    os.replace(temp_url, url)
 
 
 def load_character_lib(file):
@@ -353,30 +367,158 @@ def load_character_lib(file):
     return user_dic
 
 
-def extract_and_save(show_image):
+def gif_url(codepoint):
+    """
+    get the url of the stroke order GIF of a character
+    :param codepoint: unicode codepoint of the character
+    :return: the url of the GIF
+    """
+    name = '\\' + hex(codepoint)[2:] + '-bishun.gif'
+    return os.path.join(MY_PATH, r"..\data\chars" + name)
+
+
+def common_codepoints():
+    """
+    get the sorted codepoints of the commonly used chinese characters
+    :return: sorted array of unique codepoints
+    """
+    # imported here so that importing cv, as benchmark does, does not need the data package
+    import data.common_characters
+    return sorted(set(data.common_characters.COMMON_CHARACTERS))
+
+
+def load_journal(journal_url):
+    """
+    load the characters of a previous, possibly interrupted, extraction
+    :param journal_url: the url of the journal, one JSON [hex codepoint, writing paths] per line
+    :return: a dictionary, key: unicode value: writing path
+    """
+    library = {}
+    if not os.path.exists(journal_url):
+        return library
+    with open(journal_url, 'r') as file:
+        for line in file:
+            try:
+                hex_value, complete_set = json.loads(line)
+            except ValueError:
+                # the line being written when the extraction was interrupted
+                continue
+            library[hex_value] = complete_set
+    return library
+
+
+def open_journal(journal_url):
+    """
+    open the journal for appending, a line cut off by an interruption is terminated first
+    :param journal_url: the url of the journal
+    :return: the file object of the journal
+    """
+    file = open(journal_url, 'a+')
+    if file.tell() > 0:
+        file.seek(file.tell() - 1)
+        if file.read(1) != '\n':
+            file.write('\n')
+    return file
+
+
+def append_journal(file, hex_value, complete_set):
+    """
+    record an extracted character, only its own line is written
+    :param file: the file object returned by open_journal
+    :param hex_value: hex codepoint of the character
+    :param complete_set: the writing paths of the character
+    :return: none
+    """
+    file.write(json.dumps([hex_value, complete_set]) + '\n')
+    file.flush()
+
+
+def save_library(library, library_url, binary_url):
+    """
+    write the .json library, sorted by codepoint, and the binary library once the extraction is finished
+    :param library: the dictionary, key: unicode value: writing path
+    :param library_url: the url of the .json library
+    :param binary_url: the url of the binary library
+    :return: none
+    """
+    library = dict(sorted(library.items(), key=lambda item: int(item[0], 16)))
+    write_json(library_url, library)
+    charlib.binary.write_library(binary_url, library)
+
+
+def parse_codepoint(codepoint, thresholds=frame_labels.DEFAULT_THRESHOLDS):
+    """
+    worker of extract_and_save_parallel, parse the GIF of one character
+    :param codepoint: unicode codepoint of the character
+    :param thresholds: frame_labels.ColourThresholds of the red strokes and of the red pixels of the GIF
+    :return: hex codepoint and the writing paths of the character, the paths are None if the GIF cannot be parsed
+    """
+    hex_value = hex(codepoint)[2:]
+    try:
+        return hex_value, parse_gif(gif_url(codepoint), False, thresholds=thresholds)
+    except Exception as e:
+        print('failed to parse ', hex_value, ': ', e)
+        return hex_value, None
+
+
+def extract_and_save(show_image, library_url=JSON_DIR, journal_url=JOURNAL_DIR, binary_url=LIB_DIR,
+                     thresholds=frame_labels.DEFAULT_THRESHOLDS):
+    """
+    call this method to get a .json file and a binary library (see charlib.binary) of the writing paths of 3000+
+    commonly used chinese characters. every extracted character is appended to the journal, so calling this method
+    again after an interruption resumes where the previous run stopped; the libraries are written once at the end
+    :param show_image: boolean, if you want image to be shown
+    :param library_url: the url of the .json library
+    :param journal_url: the url of the journal
+    :param binary_url: the url of the binary library
+    :param thresholds: frame_labels.ColourThresholds of the red strokes and of the red pixels of the GIFs
+    :return: none
+    """
+    library = load_journal(journal_url)
+    pending = [i for i in common_codepoints() if hex(i)[2:] not in library]
+    with open_journal(journal_url) as journal:
+        for counter, i in enumerate(pending):
+            hex_value = hex(i)[2:]
+            complete_set = parse_gif(gif_url(i), show_image, thresholds=thresholds)
+            library[hex_value] = complete_set
+            append_journal(journal, hex_value, complete_set)
+            if counter % CHECKPOINT_INTERVAL == 0:
+                print('counter: ', counter)
+    save_library(library, library_url, binary_url)
+
+
+def extract_and_save_parallel(processes=None, library_url=JSON_DIR, journal_url=JOURNAL_DIR, binary_url=LIB_DIR,
+                              thresholds=frame_labels.DEFAULT_THRESHOLDS):
     """
-    call this method to get a .json file of the writing paths of 3000+ commonly used chinese characters
+    parallel version of extract_and_save, GIFs are parsed by a pool of worker processes and appended to the journal as
+    they finish. calling this method again after an interruption resumes where the previous run stopped. the
+    libraries are written once every codepoint is extracted
+    :param processes: number of worker processes, None for the number of cores
+    :param library_url: the url of the .json library
+    :param journal_url: the url of the journal
+    :param binary_url: the url of the binary library
+    :param thresholds: frame_labels.ColourThresholds of the red strokes and of the red pixels of the GIFs
     :return: none
     """
-    counter = 0
-    commons = \
-        list(dict.fromkeys(data.common_characters.COMMON_CHARACTERS))
-    commons = list(set(commons))
-    commons = sorted(commons)
-    buffer = {}
-    for i in commons:
-        unicode = hex(i)
-        hex_value = unicode[2:]
-        name = '\\' + hex_value + '-bishun.gif'
-
-        url = os.path.join(MY_PATH, r"..\data\chars" + name)
-        complete_set = parse_gif(url, show_image)
-        buffer[hex_value] = complete_set
-        if counter % 20 == 0 or i == 0x9f9f:
-            write_json(JSON_DIR, buffer)
-            buffer = {}
-            print('counter: ', counter)
-        counter += 1
+    library = load_journal(journal_url)
+    pending = [i for i in common_codepoints() if hex(i)[2:] not in library]
+    parse = functools.partial(parse_codepoint, thresholds=thresholds)
+    print('already extracted: ', len(library), ' remaining: ', len(pending))
+
+    pool = multiprocessing.Pool(processes)
+    try:
+        with open_journal(journal_url) as journal:
+            for counter, (hex_value, complete_set) in enumerate(pool.imap_unordered(parse, pending)):
+                if complete_set is None:
+                    continue
+                library[hex_value] = complete_set
+                append_journal(journal, hex_value, complete_set)
+                if counter % CHECKPOINT_INTERVAL == 0:
+                    print('counter: ', counter)
+    finally:
+        pool.terminate()
+        pool.join()
+    save_library(library, library_url, binary_url)
 
 
 if __name__ == '__main__':
@@ -388,4 +530,13 @@ if __name__ == '__main__':
     if response == 'yes':
         extract_and_save(True)
     else:
-        extract_and_save(False)
+        processes = None
+        while processes is None:
+            try:
+                processes = int(input("number of processes (1 for single process): "))
+            except ValueError:
+                print("please input valid value")
+        if processes > 1:
+            extract_and_save_parallel(processes)
+        else:
+            extract_and_save(False)
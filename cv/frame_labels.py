@@ -0,0 +1,75 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Red runs of the pixels of the frames, for the direction check
+
+The red pixels of every raw frame are found with one cv2.inRange. While the frames stream by, a map of the frame since
+which every pixel has been red is kept up to date in place, touching only the pixels whose redness changed since the
+previous frame, so asking which end of a stroke turned red first is a lookup of two values instead of a walk back
+through the frames.
+"""
+import collections
+import numpy as np
+import cv2
+
+# red_lower, red_upper: exclusive BGR bounds of the red pixels of the direction check, lower < pixel < upper
+# stroke_lower, stroke_upper: inclusive HSV bounds of the red strokes separated by frames.prepare_frame
+
+ColourThresholds = collections.namedtuple('ColourThresholds',
+                                          ['red_lower', 'red_upper', 'stroke_lower', 'stroke_upper'])
+DEFAULT_THRESHOLDS = ColourThresholds(
+    red_lower=np.array([60, 60, 165]),
+    red_upper=np.array([200, 200, 255]),
+    stroke_lower=np.array([165, 60, 60]),
+    stroke_upper=np.array([190, 255, 255]),
+)
+
+
+def red_mask(frame, thresholds=DEFAULT_THRESHOLDS):
+    """
+    find the red pixels of a frame
+    :param frame: BGR matrix of a frame
+    :param thresholds: ColourThresholds of the red pixels
+    :return: uint8 matrix, 255 where the pixel is red
+    """
+    return cv2.inRange(frame, thresholds.red_lower + 1, thresholds.red_upper - 1)
+
+
+def update_red_since(red_since, red, previous_red, index):
+    """
+    advance the map of the frames since which the pixels have been red by one frame, in place
+    :param red_since: int32 matrix for the previous frame, None before the first frame
+    :param red: red_mask of the frame
+    :param previous_red: red_mask of the previous frame, None before the first frame
+    :param index: index of the frame
+    :return: int32 matrix, the first frame of the current red run of every pixel, -1 where the pixel is not red
+    """
+    if red_since is None:
+        return np.where(red > 0, index, -1).astype(np.int32)
+    changed = np.flatnonzero(red != previous_red)
+    if len(changed):
+        red_since.flat[changed] = np.where(red.flat[changed] > 0, index, -1)
+    return red_since
+
+
+def earliest_red(red_since, point):
+    """
+    get the frame in which a point turned red, without any frame in between where it was not red
+    :param red_since: the map returned by update_red_since
+    :param point: [row, col] of the point
+    :return: index of the frame, -1 if the point is not red
+    """
+    return int(red_since[point[0], point[1]])
+
+
+def drawn_reversed(red_since, first, last):
+    """
+    check if a stroke was drawn from @last to @first: walking back from the current frame while both ends are red,
+    the first frame in which they are not both red has only @last red
+    :param red_since: the map returned by update_red_since for the frame in which the stroke is complete
+    :param first: [row, col] of the first point of the path of the stroke
+    :param last: [row, col] of the last point of the path of the stroke
+    :return: True if @last turned red before @first
+    """
+    first_red = earliest_red(red_since, first)
+    last_red = earliest_red(red_since, last)
+    return last_red >= 0 and (first_red < 0 or last_red < first_red)
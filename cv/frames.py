@@ -0,0 +1,57 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Streaming frame pipeline of cv.parse_gif
+
+Frames are decoded lazily from PIL and preprocessed exactly once: the watermark is covered, the frame is blurred and
+converted to HSV, and the red strokes are separated with inRange. The consumer decides which of the prepared frames it
+keeps, so a GIF never has to be materialized as a whole.
+"""
+import collections
+import numpy as np
+import PIL.Image
+import PIL.ImageSequence
+import cv2
+import frame_labels
+
+WATERMARK_TOP_LEFT = (180, 270)
+WATERMARK_BOTTOM_RIGHT = (300, 300)
+WATERMARK_COLOR = (100, 186, 245)
+
+PreparedFrame = collections.namedtuple('PreparedFrame', ['raw', 'blurred', 'mask', 'black'])
+
+
+def iter_frames(gif_name):
+    """
+    decode the frames of a GIF one at a time
+    :param gif_name: name of the GIF
+    :return: generator of BGR matrices of the frames
+    """
+    image = PIL.Image.open(gif_name)
+    for frame in PIL.ImageSequence.Iterator(image):
+        img = frame.convert('RGB')
+        yield cv2.cvtColor(np.asarray(img), cv2.COLOR_RGB2BGR)
+
+
+def prepare_frame(frame, thresholds=frame_labels.DEFAULT_THRESHOLDS):
+    """
+    preprocess a frame, the watermark is covered in @frame itself
+    :param frame: BGR matrix of a frame
+    :param thresholds: frame_labels.ColourThresholds, the red strokes are between stroke_lower and stroke_upper
+    :return: PreparedFrame of the raw frame, the blurred frame, the mask of red strokes and if the mask is all black
+    """
+    cv2.rectangle(frame, WATERMARK_TOP_LEFT, WATERMARK_BOTTOM_RIGHT, WATERMARK_COLOR, -1)
+    blurred = cv2.GaussianBlur(frame, (5, 5), 0)
+    hsv = cv2.cvtColor(blurred, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, thresholds.stroke_lower, thresholds.stroke_upper)
+    return PreparedFrame(frame, blurred, mask, not mask.any())
+
+
+def prepare_frames(gif_name, thresholds=frame_labels.DEFAULT_THRESHOLDS):
+    """
+    decode and preprocess the frames of a GIF one at a time
+    :param gif_name: name of the GIF
+    :param thresholds: frame_labels.ColourThresholds of the red strokes
+    :return: generator of PreparedFrame
+    """
+    for frame in iter_frames(gif_name):
+        yield prepare_frame(frame, thresholds)
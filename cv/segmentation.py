@@ -0,0 +1,39 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Frame-differencing stroke segmentation
+
+The red masks of all frames of a GIF are stacked, and the frame in which every pixel last turned red is computed in one
+pass over the stack. The frames in which strokes are complete are found by cv.stroke_complete; the pixels of a stroke
+are the red pixels of that frame, and the order in which they turned red tells the direction it was drawn in.
+"""
+import numpy as np
+
+# part of the path compared at each end when deciding the direction
+
+DIRECTION_FRACTION = 1 / 3.0
+
+
+def turned_red_times(masks):
+    """
+    get, for every frame and pixel, the index of the frame in which the pixel turned red most recently
+    :param masks: (t, h, w) boolean stack of the red masks of the frames
+    :return: (t, h, w) int16 stack, -1 where the pixel has not turned red yet
+    """
+    turned = masks.copy()
+    turned[1:] &= ~masks[:-1]
+    times = np.where(turned, np.arange(len(masks), dtype=np.int16)[:, None, None], np.int16(-1))
+    return np.maximum.accumulate(times, axis=0)
+
+
+def drawn_reversed(times, trajectory, fraction=DIRECTION_FRACTION):
+    """
+    check if a stroke was drawn from the end of its path to the start
+    :param times: (h, w) times at which the pixels of the stroke turned red, a frame of turned_red_times
+    :param trajectory: (n, 2) array of [row, col] of the ordered points of the path
+    :param fraction: part of the path compared at each end
+    :return: True if the end of the path turned red before its start
+    """
+    trajectory = np.asarray(trajectory).reshape(-1, 2)
+    count = max(1, int(len(trajectory) * fraction))
+    order = times[trajectory[:, 0], trajectory[:, 1]].astype(np.float64)
+    return order[-count:].mean() < order[:count].mean()
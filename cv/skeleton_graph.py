@@ -0,0 +1,118 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Iterative tracing of thinned strokes
+
+The Zhang-Suen output of cv.processing_logic is turned into a pixel-adjacency graph: every skeleton pixel is a node and
+its 8-connected skeleton neighbours are looked up for all pixels at once with NumPy. The writing path of a stroke is the
+longest geodesic path of the graph, found with breadth first searches, so spurs left by the thinning at junctions and
+stroke ends are dropped instead of being appended in visit order.
+"""
+import collections
+import numpy as np
+
+# row and column offsets of the 8 neighbours, the 4-connected ones first
+
+NEIGHBOR_OFFSETS = np.array([
+    [-1, 0],
+    [0, -1],
+    [0, 1],
+    [1, 0],
+    [-1, -1],
+    [-1, 1],
+    [1, -1],
+    [1, 1],
+])
+MAX_JUMP = 50
+
+
+def build_graph(skeleton):
+    """
+    build the pixel-adjacency graph of a thinned stroke
+    :param skeleton: matrix of a thinned stroke, non-zero points are on the skeleton
+    :return: points, (n, 2) array of [row, col] of the skeleton points
+        neighbors, (n, 8) array of indices of the neighbours of every point, -1 if there is no neighbour
+    """
+    skeleton = np.asarray(skeleton)
+    points = np.argwhere(skeleton > 0)
+    index = np.full((skeleton.shape[0] + 2, skeleton.shape[1] + 2), -1, np.int64)
+    index[points[:, 0] + 1, points[:, 1] + 1] = np.arange(len(points))
+    rows = points[:, 0:1] + 1 + NEIGHBOR_OFFSETS[:, 0]
+    cols = points[:, 1:2] + 1 + NEIGHBOR_OFFSETS[:, 1]
+    return points, index[rows, cols]
+
+
+def bfs(adjacency, source, allowed):
+    """
+    breadth first search over the pixel-adjacency graph
+    :param adjacency: neighbour indices of every point as nested lists, -1 if there is no neighbour
+    :param source: index of the starting point
+    :param allowed: boolean list, points the search may visit
+    :return: parent, list of the parent of every reached point (-1 for the source and unreached points)
+        order, list of reached points in visiting order, the last one is the farthest from the source
+    """
+    parent = [-1] * len(adjacency)
+    seen = [False] * len(adjacency)
+    seen[source] = True
+    order = [source]
+    queue = collections.deque([source])
+    while queue:
+        current = queue.popleft()
+        for i in adjacency[current]:
+            if i >= 0 and allowed[i] and not seen[i]:
+                seen[i] = True
+                parent[i] = current
+                order.append(i)
+                queue.append(i)
+    return parent, order
+
+
+def longest_path(points, adjacency, start, allowed):
+    """
+    find the longest geodesic path of the connected component containing @start, the path is ordered from the end
+    which is the closest to the top-left corner
+    :param points: (n, 2) array of skeleton points
+    :param adjacency: neighbour indices of every point as nested lists
+    :param start: index of a point of the component
+    :param allowed: boolean list, points that are not traced yet
+    :return: array of indices of the points on the path, array of indices of all points of the component
+    """
+    _, order = bfs(adjacency, start, allowed)
+    parent, order = bfs(adjacency, order[-1], allowed)
+    path = [order[-1]]
+    while parent[path[-1]] >= 0:
+        path.append(parent[path[-1]])
+    path = np.array(path)
+    if points[path[-1]].sum() < points[path[0]].sum():
+        path = path[::-1]
+    return path, np.array(order)
+
+
+def trace_skeleton(skeleton, max_jump=MAX_JUMP):
+    """
+    order the points of a thinned stroke into a writing path. the component closest to the top-left corner is traced
+    first, other components are appended if one of their ends is within @max_jump (manhattan distance) of the current
+    end of the path
+    :param skeleton: matrix of a thinned stroke
+    :param max_jump: the longest gap between two components that is still bridged
+    :return: (m, 2) array of [row, col] of the ordered points
+    """
+    points, neighbors = build_graph(skeleton)
+    if len(points) == 0:
+        return points
+    adjacency = neighbors.tolist()
+    remaining = np.ones(len(points), bool)
+    start = int(np.argmin(points.sum(axis=1)))
+    path, component = longest_path(points, adjacency, start, remaining.tolist())
+    remaining[component] = False
+    paths = [path]
+    while remaining.any():
+        candidates = np.flatnonzero(remaining)
+        distance = np.abs(points[candidates] - points[paths[-1][-1]]).sum(axis=1)
+        nearest = int(candidates[np.argmin(distance)])
+        path, component = longest_path(points, adjacency, nearest, remaining.tolist())
+        remaining[component] = False
+        gap = np.abs(points[path[[0, -1]]] - points[paths[-1][-1]]).sum(axis=1)
+        if gap.min() > max_jump:
+            continue
+        paths.append(path if gap[0] <= gap[1] else path[::-1])
+    return points[np.concatenate(paths)]
@@ -0,0 +1,50 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""NumPy helpers on the matrices of strokes
+
+A stroke matrix is a 2D array (or nested list) in which the points of a stroke are non-zero.
+"""
+import numpy as np
+
+
+def all_black(image):
+    """
+    the method would check if a matrix of a image is consisted of all black points
+    :param image: matrix of a image
+    :return: if the matrix of a image is consisted of all black points
+    """
+    return not np.any(image)
+
+
+def get_shape(matrix):
+    """
+    get the shape of a matrix array
+    :param matrix: 2D array matrix
+    :return: the shape of the matrix
+    """
+    if isinstance(matrix, np.ndarray):
+        return matrix.shape
+    return np.shape(matrix)
+
+
+def find_first(graph):
+    """
+    the method would find the most top-left point of a matrix of a stroke, ties are broken in row-major order
+    :param graph: matrix of a stroke
+    :return: the coordinate of the point, [-1, -1] if the matrix is all black
+    """
+    rows, cols = np.nonzero(np.asarray(graph) > 0)
+    if len(rows) == 0:
+        return [-1, -1]
+    index = np.argmin(rows + cols)
+    return [int(rows[index]), int(cols[index])]
+
+
+def union(matrix_set):
+    """
+    get the union of all stroke of one character
+    :param matrix_set: set of path matrices of strokes of a characters
+    :return: the union matrix of paths of strokes of a character
+    """
+    covered = np.logical_or.reduce(np.asarray(matrix_set) != 0, axis=0)
+    return covered.astype(np.uint8) * 255
@@ -0,0 +1,114 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Stroke width lookup for the points of a traced stroke
+
+The width of a stroke at a skeleton point is twice the distance from that point to the closest black point of the gray
+graph. One distance transform is computed per stroke frame and the widths of all points are gathered from it at once.
+The compatible mode reproduces the ring search of cv.find_width ("first_r + i"), vectorized over all points, so widths
+can be compared with an existing data.json.
+"""
+import math
+import numpy as np
+import cv2
+
+
+def width_map(gray):
+    """
+    get the stroke width at every point of a gray graph
+    :param gray: the gray graph of a stroke, zero outside the stroke
+    :return: float32 matrix of the same shape, twice the distance to the closest zero point
+    """
+    distance = cv2.distanceTransform((np.asarray(gray) > 0).astype(np.uint8), cv2.DIST_L2, 5)
+    return distance * 2
+
+
+def ring_offsets(radius):
+    """
+    get the [row, col] offsets of the points on a circle, in the order used by cv.get_circle
+    :param radius: radius of the circle
+    :return: (k, 2) array of offsets
+    """
+    offsets = []
+    for col in range(-radius, radius + 1):
+        height = int(math.sqrt(radius ** 2 - col ** 2))
+        offsets.append([-height, col])
+        offsets.append([height, col])
+    return np.array(offsets)
+
+
+def listed_points(coordinates):
+    """
+    cv.get_circle skips a point if a point with swapped row and column is already in the circle, find out which points
+    of the circles are kept
+    :param coordinates: (n, k, 2) array, the points of the circles of n centres
+    :return: (n, k) boolean array, if the point is kept
+    """
+    swapped = coordinates[:, :, ::-1]
+    earlier = np.tri(coordinates.shape[1], k=-1, dtype=bool)
+    duplicate = (coordinates[:, None, :, :] == swapped[:, :, None, :]).all(axis=3) & earlier
+    listed = np.ones(coordinates.shape[:2], bool)
+    for k in np.flatnonzero(duplicate.any(axis=(0, 2))):
+        listed[:, k] = ~(listed & duplicate[:, k, :]).any(axis=1)
+    return listed
+
+
+def compatible_widths(points, gray):
+    """
+    widths as cv.find_width computes them: the radius at which the first black point is met, plus the radius at which
+    a black point on the opposite side of the first one is met. nan where find_width would return None
+    :param points: (n, 2) array of [row, col] of the points
+    :param gray: the gray graph of a stroke
+    :return: float array of the widths of the points
+    """
+    gray = np.asarray(gray)
+    points = np.asarray(points, np.int64).reshape(-1, 2)
+    shape = np.array(gray.shape)
+    widths = np.full(len(points), np.nan)
+    found = np.zeros(len(points), bool)
+    first_offset = np.zeros((len(points), 2), np.int64)
+    first_radius = np.zeros(len(points), np.int64)
+    active = np.arange(len(points))
+    for radius in range(max(gray.shape)):
+        if len(active) == 0:
+            break
+        offsets = ring_offsets(radius)
+        coordinates = points[active, None, :] + offsets[None, :, :]
+        listed = listed_points(coordinates)
+        inside = listed & ((coordinates >= 0) & (coordinates < shape)).all(axis=2)
+        coordinates = np.where(inside[:, :, None], coordinates, 0)
+        black = inside & (gray[coordinates[:, :, 0], coordinates[:, :, 1]] == 0)
+
+        # the first black point of the points which have not met one yet
+
+        new = ~found[active] & black.any(axis=1)
+        order = np.arange(len(offsets))
+        after_first = np.ones(black.shape, bool)
+        first_index = np.argmax(black[new], axis=1)
+        after_first[new] = order[None, :] > first_index[:, None]
+        first_offset[active[new]] = offsets[first_index]
+        first_radius[active[new]] = radius
+        found[active[new]] = True
+
+        # a black point on the opposite side of the first one
+
+        reference = first_offset[active]
+        opposite = (reference[:, None, 1] * offsets[None, :, 1] <= 0) & \
+                   (reference[:, None, 0] * offsets[None, :, 0] <= 0)
+        done = (black & after_first & opposite).any(axis=1) & found[active]
+        widths[active[done]] = first_radius[active[done]] + radius
+        active = active[~done]
+    return widths
+
+
+def stroke_widths(points, gray, compatible=False):
+    """
+    get the widths of a stroke at the given points
+    :param points: (n, 2) array of [row, col] of the points
+    :param gray: the gray graph of a stroke
+    :param compatible: boolean, if the widths should be computed the way cv.find_width does
+    :return: float array of the widths of the points
+    """
+    if compatible:
+        return compatible_widths(points, gray)
+    points = np.asarray(points, np.int64).reshape(-1, 2)
+    return width_map(gray)[points[:, 0], points[:, 1]].astype(np.float64)